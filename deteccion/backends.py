@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Backends de inferencia YOLOv8 para CPU
+- pytorch: ultralytics tal cual (el .pt original)
+- onnx: ONNX Runtime sobre el modelo exportado (FP32 o INT8)
+- openvino: OpenVINO sobre el modelo exportado (FP32 o INT8 vía NNCF)
+- Todos retornan lo mismo: por frame un array (N, 6) con
+  x1, y1, x2, y2, confianza, clase en coordenadas del frame original
+- Los modelos exportados comparten el preproceso (letterbox) y el NMS
+
+Los paquetes de cada backend se importan solo al elegirlo.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+DEFAULT_IMGSZ = 640
+IOU_THRESHOLD = 0.7  # Igual que ultralytics
+MAX_DETECTIONS = 300
+LETTERBOX_COLOR = (114, 114, 114)
+NMS_CLASS_OFFSET = 4096  # Desplaza las cajas por clase: un NMS por clase en una llamada
+
+
+def default_model_path(backend, model_path):
+    """Con un .pt y un backend exportado, el nombre que produce export_model.py"""
+    if backend == 'pytorch' or not model_path.endswith('.pt'):
+        return model_path
+    base = model_path[:-3]
+    return f"{base}.onnx" if backend == 'onnx' else f"{base}_openvino_model"
+
+
+def letterbox(frame, size):
+    """
+    Escala manteniendo proporción y rellena hasta size×size.
+    Retorna (imagen, escala, (pad_x, pad_y)) para deshacerlo en las cajas.
+    """
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = round(width * scale), round(height * scale)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    image = cv2.copyMakeBorder(frame, pad_y, size - new_h - pad_y, pad_x, size - new_w - pad_x,
+                               cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return image, scale, (pad_x, pad_y)
+
+
+def preprocess(frames, size):
+    """Frames BGR → blob NCHW float32 RGB 0..1, y lo necesario para deshacer el letterbox"""
+    blob = np.empty((len(frames), 3, size, size), dtype=np.float32)
+    transforms = []
+    for i, frame in enumerate(frames):
+        image, scale, pad = letterbox(frame, size)
+        blob[i] = image[:, :, ::-1].transpose(2, 0, 1)
+        transforms.append((scale, pad, frame.shape[:2]))
+    blob *= 1 / 255.0
+    return blob, transforms
+
+
+def postprocess(output, transforms, conf, iou, classes):
+    """
+    Salida cruda de YOLOv8 (B, 4 + clases, anclas) → detecciones por frame.
+    Filtra por confianza y clases antes del NMS (lo caro es ordenar pocas cajas).
+    """
+    per_frame = []
+    for prediction, (scale, (pad_x, pad_y), (height, width)) in zip(output, transforms):
+        prediction = prediction.T  # (anclas, 4 + clases)
+        scores = prediction[:, 4:]
+        if classes is not None:
+            scores = scores[:, classes]
+        best = scores.argmax(axis=1)
+        best_conf = scores[np.arange(len(best)), best]
+        keep = best_conf >= conf
+        if not keep.any():
+            per_frame.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+
+        boxes = prediction[keep, :4]
+        best_conf = best_conf[keep]
+        best = best[keep]
+        cls = np.asarray(classes)[best] if classes is not None else best
+
+        # cx, cy, w, h (entrada del modelo) → x1, y1, x2, y2 (frame original)
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - pad_x) / scale
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - pad_y) / scale
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, width)
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, height)
+
+        # NMS por clase: cajas desplazadas según la clase para que no se solapen entre clases
+        offset = cls[:, None] * NMS_CLASS_OFFSET
+        nms_boxes = np.concatenate([xyxy[:, :2] + offset, xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), best_conf.tolist(), conf, iou,
+                                   top_k=MAX_DETECTIONS)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        detections = np.empty((len(indices), 6), dtype=np.float32)
+        detections[:, :4] = xyxy[indices]
+        detections[:, 4] = best_conf[indices]
+        detections[:, 5] = cls[indices]
+        per_frame.append(detections)
+    return per_frame
+
+
+class InferenceBackend:
+    """Interfaz común: predict(lista de frames BGR) → lista de arrays (N, 6)"""
+
+    name = None
+
+    def __init__(self, model_path, threads=0, conf=0.5, iou=IOU_THRESHOLD, classes=None):
+        self.model_path = model_path
+        self.threads = threads  # 0 = lo que decida el runtime (todos los núcleos)
+        self.conf = conf
+        self.iou = iou
+        self.classes = list(classes) if classes is not None else None
+
+    def predict(self, frames):
+        raise NotImplementedError
+
+    def describe(self):
+        return {'backend': self.name, 'model': self.model_path, 'threads': self.threads}
+
+
+class TorchBackend(InferenceBackend):
+    name = 'pytorch'
+
+    def __init__(self, model_path, threads=0, **kwargs):
+        super().__init__(model_path, threads, **kwargs)
+        import torch
+        from ultralytics import YOLO
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+
+    def predict(self, frames):
+        results = self.model(frames, conf=self.conf, iou=self.iou, classes=self.classes,
+                             max_det=MAX_DETECTIONS, verbose=False)
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+
+class ExportedBackend(InferenceBackend):
+    """
+    Modelo exportado (ONNX / OpenVINO): preproceso y NMS propios.
+    Si el modelo tiene batch fijo se ejecuta de a un frame.
+    """
+
+    def __init__(self, model_path, threads=0, imgsz=DEFAULT_IMGSZ, **kwargs):
+        super().__init__(model_path, threads, **kwargs)
+        self.imgsz = imgsz
+        self.dynamic_batch = True
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames):
+        blob, transforms = preprocess(frames, self.imgsz)
+        if self.dynamic_batch or len(frames) == 1:
+            output = self._run(blob)
+        else:
+            output = np.concatenate([self._run(blob[i:i + 1]) for i in range(len(frames))])
+        return postprocess(output, transforms, self.conf, self.iou, self.classes)
+
+    def describe(self):
+        info = super().describe()
+        info.update({'imgsz': self.imgsz, 'dynamic_batch': self.dynamic_batch})
+        return info
+
+
+class OnnxBackend(ExportedBackend):
+    name = 'onnx'
+
+    def __init__(self, model_path, threads=0, **kwargs):
+        super().__init__(model_path, threads, **kwargs)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Dimensiones simbólicas (export dinámico) vienen como str
+        batch, _, height, _ = model_input.shape
+        self.dynamic_batch = not isinstance(batch, int)
+        if isinstance(height, int):
+            self.imgsz = height
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    name = 'openvino'
+
+    def __init__(self, model_path, threads=0, **kwargs):
+        super().__init__(model_path, threads, **kwargs)
+        import openvino as ov
+        if os.path.isdir(model_path):
+            # Directorio de ultralytics (<nombre>_openvino_model/<nombre>.xml)
+            xml = [name for name in os.listdir(model_path) if name.endswith('.xml')]
+            if not xml:
+                raise FileNotFoundError(f"No hay .xml en {model_path}")
+            model_path = os.path.join(model_path, xml[0])
+        core = ov.Core()
+        model = core.read_model(model_path)
+        height = model.input(0).get_partial_shape()[2]
+        if height.is_static:
+            self.imgsz = height.get_length()
+        # Batch dinámico para inferir varias cámaras en una llamada
+        model.reshape([-1, 3, self.imgsz, self.imgsz])
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+def create_backend(name, model_path, threads=0, **kwargs):
+    """Backend por nombre ('pytorch', 'onnx', 'openvino')"""
+    backends = {'pytorch': TorchBackend, 'onnx': OnnxBackend, 'openvino': OpenVinoBackend}
+    if name not in backends:
+        raise ValueError(f"Backend desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    return backends[name](default_model_path(name, model_path), threads, **kwargs)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark de backends de inferencia: FPS y concordancia de detecciones
+- Cada backend como nombre:modelo (pytorch:yolov8n.pt, onnx:yolov8n_int8.onnx, ...)
+- FPS con el batch y los threads elegidos, sobre frames propios (--images)
+- Concordancia contra el primer backend (referencia): misma clase e IoU >= 0.5,
+  emparejadas de mayor a menor IoU; F1, IoU medio y diferencia de confianza
+
+Uso: python3 bench_backends.py --images frames/ [--threads 4] [--batch 1] pytorch:yolov8n.pt onnx:yolov8n.onnx
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backends import DEFAULT_IMGSZ, create_backend
+from export_model import frames_from_directory
+
+VEHICLE_CLASSES = (2, 3, 5, 7)  # Igual que el detector
+MATCH_IOU = 0.5
+WARMUP_CALLS = 3
+
+
+def box_iou(a, b):
+    """IoU entre todas las cajas de a (N, 4) y b (M, 4) → (N, M)"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match(reference, other):
+    """Pares (iou, delta de confianza) emparejados greedy por IoU con la misma clase"""
+    if not len(reference) or not len(other):
+        return []
+    iou = box_iou(reference[:, :4], other[:, :4])
+    iou[reference[:, 5][:, None] != other[:, 5][None, :]] = 0
+    pairs = []
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < MATCH_IOU:
+            return pairs
+        pairs.append((iou[i, j], abs(reference[i, 4] - other[j, 4])))
+        iou[i, :] = 0
+        iou[:, j] = 0
+
+
+def run_backend(backend, frames, batch):
+    """(frames/s, ms por llamada, detecciones por frame)"""
+    for _ in range(WARMUP_CALLS):
+        backend.predict(frames[:batch])
+    detections = []
+    calls = 0
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        detections.extend(backend.predict(frames[i:i + batch]))
+        calls += 1
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, elapsed / calls * 1000, detections
+
+
+def agreement(reference, detections):
+    """(F1, IoU medio, delta de confianza medio) contra la referencia"""
+    matched = total_ref = total_other = 0
+    ious, deltas = [], []
+    for ref, other in zip(reference, detections):
+        pairs = match(ref, other)
+        matched += len(pairs)
+        total_ref += len(ref)
+        total_other += len(other)
+        ious.extend(p[0] for p in pairs)
+        deltas.extend(p[1] for p in pairs)
+    f1 = 2 * matched / (total_ref + total_other) if total_ref + total_other else 1.0
+    return f1, float(np.mean(ious)) if ious else 0.0, float(np.mean(deltas)) if deltas else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('backends', nargs='+', help='nombre:modelo; el primero es la referencia')
+    parser.add_argument('--images', required=True, help='Directorio de frames propios')
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=0, help='0 = todos los núcleos')
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--all-classes', action='store_true', help='No filtrar a vehículos')
+    args = parser.parse_args()
+
+    frames = frames_from_directory(args.images, args.limit)
+    if not frames:
+        raise SystemExit(f"✗ Sin frames en {args.images}")
+    classes = None if args.all_classes else VEHICLE_CLASSES
+
+    print("\n" + "=" * 70)
+    print("⚡ BENCHMARK DE BACKENDS DE INFERENCIA")
+    print("=" * 70)
+    print(f"{len(frames)} frames, batch {args.batch}, threads {args.threads or 'auto'}\n")
+    print(f"  {'backend':<40s} {'FPS':>7s} {'ms/llam':>8s} {'det':>6s} {'F1':>6s} {'IoU':>6s} {'Δconf':>6s}")
+
+    reference = None
+    base_fps = None
+    for spec in args.backends:
+        name, _, model_path = spec.partition(':')
+        kwargs = {'conf': args.conf, 'classes': classes}
+        if name != 'pytorch':
+            kwargs['imgsz'] = args.imgsz
+        backend = create_backend(name, model_path or 'yolov8n.pt', args.threads, **kwargs)
+        fps, call_ms, detections = run_backend(backend, frames, args.batch)
+        count = sum(len(d) for d in detections)
+        if reference is None:
+            reference, base_fps = detections, fps
+            f1, iou, delta = 1.0, 1.0, 0.0
+        else:
+            f1, iou, delta = agreement(reference, detections)
+        label = f"{name}:{backend.model_path}"[-40:]
+        print(f"  {label:<40s} {fps:7.1f} {call_ms:8.1f} {count:6d} {f1:6.1%} {iou:6.2f} {delta:6.3f}"
+              f"   ({fps / base_fps:.2f}x)")
+    print()
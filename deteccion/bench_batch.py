@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inferencia en batch vs. un frame por llamada
+- Parte 1: throughput crudo del modelo por tamaño de batch (1, 2, 4, 8...)
+- Parte 2: N cámaras a F FPS a través de la etapa de inferencia del pipeline,
+  con batching (max batch / max wait) y sin él: frames/s procesados,
+  latencia p50/p99 (entrega → resultado) y espera agregada por el batch
+- --simulate OVERHEAD_MS,PER_FRAME_MS reemplaza el modelo por un costo fijo
+  por llamada + uno por frame (prueba el scheduler sin PyTorch)
+
+Uso: python3 bench_batch.py --streams 4 --fps 15 [--image frame.jpg] [--max-batch 8] [--max-wait-ms 10]
+"""
+
+import argparse
+import heapq
+import time
+
+from pipeline import BatchStage, Pipeline, Stage
+
+BATCH_SIZES = (1, 2, 4, 8)
+FRAME_SHAPE = (320, 480, 3)  # HVGA como el ESP32-CAM
+
+
+class Job:
+    __slots__ = ('stream', 'frame', 'submitted')
+
+    def __init__(self, stream, frame, submitted):
+        self.stream = stream
+        self.frame = frame
+        self.submitted = submitted
+
+
+def load_infer(args):
+    """(función que infiere una lista de frames, frame de prueba)"""
+    if args.simulate:
+        overhead_ms, per_frame_ms = (float(x) for x in args.simulate.split(','))
+
+        def infer(frames):
+            time.sleep((overhead_ms + per_frame_ms * len(frames)) / 1000)
+            return [[] for _ in frames]
+        return infer, None
+
+    import cv2
+    import numpy as np
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    if args.image:
+        frame = cv2.imread(args.image)
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, FRAME_SHAPE, dtype=np.uint8)
+
+    def infer(frames):
+        return model(frames, conf=0.5, verbose=False)
+    infer([frame])  # Calentar (primera llamada inicializa el backend)
+    return infer, frame
+
+
+def raw_throughput(infer, frame, seconds):
+    print(f"\n  {'batch':>5s} {'frames/s':>10s} {'ms/batch':>10s} {'ms/frame':>10s}")
+    base = None
+    for size in BATCH_SIZES:
+        frames = [frame] * size
+        calls = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            infer(frames)
+            calls += 1
+        elapsed = time.perf_counter() - start
+        fps = calls * size / elapsed
+        base = base or fps
+        print(f"  {size:5d} {fps:10.1f} {elapsed / calls * 1000:10.1f} "
+              f"{elapsed / calls / size * 1000:10.1f}   ({fps / base:.2f}x)")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_streams(infer, frame, streams, fps, seconds, max_batch, max_wait):
+    """N cámaras desfasadas entre sí a `fps` cada una contra la etapa de inferencia"""
+    latencies = []
+
+    def inference(jobs):
+        infer([job.frame for job in jobs])
+        return jobs
+
+    def sink(job):
+        latencies.append(time.perf_counter() - job.submitted)
+
+    stage = BatchStage('inference', inference, max_batch, max_wait, key=lambda job: job.stream)
+    pipeline = Pipeline([stage, Stage('sink', sink)])
+    pipeline.start()
+
+    # Cámaras sin sincronizar: cada una con su fase dentro del intervalo
+    interval = 1.0 / fps
+    start = time.perf_counter() + 0.1
+    schedule = [(start + i * interval / streams, i) for i in range(streams)]
+    heapq.heapify(schedule)
+    submitted = 0
+    while schedule[0][0] < start + seconds:
+        due, stream = heapq.heappop(schedule)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pipeline.submit(Job(stream, frame, time.perf_counter()))
+        submitted += 1
+        heapq.heappush(schedule, (due + interval, stream))
+    time.sleep(0.5)
+
+    stats = stage.stats()
+    return {
+        'submitted': submitted,
+        'processed': stats['processed'],
+        'fps': stats['processed'] / seconds,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'avg_batch': stats['processed'] / stats['batches'] if stats['batches'] else 0.0,
+        'dropped': stats['dropped']
+    }
+
+
+def print_run(label, result):
+    print(f"  {label:<22s} {result['fps']:8.1f} {result['processed'] / result['submitted']:8.1%} "
+          f"{result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['avg_batch']:7.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--image', default=None, help='JPEG de prueba (por defecto ruido)')
+    parser.add_argument('--simulate', default=None, metavar='OVERHEAD_MS,PER_FRAME_MS')
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=15.0, help='FPS por cámara')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print("⚡ BENCHMARK INFERENCIA EN BATCH")
+    print("=" * 70)
+    infer, frame = load_infer(args)
+    print(f"Modelo: {'simulado ' + args.simulate if args.simulate else args.model}")
+
+    print("\n📦 Throughput crudo por tamaño de batch")
+    raw_throughput(infer, frame, max(1.0, args.seconds / 4))
+
+    print(f"\n📡 {args.streams} cámaras × {args.fps:.0f} FPS ({args.streams * args.fps:.0f} frames/s ofrecidos)")
+    print(f"  {'modo':<22s} {'frames/s':>8s} {'procesado':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'batch':>7s}")
+    single = run_streams(infer, frame, args.streams, args.fps, args.seconds, 1, 0.0)
+    print_run('un frame por llamada', single)
+    batched = run_streams(infer, frame, args.streams, args.fps, args.seconds,
+                          args.max_batch, args.max_wait_ms / 1000)
+    print_run(f"batch ≤{args.max_batch}, ≤{args.max_wait_ms:.0f}ms", batched)
+
+    gain = batched['fps'] / single['fps'] if single['fps'] else 0.0
+    print(f"\n✅ Throughput {gain:.2f}x; latencia p50 {batched['p50_ms'] - single['p50_ms']:+.1f} ms\n")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark del color dominante: por caja (anterior) vs. en lote (colors.py)
+- Frames sintéticos con vehículos de colores (ruido, sombras, fondo de calle)
+  o frames propios (--images) con cajas al azar
+- Por cantidad de cajas: ms por frame y coincidencia de etiquetas con el
+  método anterior, para el lote completo y submuestreado (COLOR_SAMPLE_STEP)
+
+Uso: python3 bench_colors.py [--frames 100] [--boxes 5 20 60] [--images frames/]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from colors import classify_colors
+
+FRAME_SIZE = (320, 480)  # HVGA como el ESP32-CAM
+STEPS = (1, 2, 4)
+# Colores de carrocería en HSV de OpenCV (H 0..179)
+PAINTS = ((0, 200, 180), (15, 200, 200), (30, 200, 220), (60, 150, 150), (110, 200, 150),
+          (145, 150, 150), (0, 10, 240), (0, 10, 20), (0, 10, 128), (165, 120, 140))
+
+
+def legacy_dominant_color(image, bbox):
+    """Método anterior: HSV e histograma por caja y cadena de if"""
+    x1, y1, x2, y2 = map(int, bbox)
+    h, w = image.shape[:2]
+    x1, x2 = max(0, x1), min(w, x2)
+    y1, y2 = max(0, y1), min(h, y2)
+    if x2 <= x1 or y2 <= y1:
+        return "desconocido"
+    roi = image[y1:y2, x1:x2]
+    if roi.size == 0:
+        return "desconocido"
+    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0], None, [180], [0, 180])
+    dominant_hue = np.argmax(hist)
+    if dominant_hue < 10 or dominant_hue > 170:
+        return "rojo"
+    elif 10 <= dominant_hue < 25:
+        return "naranja"
+    elif 25 <= dominant_hue < 40:
+        return "amarillo"
+    elif 40 <= dominant_hue < 80:
+        return "verde"
+    elif 80 <= dominant_hue < 130:
+        return "azul"
+    elif 130 <= dominant_hue < 160:
+        return "morado"
+    else:
+        s_mean = np.mean(hsv[:, :, 1])
+        v_mean = np.mean(hsv[:, :, 2])
+        if s_mean < 50 and v_mean > 200:
+            return "blanco"
+        elif s_mean < 50 and v_mean < 50:
+            return "negro"
+        else:
+            return "gris"
+
+
+def random_boxes(rng, count, height, width):
+    x1 = rng.integers(-10, width - 20, count)
+    y1 = rng.integers(-10, height - 20, count)
+    w = rng.integers(20, width // 3, count)
+    h = rng.integers(15, height // 3, count)
+    return [tuple(box) for box in np.stack([x1, y1, x1 + w, y1 + h], axis=1).tolist()]
+
+
+def synthetic_frame(rng, boxes):
+    """Calle gris con ruido y un vehículo pintado (con sombra y vidrios) por caja"""
+    height, width = FRAME_SIZE
+    hsv = np.empty((height, width, 3), dtype=np.uint8)
+    hsv[..., 0] = rng.integers(0, 180, (height, width))
+    hsv[..., 1] = rng.integers(0, 40, (height, width))
+    hsv[..., 2] = rng.integers(70, 130, (height, width))
+    for x1, y1, x2, y2 in boxes:
+        x1, y1 = max(0, x1), max(0, y1)
+        paint = PAINTS[rng.integers(len(PAINTS))]
+        region = hsv[y1:y2, x1:x2]
+        if not region.size:
+            continue
+        region[...] = paint
+        region[..., 0] = (region[..., 0].astype(np.int64) + rng.integers(-3, 4, region.shape[:2])) % 180
+        region[..., 2] = np.clip(region[..., 2].astype(np.int64) + rng.integers(-25, 26, region.shape[:2]), 0, 255)
+        region[: region.shape[0] // 3, ..., 1:] //= 3  # Vidrios oscuros
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def time_per_frame(func, cases):
+    start = time.perf_counter()
+    results = [func(frame, boxes) for frame, boxes in cases]
+    return (time.perf_counter() - start) / len(cases) * 1000, results
+
+
+def agreement(reference, results):
+    pairs = [(a, b) for ref, res in zip(reference, results) for a, b in zip(ref, res)]
+    return sum(a == b for a, b in pairs) / len(pairs) if pairs else 1.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--boxes', type=int, nargs='+', default=[5, 20, 60])
+    parser.add_argument('--images', default=None, help='Directorio de frames propios')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = None
+    if args.images:
+        from export_model import frames_from_directory
+        images = frames_from_directory(args.images, args.frames)
+
+    print("\n" + "=" * 70)
+    print("⚡ BENCHMARK COLOR DOMINANTE")
+    print("=" * 70)
+    print(f"{args.frames} frames {'propios' if images else 'sintéticos'}\n")
+    print(f"  {'cajas':>5s} {'método':<14s} {'ms/frame':>9s} {'speedup':>8s} {'coincide':>9s}")
+
+    for count in args.boxes:
+        cases = []
+        for i in range(args.frames):
+            if images:
+                frame = images[i % len(images)]
+                cases.append((frame, random_boxes(rng, count, *frame.shape[:2])))
+            else:
+                boxes = random_boxes(rng, count, *FRAME_SIZE)
+                cases.append((synthetic_frame(rng, boxes), boxes))
+
+        base_ms, reference = time_per_frame(
+            lambda frame, boxes: [legacy_dominant_color(frame, box) for box in boxes], cases)
+        print(f"  {count:5d} {'por caja':<14s} {base_ms:9.2f} {'1.00x':>8s} {'100.0%':>9s}")
+        for step in STEPS:
+            ms, results = time_per_frame(
+                lambda frame, boxes: classify_colors(frame, boxes, step), cases)
+            print(f"  {count:5d} {f'lote step={step}':<14s} {ms:9.2f} {base_ms / ms:7.2f}x "
+                  f"{agreement(reference, results):9.1%}")
+    print()
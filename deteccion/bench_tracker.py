@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark del tracker: loop por vehículo (anterior) vs. Tracker vectorizado
+- Tráfico sintético denso: carriles, velocidades distintas, ruido en las cajas,
+  detecciones perdidas y vehículos que entran y salen de escena
+- Por tamaño de escena: ms por frame, IDs creados vs. vehículos reales,
+  cambios de ID y detecciones que reclamaron el mismo ID en un frame
+
+Uso: python3 bench_tracker.py [--frames 300] [--vehicles 25 100 300]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from tracker import SCIPY_AVAILABLE, Tracker
+
+MAX_DISTANCE = 100  # Igual que el detector
+MAX_MISSING = 30
+LANE_HEIGHT = 40
+CAR_SIZE = (60, 30)
+
+
+def legacy_update(tracked, boxes, frame_number, next_id):
+    """Algoritmo anterior: cada detección toma el rastreado más cercano (greedy)"""
+    ids = []
+    for bbox in boxes:
+        center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        best_id, best_distance = None, float('inf')
+        for vehicle_id, data in tracked.items():
+            other = data['bbox']
+            distance = np.sqrt((center[0] - (other[0] + other[2]) / 2) ** 2 +
+                               (center[1] - (other[1] + other[3]) / 2) ** 2)
+            if distance < MAX_DISTANCE and distance < best_distance:
+                best_id, best_distance = vehicle_id, distance
+        if best_id is None:
+            best_id = next_id
+            next_id += 1
+        tracked[best_id] = {'bbox': bbox, 'last_seen': frame_number}
+        ids.append(best_id)
+    for vehicle_id in [v for v, d in tracked.items() if frame_number - d['last_seen'] > MAX_MISSING]:
+        del tracked[vehicle_id]
+    return ids, next_id
+
+
+def synthetic_traffic(vehicles, frames, seed):
+    """Por frame: (cajas, ID real de cada caja), en orden aleatorio como YOLO"""
+    rng = np.random.default_rng(seed)
+    lanes = max(4, vehicles // 8)
+    width = 1920
+    # Cada vehículo entra en un frame al azar y cruza la escena por su carril
+    lane = rng.integers(0, lanes, vehicles)
+    direction = rng.choice([-1, 1], lanes)  # Sentido por carril
+    speed = rng.uniform(4, 14, vehicles) * direction[lane]
+    start = rng.integers(-frames // 2, frames, vehicles)
+    origin = np.where(speed > 0, -CAR_SIZE[0], width)
+
+    for frame in range(frames):
+        x = origin + speed * (frame - start)
+        visible = (frame >= start) & (x > -CAR_SIZE[0]) & (x < width)
+        visible &= rng.random(vehicles) > 0.05  # Detecciones perdidas
+        truth = np.flatnonzero(visible)
+        rng.shuffle(truth)
+        x1 = x[truth] + rng.normal(0, 2, len(truth))
+        y1 = lane[truth] * LANE_HEIGHT + rng.normal(0, 2, len(truth))
+        boxes = np.stack([x1, y1, x1 + CAR_SIZE[0], y1 + CAR_SIZE[1]], axis=1).astype(np.float32)
+        yield boxes, truth
+
+
+def evaluate(run, traffic):
+    """(ms por frame, IDs creados, vehículos reales, cambios de ID, IDs duplicados)"""
+    assigned = {}
+    switches = duplicates = 0
+    elapsed = 0.0
+    seen = set()
+    for frame, (boxes, truth) in enumerate(traffic):
+        start = time.perf_counter()
+        ids = run(boxes, frame)
+        elapsed += time.perf_counter() - start
+        duplicates += len(ids) - len(set(ids))
+        for true_id, track_id in zip(truth.tolist(), ids):
+            seen.add(true_id)
+            if assigned.get(true_id, track_id) != track_id:
+                switches += 1
+            assigned[true_id] = track_id
+    return elapsed / (frame + 1) * 1000, switches, duplicates, len(seen)
+
+
+def run_legacy(vehicles, frames, seed):
+    state = {'tracked': {}, 'next_id': 1}
+
+    def run(boxes, frame):
+        ids, state['next_id'] = legacy_update(state['tracked'], boxes.tolist(), frame, state['next_id'])
+        return ids
+    result = evaluate(run, synthetic_traffic(vehicles, frames, seed))
+    return result + (state['next_id'] - 1,)
+
+
+def run_vectorized(vehicles, frames, seed):
+    tracker = Tracker(MAX_DISTANCE, MAX_MISSING)
+    state = {'next_id': 1}
+
+    def run(boxes, frame):
+        ids, new = tracker.update(boxes, frame, state['next_id'])
+        state['next_id'] += int(new.sum())
+        return ids.tolist()
+    result = evaluate(run, synthetic_traffic(vehicles, frames, seed))
+    return result + (state['next_id'] - 1,)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--vehicles', type=int, nargs='+', default=[25, 100, 300])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print("⚡ BENCHMARK TRACKER")
+    print("=" * 70)
+    print(f"{args.frames} frames; asignación: {'húngaro (scipy)' if SCIPY_AVAILABLE else 'greedy uno a uno'}\n")
+    print(f"  {'vehículos':>9s} {'tracker':<11s} {'ms/frame':>9s} {'IDs':>6s} {'reales':>7s} "
+          f"{'cambios':>8s} {'duplic.':>8s}")
+    for vehicles in args.vehicles:
+        for label, run in (('loop', run_legacy), ('vectorial', run_vectorized)):
+            ms, switches, duplicates, real, created = run(vehicles, args.frames, args.seed)
+            print(f"  {vehicles:9d} {label:<11s} {ms:9.2f} {created:6d} {real:7d} {switches:8d} {duplicates:8d}")
+    print()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Color dominante de todas las detecciones de un frame en una pasada
+- El frame se convierte a HSV una sola vez (opcionalmente submuestreado)
+  cuando las cajas cubren más que el frame (tráfico denso, cajas que se
+  superponen); con pocas cajas chicas se convierte solo cada caja
+- Histograma de tono por caja (calcHist, en C); el argmax y la tabla
+  tono → color van vectorizados para todas las cajas
+- Mismas reglas y etiquetas que la clasificación por caja anterior
+  (rojo, naranja, ..., gris)
+"""
+
+import cv2
+import numpy as np
+
+HUE_BINS = 180
+COLOR_NAMES = ('rojo', 'naranja', 'amarillo', 'verde', 'azul', 'morado',
+               'blanco', 'negro', 'gris', 'desconocido')
+ACHROMATIC = -1  # Tono sin color propio: decide la saturación/brillo medios
+BLANCO, NEGRO, GRIS, DESCONOCIDO = (COLOR_NAMES.index(name)
+                                    for name in ('blanco', 'negro', 'gris', 'desconocido'))
+
+
+def build_hue_lut():
+    """Tono dominante (0..179) → índice en COLOR_NAMES, o ACHROMATIC"""
+    lut = np.full(HUE_BINS, ACHROMATIC, dtype=np.int8)
+    for hue in range(HUE_BINS):
+        if hue < 10 or hue > 170:
+            lut[hue] = 0
+        elif hue < 25:
+            lut[hue] = 1
+        elif hue < 40:
+            lut[hue] = 2
+        elif hue < 80:
+            lut[hue] = 3
+        elif hue < 130:
+            lut[hue] = 4
+        elif hue < 160:
+            lut[hue] = 5
+    return lut
+
+
+HUE_LUT = build_hue_lut()
+
+
+def classify_colors(frame, bboxes, step=1):
+    """
+    Nombre del color dominante de cada caja (x1, y1, x2, y2) de `frame` (BGR).
+    `step` > 1 toma un píxel de cada step×step (más rápido, casi igual).
+    """
+    if not len(bboxes):
+        return []
+    height, width = frame.shape[:2]
+
+    # Cajas recortadas al frame y llevadas a la escala submuestreada
+    boxes = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+    valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    scaled = boxes.copy()
+    scaled[:, :2] = -(-boxes[:, :2] // step)  # Primer píxel muestreado dentro de la caja
+    scaled[:, 2:] = -(-boxes[:, 2:] // step)
+    valid &= (scaled[:, 2] > scaled[:, 0]) & (scaled[:, 3] > scaled[:, 1])
+
+    # Convertir el frame entero solo si es menos trabajo que convertir cada caja
+    areas = (scaled[:, 2] - scaled[:, 0]) * (scaled[:, 3] - scaled[:, 1])
+    shared = None
+    if areas[valid].sum() >= -(-height // step) * -(-width // step):
+        shared = cv2.cvtColor(np.ascontiguousarray(frame[::step, ::step]), cv2.COLOR_BGR2HSV)
+
+    # Histogramas de tono de todas las cajas (N, 180)
+    hist = np.zeros((len(boxes), HUE_BINS), dtype=np.float32)
+    rois = {}
+    for i, (x1, y1, x2, y2) in zip(np.flatnonzero(valid).tolist(), scaled[valid].tolist()):
+        if shared is not None:
+            roi = shared[y1:y2, x1:x2]
+        else:
+            region = frame[y1 * step:y2 * step:step, x1 * step:x2 * step:step]
+            if step > 1:
+                region = np.ascontiguousarray(region)
+            roi = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)
+        hist[i] = cv2.calcHist([roi], [0], None, [HUE_BINS], [0, HUE_BINS]).ravel()
+        rois[i] = roi
+    labels = HUE_LUT[hist.argmax(axis=1)].astype(np.int64)
+
+    # Tono sin color propio: saturación y brillo medios (pocas cajas)
+    for i in np.flatnonzero(valid & (labels == ACHROMATIC)).tolist():
+        _, s_mean, v_mean, _ = cv2.mean(rois[i])
+        if s_mean < 50 and v_mean > 200:
+            labels[i] = BLANCO
+        elif s_mean < 50 and v_mean < 50:
+            labels[i] = NEGRO
+        else:
+            labels[i] = GRIS
+
+    labels[~valid] = DESCONOCIDO
+    return [COLOR_NAMES[i] for i in labels.tolist()]
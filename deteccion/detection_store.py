@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Almacén de detecciones: SQLite en modo WAL con un escritor en segundo plano
+- put() solo encola (nunca bloquea al pipeline)
+- El escritor confirma en lotes: cada `batch_size` detecciones o cada
+  `max_delay` segundos, lo que ocurra primero (una transacción por lote)
+- WAL: los lectores (API, reportes) no bloquean al escritor ni al revés; un
+  corte a mitad de lote no deja la base inconsistente (se pierde a lo sumo
+  lo encolado sin confirmar)
+- Vista XML para ReporteController (vehiculos_db.xml): cada lote se escribe
+  en su lugar sobre el cierre del archivo (costo según el lote, no según el
+  historial). Al iniciar se regenera entera desde la base (temporal + rename)
+- Primera vez: importa el historial del XML existente
+- Consultas paginadas por cursor (fecha descendente) sobre índices por fecha
+  y por tipo+fecha: el costo depende de la página, no del historial
+- Rollups por minuto, hora y día (cámara × tipo × color): cada vehículo
+  nuevo suma 1 a su bucket de cada tamaño; se confirman en la misma
+  transacción que las detecciones y se leen con una consulta por rango
+
+Uso: python3 detection_store.py export|import [--db ruta] [--xml ruta]
+"""
+
+import argparse
+import csv
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    camera TEXT,
+    vehicle_id INTEGER,
+    type TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    color TEXT,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE INDEX IF NOT EXISTS detections_timestamp ON detections (timestamp);
+CREATE INDEX IF NOT EXISTS detections_type_timestamp ON detections (type, timestamp);
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket TEXT NOT NULL,
+    start REAL NOT NULL,
+    camera TEXT NOT NULL,
+    type TEXT NOT NULL,
+    color TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (bucket, start, camera, type, color)
+) WITHOUT ROWID;
+"""
+UPSERT_ROLLUP = ("INSERT INTO rollups (bucket, start, camera, type, color, count) VALUES (?, ?, ?, ?, ?, ?) "
+                 "ON CONFLICT (bucket, start, camera, type, color) DO UPDATE SET count = count + excluded.count")
+INSERT = ("INSERT INTO detections (timestamp, camera, vehicle_id, type, confidence, color, x1, y1, x2, y2) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+# Nombres de YOLO → nombres en español del XML (los que filtra Laravel)
+TIPO_MAP = {
+    'car': 'Auto',
+    'motorcycle': 'Moto',
+    'bus': 'Bus',
+    'truck': 'Camión'
+}
+TYPE_MAP = {tipo: vehicle_type for vehicle_type, tipo in TIPO_MAP.items()}
+
+XML_HEADER = "<?xml version='1.0' encoding='utf-8'?>\n<detecciones>\n"
+XML_FOOTER = "</detecciones>\n"
+FECHA_FORMAT = '%Y-%m-%d %H:%M:%S'
+DAY_FORMAT = '%Y-%m-%d'
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 1000
+EXPORT_CHUNK = 1000
+# Mismas columnas que ReporteController::exportarExcel
+CSV_HEADER = ['Fecha', 'Tipo', 'Color', 'Confianza (%)']
+
+# Rollups: buckets en hora local (como los días del reporte)
+ROLLUP_BUCKETS = ('minute', 'hour', 'day')
+ROLLUP_BUCKET_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+ROLLUP_DEFAULT_SPAN = {'minute': 2 * 3600, 'hour': 2 * 86400, 'day': 30 * 86400}
+ROLLUP_MAX_BUCKETS = 5000  # Por consulta
+ROLLUP_MINUTE_RETENTION = 7 * 86400  # Los de hora y día no se borran
+ROLLUP_PRUNE_INTERVAL = 3600
+
+MAX_WRITE_BATCH = 1000  # Si el escritor se atrasa, toma lo acumulado hasta esto por transacción
+
+# Tipos de item en la cola del escritor
+DETECTION = 'detection'
+COUNT = 'count'
+
+
+def xml_entry(timestamp, vehicle_type, confidence, color):
+    """Un <deteccion> con el mismo formato que escribía save_detection_to_xml"""
+    return ("  <deteccion>\n"
+            f"    <fecha>{datetime.fromtimestamp(timestamp).strftime(FECHA_FORMAT)}</fecha>\n"
+            f"    <tipo>{escape(TIPO_MAP.get(vehicle_type, 'Auto'))}</tipo>\n"
+            f"    <confianza>{confidence * 100:.2f}</confianza>\n"
+            f"    <color>{escape(color or 'desconocido')}</color>\n"
+            "  </deteccion>\n")
+
+
+def open_database(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # Con WAL, NORMAL no corrompe ante un corte; solo puede perder el último lote
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def export_xml(connection, xml_path):
+    """Regenera el XML completo desde la base (archivo temporal + rename atómico)"""
+    temp_path = f"{xml_path}.tmp"
+    rows = 0
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(XML_HEADER)
+        cursor = connection.execute('SELECT timestamp, type, confidence, color FROM detections ORDER BY id')
+        for row in cursor:
+            f.write(xml_entry(*row))
+            rows += 1
+        f.write(XML_FOOTER)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, xml_path)
+    return rows
+
+
+def append_xml(xml_path, entries):
+    """
+    Agrega detecciones al XML en su lugar: escribe las nuevas entradas más el
+    cierre encima del cierre actual (un solo pwrite y fsync; el costo depende
+    del lote, no del historial). Un corte a mitad de escritura lo repara
+    open(), que regenera el XML desde la base.
+    Retorna False si el archivo no termina como se espera (hay que regenerarlo).
+    """
+    footer = XML_FOOTER.encode()
+    fd = os.open(xml_path, os.O_RDWR)
+    try:
+        size = os.fstat(fd).st_size
+        if size < len(footer) or os.pread(fd, len(footer), size - len(footer)) != footer:
+            return False
+        os.pwrite(fd, ''.join(entries).encode('utf-8') + footer, size - len(footer))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return True
+
+
+def import_xml(connection, xml_path):
+    """Carga el historial del XML anterior (una sola vez, con la base vacía)"""
+    rows = []
+    for det in ET.parse(xml_path).getroot().iter('deteccion'):
+        try:
+            timestamp = time.mktime(time.strptime(det.findtext('fecha', ''), FECHA_FORMAT))
+            confidence = float(det.findtext('confianza', '0')) / 100
+        except ValueError:
+            continue
+        vehicle_type = TYPE_MAP.get(det.findtext('tipo', ''), 'car')
+        color = det.findtext('color') or 'desconocido'
+        rows.append((timestamp, None, None, vehicle_type, confidence, color, None, None, None, None))
+    with connection:
+        connection.executemany(INSERT, rows)
+    return len(rows)
+
+
+def bucket_starts(timestamp):
+    """(bucket, inicio) del minuto, la hora y el día locales que contienen `timestamp`"""
+    minute = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0)
+    return (('minute', minute.timestamp()),
+            ('hour', minute.replace(minute=0).timestamp()),
+            ('day', minute.replace(hour=0, minute=0).timestamp()))
+
+
+def parse_time(value):
+    """Timestamp unix o fecha ISO local ('2026-10-18', '2026-10-18 14:00'); ValueError si no"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def query_rollups(connection, bucket, start, end, camera=None):
+    """
+    Buckets de tamaño `bucket` que contienen algún instante de [start, end),
+    en orden, con el total y el desglose por tipo, color y cámara. Una sola
+    consulta por rango de la clave primaria.
+    """
+    sql = 'SELECT start, camera, type, color, count FROM rollups WHERE bucket = ? AND start >= ? AND start < ?'
+    params = [bucket, dict(bucket_starts(start))[bucket], end]
+    if camera is not None:
+        sql += ' AND camera = ?'
+        params.append(camera)
+    buckets = {}
+    for bucket_start, bucket_camera, vehicle_type, color, count in connection.execute(sql + ' ORDER BY start', params):
+        entry = buckets.get(bucket_start)
+        if entry is None:
+            entry = buckets[bucket_start] = {
+                'start': bucket_start,
+                'fecha': datetime.fromtimestamp(bucket_start).strftime(FECHA_FORMAT),
+                'total': 0,
+                'types': Counter(),
+                'colors': Counter(),
+                'cameras': Counter()
+            }
+        entry['total'] += count
+        entry['types'][vehicle_type] += count
+        entry['colors'][color] += count
+        entry['cameras'][bucket_camera] += count
+    return list(buckets.values())
+
+
+def open_readonly(path):
+    """Conexión de solo lectura (una por request; WAL deja leer mientras se escribe)"""
+    return sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+
+def day_start(value, next_day=False):
+    """'YYYY-MM-DD' (hora local) → timestamp de las 00:00 de ese día o del siguiente"""
+    day = datetime.strptime(value, DAY_FORMAT)
+    if next_day:
+        day += timedelta(days=1)
+    return day.timestamp()
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp!r}_{row_id}"
+
+
+def decode_cursor(cursor):
+    """Cursor → (timestamp, id) de la última fila entregada; ValueError si no es válido"""
+    timestamp, row_id = cursor.split('_')
+    return float(timestamp), int(row_id)
+
+
+def build_filters(tipo=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Filtros del reporte → (tipo de YOLO o None, desde, hasta exclusivo):
+    tipo Auto/Moto/... (o el nombre de YOLO) y rango de días inclusivo.
+    ValueError si una fecha no es válida.
+    """
+    return (TYPE_MAP.get(tipo, tipo) if tipo else None,
+            day_start(fecha_inicio) if fecha_inicio else None,
+            day_start(fecha_fin, next_day=True) if fecha_fin else None)
+
+
+def detection_record(row):
+    """Fila → registro con los campos del reporte (como el XML) más los propios de la base"""
+    row_id, timestamp, camera, vehicle_id, vehicle_type, confidence, color = row
+    return {
+        'id': row_id,
+        'fecha': datetime.fromtimestamp(timestamp).strftime(FECHA_FORMAT),
+        'tipo': TIPO_MAP.get(vehicle_type, 'Auto'),
+        'confianza': round(confidence * 100, 2),
+        'color': color or 'desconocido',
+        'camara': camera,
+        'vehiculo_id': vehicle_id,
+        'timestamp': timestamp
+    }
+
+
+def query_page(connection, filters, cursor=None, limit=QUERY_DEFAULT_LIMIT):
+    """
+    Una página en fecha descendente (desempate por id) después de `cursor`.
+    Retorna (filas, cursor de la página siguiente o None).
+    """
+    vehicle_type, start, end = filters
+    clauses, params = [], []
+    if vehicle_type is not None:
+        clauses.append('type = ?')
+        params.append(vehicle_type)
+    if start is not None:
+        clauses.append('timestamp >= ?')
+        params.append(start)
+    # Keyset: la página sigue el índice desde la última fila entregada (sin
+    # OFFSET); el límite superior del índice es el más estricto de los dos
+    if cursor is not None and (end is None or cursor[0] < end):
+        clauses.append('timestamp <= ? AND (timestamp, id) < (?, ?)')
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    elif end is not None:
+        clauses.append('timestamp < ?')
+        params.append(end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = connection.execute(
+        'SELECT id, timestamp, camera, vehicle_id, type, confidence, color FROM detections '
+        f"{where} ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit + 1]).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][1], rows[-1][0])
+
+
+def iter_csv(connection, filters):
+    """CSV (con BOM, como el export de Laravel) de todo lo filtrado, de a EXPORT_CHUNK filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADER)
+    cursor = None
+    while True:
+        rows, next_cursor = query_page(connection, filters, cursor, EXPORT_CHUNK)
+        for row in rows:
+            record = detection_record(row)
+            writer.writerow([record['fecha'], record['tipo'], record['color'], record['confianza']])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if next_cursor is None:
+            return
+        cursor = decode_cursor(next_cursor)
+
+
+class DetectionStore:
+    """Base de detecciones con escritura en lotes desde un thread propio"""
+
+    def __init__(self, db_path, xml_path=None, batch_size=5, max_delay=1.0):
+        self.db_path = db_path
+        self.xml_path = xml_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.connection = None
+        self.thread = None
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_commit_ms = 0.0
+        self.xml_appends = 0
+        self.xml_exports = 0
+        self.counted = 0
+        self.last_prune = 0.0
+
+    def open(self):
+        """Abre la base, importa el XML viejo si hace falta y regenera la vista XML"""
+        self.connection = open_database(self.db_path)
+        self.rows = self.connection.execute('SELECT COUNT(*) FROM detections').fetchone()[0]
+        if self.xml_path is None:
+            return
+        if self.rows == 0 and os.path.exists(self.xml_path):
+            try:
+                self.rows = import_xml(self.connection, self.xml_path)
+                print(f"✅ Historial importado del XML: {self.rows} detecciones")
+            except ET.ParseError as e:
+                print(f"⚠️ XML existente ilegible, no se importa: {e}")
+        export_xml(self.connection, self.xml_path)
+        self.xml_exports += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='detection-store', daemon=True)
+        self.thread.start()
+
+    def put(self, vehicle):
+        """Encola una detección (dict del tracking); nunca bloquea"""
+        self.queue.put((DETECTION, vehicle.get('timestamp', time.time()), vehicle))
+
+    def count(self, camera, vehicle_type, color, timestamp=None):
+        """Suma un vehículo nuevo a los rollups; nunca bloquea (se agregan por lote)"""
+        self.queue.put((COUNT, timestamp or time.time(), (camera or '', vehicle_type, color or 'desconocido')))
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def reader(self):
+        return open_readonly(self.db_path)
+
+    def _next_batch(self):
+        """Espera el primer item y junta hasta batch_size o max_delay (más si ya hay acumulados)"""
+        batch = [self.queue.get()]
+        if batch[0] is None:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                return batch
+        # Atrasado: lo que ya espera va en la misma transacción
+        while len(batch) < MAX_WRITE_BATCH:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            items = [item for item in batch if item is not None]
+            if items:
+                self._write(items)
+            if stop:
+                return
+
+    def _write(self, items):
+        rows = []
+        rollups = Counter()
+        for kind, timestamp, item in items:
+            if kind == COUNT:
+                for bucket, bucket_start in bucket_starts(timestamp):
+                    rollups[(bucket, bucket_start) + item] += 1
+                continue
+            x1, y1, x2, y2 = item.get('bbox') or (None, None, None, None)
+            rows.append((timestamp, item.get('camera'), item.get('id'), item['type'],
+                         item['confidence'], item.get('color'), x1, y1, x2, y2))
+
+        now = time.time()
+        prune = now - self.last_prune >= ROLLUP_PRUNE_INTERVAL
+        start = time.perf_counter()
+        try:
+            # Detecciones y rollups del lote en la misma transacción
+            with self.connection:
+                self.connection.executemany(INSERT, rows)
+                self.connection.executemany(UPSERT_ROLLUP, [key + (count,) for key, count in rollups.items()])
+                if prune:
+                    self.connection.execute("DELETE FROM rollups WHERE bucket = 'minute' AND start < ?",
+                                            (now - ROLLUP_MINUTE_RETENTION,))
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"❌ Error guardando detecciones: {e}")
+            return
+        self.last_commit_ms = (time.perf_counter() - start) * 1000
+        self.rows += len(rows)
+        self.counted += sum(rollups.values()) // len(ROLLUP_BUCKETS)
+        self.batches += 1
+        if prune:
+            self.last_prune = now
+
+        if self.xml_path is None or not rows:
+            return
+        try:
+            entries = [xml_entry(row[0], row[3], row[4], row[5]) for row in rows]
+            if append_xml(self.xml_path, entries):
+                self.xml_appends += 1
+            else:
+                export_xml(self.connection, self.xml_path)
+                self.xml_exports += 1
+        except OSError as e:
+            self.errors += 1
+            print(f"❌ Error actualizando el XML: {e}")
+
+    def close(self):
+        """Confirma lo encolado y espera al escritor"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def stats(self):
+        return {
+            'rows': self.rows,
+            'pending': self.pending(),
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_commit_ms': self.last_commit_ms,
+            'xml_appends': self.xml_appends,
+            'xml_exports': self.xml_exports,
+            'counted': self.counted
+        }
+
+
+if __name__ == '__main__':
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'storage', 'app')
+    parser = argparse.ArgumentParser(description='Base de detecciones (SQLite) y su vista XML')
+    parser.add_argument('action', choices=('export', 'import'),
+                        help='export: regenerar el XML desde la base; import: cargar el XML en la base')
+    parser.add_argument('--db', default=os.path.join(base, 'vehiculos.db'))
+    parser.add_argument('--xml', default=os.path.join(base, 'vehiculos_db.xml'))
+    args = parser.parse_args()
+
+    connection = open_database(args.db)
+    if args.action == 'export':
+        print(f"✅ {export_xml(connection, args.xml)} detecciones exportadas a {args.xml}")
+    else:
+        print(f"✅ {import_xml(connection, args.xml)} detecciones importadas a {args.db}")
+    connection.close()
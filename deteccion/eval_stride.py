@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Evaluación del stride de inferencia: conteo con YOLO cada k frames vs. todos
+- Fuente: video (--video), frames consecutivos de un directorio (--images)
+  o tráfico sintético (--synthetic, sin modelo; conoce el conteo real)
+- YOLO corre una vez sobre todos los frames; cada k se reproduce con el
+  mismo Tracker del detector usando solo los frames 0, k, 2k, ...
+- Por k: vehículos contados (total y por tipo) y su error contra k=1,
+  IoU de las cajas predichas contra lo que YOLO vio en los frames salteados,
+  y FPS máximo estimado con el costo medido de la inferencia
+- Con --target-fps: el k que elegiría el detector (stride.py)
+
+Uso: python3 eval_stride.py --video calle.mp4 [--backend onnx --model yolov8n.onnx]
+     python3 eval_stride.py --synthetic [--vehicles 40] [--frames 600]
+"""
+
+import argparse
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from stride import DEFAULT_BUDGET, DEFAULT_MAX_STRIDE, stride_for
+from tracker import Tracker, box_iou
+
+STRIDES = (1, 2, 3, 4, 6, 8)
+MAX_DISTANCE = 100  # Igual que el detector
+MAX_MISSING = 30
+VEHICLE_TYPES = ('car', 'motorcycle', 'bus', 'truck')
+COCO_CLASSES = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+
+
+def frames_from_video(path, limit):
+    """Los primeros `limit` frames consecutivos del video"""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def detect_all(frames, backend_name, model, threads, conf):
+    """(cajas, tipos) por frame y ms de YOLO por frame"""
+    from backends import create_backend
+    backend = create_backend(backend_name, model, threads, conf=conf, classes=list(COCO_CLASSES))
+    backend.predict(frames[:1])  # Calentamiento
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        output = backend.predict([frame])[0]
+        detections.append((output[:, :4].astype(np.float32),
+                           [COCO_CLASSES.get(int(cls), 'unknown') for cls in output[:, 5]]))
+    return detections, (time.perf_counter() - start) / len(frames) * 1000
+
+
+def synthetic_detections(vehicles, frames, seed):
+    """Tráfico de bench_tracker con un tipo por vehículo; (detecciones, conteo real)"""
+    from bench_tracker import synthetic_traffic
+    types = np.random.default_rng(seed).choice(VEHICLE_TYPES, vehicles, p=(0.7, 0.15, 0.05, 0.1))
+    detections, seen = [], set()
+    for boxes, truth in synthetic_traffic(vehicles, frames, seed):
+        detections.append((boxes, types[truth].tolist()))
+        seen.update(truth.tolist())
+    return detections, Counter(types[sorted(seen)].tolist())
+
+
+def replay(detections, stride):
+    """Conteo por tipo usando YOLO solo cada `stride` frames, y el IoU medio de lo predicho"""
+    tracker = Tracker(MAX_DISTANCE, MAX_MISSING)
+    counts = Counter()
+    next_id = 1
+    inferred_at = 0
+    ious = []
+    for frame_number, (boxes, types) in enumerate(detections):
+        if frame_number % stride:
+            # Frame salteado: cajas predichas vs. lo que YOLO vio de verdad
+            _, predicted = tracker.extrapolate(frame_number, inferred_at)
+            if len(predicted) and len(boxes):
+                ious.extend(box_iou(predicted, boxes).max(axis=1).tolist())
+            continue
+        _, new = tracker.update(boxes, frame_number, next_id)
+        next_id += int(new.sum())
+        counts.update(vehicle_type for vehicle_type, is_new in zip(types, new.tolist()) if is_new)
+        inferred_at = frame_number
+    return counts, float(np.mean(ious)) if ious else None
+
+
+def count_error(counts, reference):
+    """(error del total en %, suma de errores absolutos por tipo)"""
+    total, expected = sum(counts.values()), sum(reference.values())
+    by_type = sum(abs(counts[t] - reference[t]) for t in set(counts) | set(reference))
+    return (total - expected) / expected * 100 if expected else 0.0, by_type
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--images', default=None, help='Directorio de frames consecutivos')
+    parser.add_argument('--synthetic', action='store_true')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--vehicles', type=int, default=40, help='Solo con --synthetic')
+    parser.add_argument('--backend', default='pytorch')
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--inference-ms', type=float, default=None,
+                        help='Costo de YOLO por frame para estimar FPS (default: el medido)')
+    parser.add_argument('--target-fps', type=float, default=None)
+    parser.add_argument('--strides', type=int, nargs='+', default=list(STRIDES))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    truth = None
+    inference_ms = args.inference_ms
+    if args.synthetic:
+        detections, truth = synthetic_detections(args.vehicles, args.frames, args.seed)
+        source = f"sintético ({args.vehicles} vehículos)"
+    else:
+        if args.video:
+            frames = frames_from_video(args.video, args.frames)
+        elif args.images:
+            from export_model import frames_from_directory
+            frames = frames_from_directory(args.images, args.frames)
+        else:
+            parser.error('indicar --video, --images o --synthetic')
+        if not frames:
+            parser.error('no se pudo leer ningún frame')
+        print(f"🔄 YOLO ({args.backend}) sobre {len(frames)} frames...")
+        detections, measured_ms = detect_all(frames, args.backend, args.model, args.threads, args.conf)
+        inference_ms = inference_ms or measured_ms
+        source = args.video or args.images
+
+    print("\n" + "=" * 70)
+    print("⚡ EVALUACIÓN STRIDE DE INFERENCIA")
+    print("=" * 70)
+    print(f"{len(detections)} frames de {source}"
+          + (f"; YOLO: {inference_ms:.1f} ms/frame" if inference_ms else ''))
+    if truth:
+        print(f"Conteo real: {sum(truth.values())} {dict(truth)}")
+    print(f"\n  {'k':>3s} {'YOLO':>6s} {'contados':>9s} {'vs k=1':>8s} {'err.tipo':>9s} "
+          f"{'vs real':>8s} {'IoU pred':>9s} {'FPS máx':>8s}")
+
+    full_rate, _ = replay(detections, 1)
+    for k in args.strides:
+        counts, iou = replay(detections, k)
+        error, by_type = count_error(counts, full_rate)
+        real = f"{count_error(counts, truth)[0]:+7.1f}%" if truth else f"{'-':>8s}"
+        iou = f"{iou:9.3f}" if iou is not None else f"{'-':>9s}"
+        fps = f"{1000 * k / inference_ms:8.1f}" if inference_ms else f"{'-':>8s}"
+        print(f"  {k:3d} {-(-len(detections) // k):6d} {sum(counts.values()):9d} {error:+7.1f}% "
+              f"{by_type:9d} {real} {iou} {fps}")
+    print("\n  err.tipo: suma de diferencias por tipo contra k=1; FPS máx: solo inferencia, una cámara")
+
+    if args.target_fps and inference_ms:
+        k = stride_for(args.target_fps, inference_ms, DEFAULT_BUDGET, DEFAULT_MAX_STRIDE)
+        print(f"\n🎯 {args.target_fps:g} FPS con {inference_ms:.1f} ms/frame "
+              f"(budget {DEFAULT_BUDGET:.0%}): el detector usaría k={k}")
+    print()
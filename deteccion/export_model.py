@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Exporta YOLOv8 para los backends ONNX Runtime / OpenVINO, opcionalmente en INT8
+- FP32: export de ultralytics (ONNX con batch dinámico, OpenVINO IR)
+- INT8 (--int8): cuantización estática calibrada con frames propios
+  - onnx: onnxruntime.quantization (QDQ, pesos por canal)
+  - openvino: NNCF sobre el IR exportado
+- Frames de calibración: un directorio de JPEGs (--calibration) o muestreados
+  del DVR del servidor IoT a lo largo del rango grabado (--dvr URL --node ID)
+
+Uso:
+  python3 export_model.py --format onnx --int8 --calibration frames/
+  python3 export_model.py --format openvino --int8 --dvr http://144.22.56.85:5000 --node CAM_001
+"""
+
+import argparse
+import json
+import os
+import urllib.request
+
+import cv2
+import numpy as np
+
+from backends import DEFAULT_IMGSZ, preprocess
+
+CALIBRATION_SAMPLES = 300
+
+
+def frames_from_directory(directory, limit):
+    """JPEG/PNG del directorio (recursivo), repartidos uniformemente si sobran"""
+    paths = sorted(os.path.join(root, name)
+                   for root, _, names in os.walk(directory)
+                   for name in names if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+    if len(paths) > limit:
+        paths = [paths[i * len(paths) // limit] for i in range(limit)]
+    frames = [cv2.imread(path) for path in paths]
+    return [frame for frame in frames if frame is not None]
+
+
+def frames_from_dvr(server, node_id, limit):
+    """Frames del DVR del servidor (/dvr/<node>/frame?t=) repartidos en todo lo grabado"""
+    with urllib.request.urlopen(f"{server}/dvr/{node_id}", timeout=10) as response:
+        info = json.load(response)
+    t_from = (info.get('disk') or info['ram'])['from']
+    t_to = info['ram']['to']
+    if t_from is None or t_to is None:
+        return []
+
+    frames, seen = [], set()
+    for i in range(limit):
+        t = t_from + (t_to - t_from) * i / max(1, limit - 1)
+        with urllib.request.urlopen(f"{server}/dvr/{node_id}/frame?t={t:.3f}", timeout=10) as response:
+            frame_ts = response.headers.get('X-Frame-Timestamp')
+            data = response.read()
+        if frame_ts in seen:
+            continue  # Hueco en la grabación: el mismo frame vigente
+        seen.add(frame_ts)
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+def calibration_blobs(frames, imgsz):
+    """Un blob (1, 3, imgsz, imgsz) por frame, con el mismo preproceso que el backend"""
+    return [preprocess([frame], imgsz)[0] for frame in frames]
+
+
+def export_fp32(model_path, fmt, imgsz):
+    from ultralytics import YOLO
+    # Batch dinámico: la etapa de inferencia junta frames de varias cámaras
+    return str(YOLO(model_path).export(format=fmt, imgsz=imgsz, dynamic=fmt == 'onnx', verbose=False))
+
+
+def quantize_onnx(fp32_path, blobs):
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.items = iter(blobs)
+
+        def get_next(self):
+            blob = next(self.items, None)
+            return {self.input_name: blob} if blob is not None else None
+
+    input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    base = fp32_path[:-len('.onnx')]
+    prepared = f"{base}_prep.onnx"
+    output = f"{base}_int8.onnx"
+    quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+    quantize_static(prepared, output, Reader(input_name),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    os.remove(prepared)
+    return output
+
+
+def quantize_openvino(fp32_dir, blobs):
+    import nncf
+    import openvino as ov
+
+    xml = next(name for name in os.listdir(fp32_dir) if name.endswith('.xml'))
+    model = ov.Core().read_model(os.path.join(fp32_dir, xml))
+    quantized = nncf.quantize(model, nncf.Dataset(blobs),
+                              preset=nncf.QuantizationPreset.MIXED, subset_size=len(blobs))
+    output_dir = fp32_dir.rstrip('/').replace('_openvino_model', '_int8_openvino_model')
+    os.makedirs(output_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(output_dir, xml))
+    return output_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--format', choices=('onnx', 'openvino'), required=True)
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument('--int8', action='store_true', help='Cuantizar a INT8 con frames de calibración')
+    parser.add_argument('--calibration', default=None, help='Directorio de JPEGs de calibración')
+    parser.add_argument('--dvr', default=None, help='URL del servidor IoT (calibración desde su DVR)')
+    parser.add_argument('--node', default=None, help='Cámara del DVR')
+    parser.add_argument('--samples', type=int, default=CALIBRATION_SAMPLES)
+    args = parser.parse_args()
+
+    if args.int8 and not (args.calibration or (args.dvr and args.node)):
+        parser.error('--int8 necesita --calibration DIR o --dvr URL --node ID')
+
+    print("\n" + "=" * 70)
+    print(f"📦 EXPORTANDO {args.model} → {args.format}{' INT8' if args.int8 else ''}")
+    print("=" * 70)
+
+    fp32 = export_fp32(args.model, args.format, args.imgsz)
+    print(f"✓ FP32: {fp32}")
+    if not args.int8:
+        print()
+        raise SystemExit(0)
+
+    if args.calibration:
+        frames = frames_from_directory(args.calibration, args.samples)
+    else:
+        frames = frames_from_dvr(args.dvr.rstrip('/'), args.node, args.samples)
+    if not frames:
+        raise SystemExit("✗ Sin frames de calibración")
+    print(f"✓ {len(frames)} frames de calibración")
+
+    blobs = calibration_blobs(frames, args.imgsz)
+    quantize = quantize_onnx if args.format == 'onnx' else quantize_openvino
+    output = quantize(fp32, blobs)
+    print(f"✅ INT8: {output}")
+    print(f"   Comparar con FP32: python3 bench_backends.py --images <frames> "
+          f"pytorch:{args.model} {args.format}:{fp32} {args.format}:{output}\n")
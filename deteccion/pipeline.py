@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Pipeline por etapas para el detector
+- Cada etapa corre en su propio thread (OpenCV y PyTorch sueltan el GIL
+  en lo pesado, así decodificar, inferir y codificar se solapan)
+- Colas acotadas entre etapas: si una etapa se atrasa se descarta el
+  trabajo más viejo; siempre gana el frame más nuevo y la latencia no crece
+- Con varias cámaras, un lugar por cámara en cada cola (ninguna desplaza a otra)
+- Etapa en batch: junta frames de varias cámaras hasta un tamaño o una espera
+  máxima y los procesa en una sola llamada (inferencia)
+- Por etapa: throughput, profundidad de cola, descartes y tiempo de servicio
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+STATS_WINDOW = 2.0  # Segundos de la ventana de throughput
+ACTIVE_STREAM_SECONDS = 2.0  # Una cámara sin frames por más tiempo no se espera en un batch
+
+
+class LatestQueue:
+    """Cola acotada que descarta lo más viejo en lugar de bloquear al productor"""
+
+    def __init__(self, maxsize=1):
+        self.items = deque(maxlen=maxsize)
+        self.cond = threading.Condition(threading.Lock())
+        self.dropped = 0
+        self.last_wait = 0.0
+
+    def _store(self, item):
+        if len(self.items) == self.items.maxlen:
+            self.dropped += 1
+        self.items.append(item)
+
+    def _take(self):
+        return self.items.popleft()
+
+    def _batch_target(self, max_items):
+        return max_items
+
+    def put(self, item):
+        with self.cond:
+            self._store(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Siguiente trabajo; None si no llegó ninguno en `timeout`"""
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            return self._take() if self.items else None
+
+    def get_batch(self, max_items, max_wait, timeout=None):
+        """
+        Hasta `max_items` trabajos: espera el primero hasta `timeout` y,
+        desde ahí, a lo sumo `max_wait` segundos a que se junten más.
+        `last_wait` queda con lo que se esperó a completar el batch.
+        """
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+                if not self.items:
+                    return []
+            start = time.monotonic()
+            deadline = start + max_wait
+            target = self._batch_target(max_items)
+            while len(self.items) < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            self.last_wait = time.monotonic() - start
+            return [self._take() for _ in range(min(max_items, len(self.items)))]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StreamLatestQueue(LatestQueue):
+    """
+    Un lugar por cámara (`key(item)`): el frame nuevo reemplaza al pendiente
+    de su cámara sin perder el turno, así ninguna cámara se queda sin salir.
+    Un batch no puede tener más frames que cámaras activas: al tener uno
+    de cada una no se sigue esperando.
+    """
+
+    def __init__(self, key):
+        super().__init__()
+        self.items = OrderedDict()
+        self.key = key
+        self.last_seen = {}
+
+    def _store(self, item):
+        key = self.key(item)
+        if key in self.items:
+            self.dropped += 1
+        self.items[key] = item
+        self.last_seen[key] = time.monotonic()
+
+    def _take(self):
+        return self.items.popitem(last=False)[1]
+
+    def _batch_target(self, max_items):
+        cutoff = time.monotonic() - ACTIVE_STREAM_SECONDS
+        active = sum(1 for seen in self.last_seen.values() if seen >= cutoff)
+        return max(1, min(max_items, active))
+
+
+class Stage:
+    """
+    Una etapa: toma trabajos de su cola, aplica `func` y pasa el resultado
+    a la cola de la siguiente. `func` retorna None para cortar el trabajo
+    (frame corrupto, nada que hacer).
+    """
+
+    def __init__(self, name, func, maxsize=1, key=None):
+        self.name = name
+        self.func = func
+        self.queue = StreamLatestQueue(key) if key is not None else LatestQueue(maxsize)
+        self.next = None
+        self.processed = 0
+        self.errors = 0
+        self.busy_total = 0.0
+        self.window_start = time.time()
+        self.window_count = 0
+        self.window_busy = 0.0
+        self.rate = 0.0
+        self.avg_ms = 0.0
+
+    def run(self):
+        while True:
+            item = self.queue.get(timeout=1.0)
+            if item is None:
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Error en etapa {self.name}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self._account(elapsed)
+            if result is not None and self.next is not None:
+                self.next.put(result)
+
+    def _account(self, elapsed, count=1):
+        self.processed += count
+        self.busy_total += elapsed
+        self.window_count += count
+        self.window_busy += elapsed
+        now = time.time()
+        span = now - self.window_start
+        if span >= STATS_WINDOW:
+            self.rate = self.window_count / span
+            self.avg_ms = self.window_busy / self.window_count * 1000
+            self._close_window()
+            self.window_start = now
+            self.window_count = 0
+            self.window_busy = 0.0
+
+    def _close_window(self):
+        pass
+
+    def stats(self):
+        return {
+            'processed': self.processed,
+            'errors': self.errors,
+            'per_sec': self.rate,
+            'avg_ms': self.avg_ms,
+            'busy_ratio': self.rate * self.avg_ms / 1000,
+            'queue_depth': len(self.queue),
+            'dropped': self.queue.dropped
+        }
+
+
+class BatchStage(Stage):
+    """
+    Etapa que procesa listas: `func` recibe hasta `max_batch` trabajos
+    (juntados durante a lo sumo `max_wait` segundos) y retorna la lista de
+    resultados, que siguen de a uno hacia la etapa siguiente.
+    """
+
+    def __init__(self, name, func, max_batch, max_wait, key=None):
+        super().__init__(name, func, maxsize=max_batch, key=key)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.window_batches = 0
+        self.window_wait = 0.0
+        self.avg_batch = 0.0
+        self.avg_wait_ms = 0.0
+
+    def run(self):
+        while True:
+            items = self.queue.get_batch(self.max_batch, self.max_wait, timeout=1.0)
+            if not items:
+                continue
+            start = time.perf_counter()
+            try:
+                results = self.func(items)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Error en etapa {self.name}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self.batches += 1
+            self.window_batches += 1
+            self.window_wait += self.queue.last_wait
+            self._account(elapsed, len(items))
+            if self.next is not None:
+                for result in results:
+                    if result is not None:
+                        self.next.put(result)
+
+    def _close_window(self):
+        if self.window_batches:
+            self.avg_batch = self.window_count / self.window_batches
+            self.avg_wait_ms = self.window_wait / self.window_batches * 1000
+        self.window_batches = 0
+        self.window_wait = 0.0
+
+    def stats(self):
+        stats = super().stats()
+        # avg_ms es por frame; un batch tarda avg_ms * avg_batch
+        stats.update({
+            'batches': self.batches,
+            'avg_batch': self.avg_batch,
+            'batch_wait_ms': self.avg_wait_ms,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000
+        })
+        return stats
+
+
+class Pipeline:
+    """Etapas encadenadas; `submit` entrega a la primera sin bloquear nunca"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following.queue
+        self.threads = []
+
+    def start(self):
+        for stage in self.stages:
+            thread = threading.Thread(target=stage.run, name=f"stage-{stage.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, item):
+        self.stages[0].queue.put(item)
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
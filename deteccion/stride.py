@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Stride de inferencia adaptativo: YOLO cada k frames por cámara
+- Entre inferencias, los vehículos rastreados avanzan con su velocidad
+  (Tracker.extrapolate); solo los frames inferidos cuentan y guardan
+- k se ajusta solo para sostener target_fps por cámara: con el costo medido
+  de YOLO por frame y los frames que llegan por segundo, la inferencia no
+  ocupa más de `budget` del tiempo (el resto: decodificar, color, codificar)
+- Histéresis al bajar k, para no oscilar entre dos valores
+- Sin target_fps: k = 1 (todos los frames, como antes)
+"""
+
+import math
+import threading
+import time
+
+DEFAULT_MAX_STRIDE = 6
+DEFAULT_BUDGET = 0.8
+SMOOTHING = 0.2           # Peso de cada medición nueva (promedio exponencial)
+HYSTERESIS = 0.85         # Bajar k solo si k - 1 queda holgado
+ACTIVE_STREAM_SECONDS = 2.0  # Cámaras sin frames por más tiempo no cuentan
+
+
+def stride_for(demand_fps, inference_ms, budget=DEFAULT_BUDGET, max_stride=DEFAULT_MAX_STRIDE):
+    """Menor k con el que inferir `demand_fps` frames/s cabe en `budget` del tiempo"""
+    needed = demand_fps * inference_ms / 1000 / budget
+    return min(max(math.ceil(needed), 1), max_stride)
+
+
+class StrideController:
+    """Decide qué frames de cada cámara pasan por YOLO"""
+
+    def __init__(self, target_fps=None, max_stride=DEFAULT_MAX_STRIDE, budget=DEFAULT_BUDGET):
+        self.target_fps = target_fps
+        self.max_stride = max_stride
+        self.budget = budget
+        self.stride = 1
+        self.inference_ms = None  # Por frame (en batch)
+        self.arrivals = {}  # cámara -> [último frame, intervalo promedio]
+        self.since_inference = {}  # cámara -> frames desde la última inferencia
+        self.inferred = 0
+        self.predicted = 0
+        self.lock = threading.Lock()
+
+    def arrival(self, stream_id, now):
+        """Un frame recibido de la cámara (antes de cualquier descarte del pipeline)"""
+        with self.lock:
+            state = self.arrivals.get(stream_id)
+            if state is None:
+                self.arrivals[stream_id] = [now, None]
+                return
+            interval = now - state[0]
+            state[0] = now
+            state[1] = interval if state[1] is None else state[1] + SMOOTHING * (interval - state[1])
+
+    def demand_fps(self):
+        """Frames por segundo a procesar: lo que llega, hasta target_fps por cámara"""
+        now = time.time()
+        with self.lock:
+            rates = [1.0 / interval for last, interval in self.arrivals.values()
+                     if interval and now - last < ACTIVE_STREAM_SECONDS]
+        return sum(min(rate, self.target_fps) for rate in rates)
+
+    def should_infer(self, stream_id):
+        """True si este frame de la cámara va a YOLO (el primero siempre)"""
+        count = self.since_inference.get(stream_id, self.stride - 1) + 1
+        if count >= self.stride:
+            self.since_inference[stream_id] = 0
+            self.inferred += 1
+            return True
+        self.since_inference[stream_id] = count
+        self.predicted += 1
+        return False
+
+    def observe(self, frames, seconds):
+        """Tiempo de una llamada a YOLO con `frames` frames; reajusta k"""
+        ms = seconds * 1000 / frames
+        self.inference_ms = ms if self.inference_ms is None else self.inference_ms + SMOOTHING * (ms - self.inference_ms)
+        if not self.target_fps:
+            return
+        demand = self.demand_fps()
+        needed = demand * self.inference_ms / 1000 / self.budget
+        stride = stride_for(demand, self.inference_ms, self.budget, self.max_stride)
+        if stride > self.stride or needed <= (self.stride - 1) * HYSTERESIS:
+            self.stride = stride
+
+    def stats(self):
+        total = self.inferred + self.predicted
+        return {
+            'target_fps': self.target_fps,
+            'stride': self.stride,
+            'inference_ms': self.inference_ms,
+            'demand_fps': self.demand_fps() if self.target_fps else None,
+            'inferred_frames': self.inferred,
+            'predicted_frames': self.predicted,
+            'inferred_ratio': self.inferred / total if total else None
+        }
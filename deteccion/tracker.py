@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tracker vectorizado por cámara
+- Costo detección → vehículo rastreado en una sola operación NumPy:
+  (1 - IoU) combinado con la distancia entre centros, contra la caja
+  predicha con la velocidad de cada vehículo (adelantamientos, frames perdidos)
+- Asignación óptima uno a uno (húngaro, scipy); sin scipy, greedy global
+  por menor costo (también uno a uno: dos detecciones no toman el mismo ID)
+- Altas y bajas en bloque; retorna el ID de cada detección
+- Rastreados en arrays (no dicts): rápido con cientos en tráfico denso
+"""
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+IOU_WEIGHT = 0.5  # Resto del costo: distancia entre centros / max_distance
+MIN_IOU = 0.1     # Sin este solapamiento hace falta estar a menos de max_distance
+INVALID_COST = 1e6
+VELOCITY_SMOOTHING = 0.5  # Peso de la velocidad medida nueva
+
+
+def box_iou(a, b):
+    """IoU entre todas las cajas de a (N, 4) y b (M, 4) → (N, M)"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def greedy_assignment(cost):
+    """Pares (fila, columna) uno a uno tomando primero los de menor costo"""
+    order = np.argsort(cost, axis=None)
+    order = order[cost.flat[order] < INVALID_COST]
+    rows, cols = np.unravel_index(order, cost.shape)
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    pairs = []
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if not used_rows[row] and not used_cols[col]:
+            used_rows[row] = used_cols[col] = True
+            pairs.append((row, col))
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    rows, cols = zip(*pairs)
+    return np.array(rows), np.array(cols)
+
+
+class Tracker:
+    """Vehículos rastreados de una cámara: caja, velocidad, ID y último frame visto"""
+
+    def __init__(self, max_distance, max_missing):
+        self.max_distance = max_distance
+        self.max_missing = max_missing
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 2), dtype=np.float32)  # px por frame del centro
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.last_seen = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        self.boxes = self.boxes[:0]
+        self.velocity = self.velocity[:0]
+        self.ids = self.ids[:0]
+        self.last_seen = self.last_seen[:0]
+
+    def predicted(self, frame_number):
+        """Cajas rastreadas movidas a `frame_number` con su velocidad"""
+        shift = self.velocity * (frame_number - self.last_seen)[:, None]
+        return self.boxes + np.concatenate([shift, shift], axis=1)
+
+    def extrapolate(self, frame_number, seen_at):
+        """(IDs, cajas predichas en `frame_number`) de los vehículos vistos en el frame `seen_at`"""
+        current = self.last_seen == seen_at
+        return self.ids[current], self.predicted(frame_number)[current]
+
+    def cost_matrix(self, boxes, tracked):
+        """(detecciones, rastreados); INVALID_COST donde no pueden ser el mismo"""
+        iou = box_iou(boxes, tracked)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        tracked_centers = (tracked[:, :2] + tracked[:, 2:]) / 2
+        distance = np.linalg.norm(centers[:, None, :] - tracked_centers[None, :, :], axis=2)
+        cost = IOU_WEIGHT * (1 - iou) + (1 - IOU_WEIGHT) * np.minimum(distance / self.max_distance, 1)
+        cost[(iou < MIN_IOU) & (distance >= self.max_distance)] = INVALID_COST
+        return cost
+
+    def update(self, boxes, frame_number, next_id):
+        """
+        Asocia las cajas (N, 4) del frame. Los vehículos nuevos reciben IDs
+        consecutivos desde `next_id`. Retorna (IDs por detección, máscara de nuevos).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        ids = np.zeros(len(boxes), dtype=np.int64)
+        matched = np.zeros(len(boxes), dtype=bool)
+
+        if len(boxes) and len(self.ids):
+            cost = self.cost_matrix(boxes, self.predicted(frame_number))
+            if SCIPY_AVAILABLE:
+                rows, cols = linear_sum_assignment(cost)
+                valid = cost[rows, cols] < INVALID_COST
+                rows, cols = rows[valid], cols[valid]
+            else:
+                rows, cols = greedy_assignment(cost)
+            ids[rows] = self.ids[cols]
+            matched[rows] = True
+            elapsed = (frame_number - self.last_seen[cols])[:, None]
+            moved = (boxes[rows, :2] + boxes[rows, 2:] - self.boxes[cols, :2] - self.boxes[cols, 2:]) / 2
+            self.velocity[cols] += VELOCITY_SMOOTHING * (moved / np.maximum(elapsed, 1) - self.velocity[cols])
+            self.boxes[cols] = boxes[rows]
+            self.last_seen[cols] = frame_number
+
+        # Altas en bloque
+        new = ~matched
+        count = int(new.sum())
+        if count:
+            ids[new] = np.arange(next_id, next_id + count)
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((count, 2), dtype=np.float32)])
+            self.ids = np.concatenate([self.ids, ids[new]])
+            self.last_seen = np.concatenate([self.last_seen, np.full(count, frame_number)])
+
+        self.age(frame_number)
+        return ids, new
+
+    def age(self, frame_number):
+        """Bajas en bloque: sin verse por más de max_missing frames (también en frames sin detección)"""
+        alive = frame_number - self.last_seen <= self.max_missing
+        if not alive.all():
+            self.boxes = self.boxes[alive]
+            self.velocity = self.velocity[alive]
+            self.ids = self.ids[alive]
+            self.last_seen = self.last_seen[alive]
@@ -2,11 +2,15 @@
 """
 Detector de Vehículos LOCAL - Consume video de Oracle y procesa en tu PC
 - Descarga video del servidor Oracle vía WebSocket
-- Detecta vehículos con YOLOv8
+- Detecta vehículos con YOLOv8 en un pipeline por etapas (un thread cada una,
+  colas acotadas que descartan el frame viejo)
+- Varias cámaras vía el feed multiplexado: inferencia en batch (un frame por
+  cámara por llamada al modelo) y tracking por cámara
 - Expone API local para Laravel
 - Streaming procesado vía WebSocket
 """
 
+import argparse
 import cv2
 import numpy as np
 import asyncio
@@ -14,13 +18,26 @@ import websockets
 import threading
 import time
 from collections import defaultdict, deque
-from flask import Flask, jsonify, Response
+from datetime import datetime
+from flask import Flask, jsonify, request, Response
 from flask_sock import Sock
-from ultralytics import YOLO
 import io
-import xml.etree.ElementTree as ET
-from datetime import datetime
 import os
+import sys
+
+from backends import BACKENDS, create_backend
+from colors import classify_colors
+from detection_store import (QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT, ROLLUP_BUCKET_SECONDS, ROLLUP_DEFAULT_SPAN,
+                             ROLLUP_MAX_BUCKETS, DetectionStore, build_filters, decode_cursor,
+                             detection_record, iter_csv, parse_time, query_page, query_rollups)
+from motion import KEEPALIVE, STATIC, MotionGate
+from pipeline import BatchStage, Pipeline, Stage
+from stride import StrideController
+from tracker import SCIPY_AVAILABLE, Tracker
+
+# Protocolo del feed multiplexado: una sola definición, la del servidor (iot/feed.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'iot'))
+from feed import parse_feed_message  # noqa: E402
 
 app = Flask(__name__)
 sock = Sock(app)
@@ -29,16 +46,49 @@ sock = Sock(app)
 # CONFIGURACIÓN
 # ===========================
 ORACLE_SERVER = "ws://144.22.56.85:5000"  # Tu servidor Oracle
+# Cámaras a procesar: una sola usa /ws/<id> (como antes); varias, o None
+# para todas, usan el feed multiplexado /feed
+ORACLE_CAMERAS = ['stream']
 LOCAL_PORT = 8080  # Puerto local para API y WebSocket
 
 # Configuración YOLO
 YOLO_MODEL = "yolov8n.pt"  # Modelo nano (rápido)
+# Backend: pytorch | onnx | openvino (modelos exportados con export_model.py;
+# con un .pt se usa el nombre que produce el export). Se puede elegir con --backend
+INFERENCE_BACKEND = "pytorch"
+INFERENCE_THREADS = 0  # 0 = todos los núcleos
 CONFIDENCE_THRESHOLD = 0.5
 VEHICLE_CLASSES = [2, 3, 5, 7]  # car, motorcycle, bus, truck
 
-# Ruta del archivo XML (Laravel storage)
+# Color dominante: 1 = todos los píxeles de la caja (igual que antes);
+# 2 o 4 = uno de cada step×step (más rápido, ~1-3% de etiquetas distintas)
+COLOR_SAMPLE_STEP = 1
+
+# Base de detecciones (SQLite WAL) y su vista XML para Laravel (storage)
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'storage', 'app', 'vehiculos.db')
 XML_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'storage', 'app', 'vehiculos_db.xml')
 SAVE_INTERVAL = 5  # Guardar cada X detecciones
+SAVE_MAX_DELAY = 1.0  # ...o cada X segundos si hay menos pendientes
+
+# Pipeline: un frame pendiente por cámara en cada etapa (siempre el más nuevo)
+STREAM_JPEG_QUALITY = 85
+
+# Inferencia en batch: frames de varias cámaras en una llamada al modelo
+INFERENCE_MAX_BATCH = 8      # 1 = un frame por llamada
+INFERENCE_MAX_WAIT = 0.010   # Segundos máx. esperando completar un batch
+
+# Stride adaptativo: YOLO cada k frames por cámara para sostener este FPS;
+# entre inferencias los vehículos avanzan con su velocidad. None = todos
+# los frames. Se puede elegir con --target-fps
+INFERENCE_TARGET_FPS = None
+INFERENCE_MAX_STRIDE = 6
+INFERENCE_BUDGET = 0.8  # Fracción del tiempo que puede ocupar YOLO
+
+# Compuerta de movimiento: sin movimiento (fracción del frame que cambió
+# respecto del fondo) no se corre YOLO, salvo un keep-alive cada X frames
+# estáticos. 0 = inferir siempre. Se puede elegir con --motion-threshold
+MOTION_MIN_RATIO = 0.002
+MOTION_KEEPALIVE_FRAMES = 15  # < max_frames_missing: un vehículo detenido se vuelve a ver antes de darse de baja
 
 COCO_CLASSES = {
     0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle',
@@ -56,6 +106,8 @@ camera_data = {
     'fps': 0,
     'last_fps_time': time.time(),
     'fps_buffer': deque(maxlen=30),
+    'received_frames': 0,
+    'latency_ms': 0,  # Recepción → frame anotado
     # Estadísticas de vehículos
     'vehicle_count': 0,
     'total_vehicles_detected': 0,
@@ -63,235 +115,339 @@ camera_data = {
     'vehicle_colors': defaultdict(int),
     'vehicle_types': defaultdict(int),
     'detected_vehicles': [],
-    # Sistema de tracking
-    'tracked_vehicles': {},  # {id: {'bbox': (x1,y1,x2,y2), 'last_seen': frame_num, 'counted': bool}}
+    # Sistema de tracking (los vehículos rastreados viven en cada cámara)
     'next_vehicle_id': 1,
     'max_distance': 100,  # Distancia máxima para considerar el mismo vehículo
     'max_frames_missing': 30  # Frames sin ver un vehículo antes de eliminarlo
 }
 
+# Estado por cámara (tracking propio); camera_data queda con los totales
+streams = {}
+
 data_lock = threading.Lock()
-websocket_clients = []
+websocket_clients = defaultdict(list)  # cámara (None = la principal) -> clientes
+# Detecciones a guardar: se encolan (nunca se descartan) y se escriben en lotes
+store = DetectionStore(DB_PATH, XML_DB_PATH, SAVE_INTERVAL, SAVE_MAX_DELAY)
 
-# Cargar YOLO
-print("🔄 Cargando modelo YOLOv8...")
-model = YOLO(YOLO_MODEL)
-print("✅ Modelo cargado!")
+backend = None  # Se carga al iniciar (load_backend)
+stride = StrideController(INFERENCE_TARGET_FPS, INFERENCE_MAX_STRIDE, INFERENCE_BUDGET)
+motion = MotionGate(MOTION_MIN_RATIO, MOTION_KEEPALIVE_FRAMES)
+
+def load_backend(name, model_path, threads):
+    global backend
+    print(f"🔄 Cargando modelo YOLOv8 ({name})...")
+    backend = create_backend(name, model_path, threads,
+                             conf=CONFIDENCE_THRESHOLD, classes=VEHICLE_CLASSES)
+    print(f"✅ Modelo cargado: {backend.model_path}")
 
 # ===========================
-# FUNCIONES DE XML
+# FUNCIONES DE DETECCIÓN
 # ===========================
 
-def init_xml_database():
-    """Inicializa el archivo XML si no existe"""
-    if not os.path.exists(XML_DB_PATH):
-        os.makedirs(os.path.dirname(XML_DB_PATH), exist_ok=True)
-        root = ET.Element('detecciones')
-        tree = ET.ElementTree(root)
-        ET.indent(tree, space='  ')
-        tree.write(XML_DB_PATH, encoding='utf-8', xml_declaration=True)
-        print(f"✅ Archivo XML creado: {XML_DB_PATH}")
-    else:
-        print(f"✅ Archivo XML existente: {XML_DB_PATH}")
+def run_inference_batch(frames):
+    """
+    YOLO sobre una lista de frames en una sola llamada (pueden venir de
+    cámaras distintas). Retorna una lista de vehículos por frame, sin color
+    ni dibujo (eso va en otra etapa).
+    """
+    per_frame = []
+    for detections in backend.predict(frames):
+        vehicles = []
+        # El backend ya filtra solo vehículos (VEHICLE_CLASSES)
+        for x1, y1, x2, y2, confidence, cls in detections.tolist():
+            vehicles.append({
+                'bbox': (int(x1), int(y1), int(x2), int(y2)),
+                'confidence': confidence,
+                'type': COCO_CLASSES.get(int(cls), "unknown")
+            })
+        per_frame.append(vehicles)
+    return per_frame
 
-def save_detection_to_xml(vehicle):
-    """Guarda una detección de vehículo en el XML"""
-    try:
-        # Leer XML existente
-        if os.path.exists(XML_DB_PATH):
-            tree = ET.parse(XML_DB_PATH)
-            root = tree.getroot()
-        else:
-            root = ET.Element('detecciones')
-            tree = ET.ElementTree(root)
-        
-        # Crear nueva detección
-        deteccion = ET.SubElement(root, 'deteccion')
-        
-        # Agregar datos
-        fecha = ET.SubElement(deteccion, 'fecha')
-        fecha.text = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        tipo = ET.SubElement(deteccion, 'tipo')
-        # Mapear nombres de YOLO a nombres en español
-        tipo_map = {
-            'car': 'Auto',
-            'motorcycle': 'Moto',
-            'bus': 'Bus',
-            'truck': 'Camión'
-        }
-        tipo.text = tipo_map.get(vehicle['type'], 'Auto')
-        
-        confianza = ET.SubElement(deteccion, 'confianza')
-        confianza.text = f"{vehicle['confidence'] * 100:.2f}"
-        
-        color = ET.SubElement(deteccion, 'color')
-        color.text = vehicle['color']
+def run_inference(frame):
+    return run_inference_batch([frame])[0]
+
+def annotate_frame(frame, vehicles):
+    """Dibuja cajas, etiquetas (con ID de tracking) y el contador sobre `frame`"""
+    color_bgr = (0, 255, 0)
+    for vehicle in vehicles:
+        x1, y1, x2, y2 = vehicle['bbox']
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color_bgr, 2)
         
-        # Guardar con formato
-        ET.indent(tree, space='  ')
-        tree.write(XML_DB_PATH, encoding='utf-8', xml_declaration=True)
+        label = f"{vehicle['type']} ({vehicle['color']}) {vehicle['confidence']:.2f}"
+        if vehicle.get('id'):
+            label = f"ID:{vehicle['id']} {label}"
         
-        return True
-    except Exception as e:
-        print(f"❌ Error guardando en XML: {e}")
-        return False
+        # Fondo para el texto
+        (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color_bgr, -1)
+        cv2.putText(frame, label, (x1, y1 - 5),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    
+    # Contador en la esquina
+    count_text = f"Vehiculos: {len(vehicles)}"
+    cv2.rectangle(frame, (5, 5), (250, 45), (0, 0, 0), -1)
+    cv2.putText(frame, count_text, (10, 35),
+               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    return frame
 
-# ===========================
-# FUNCIONES DE DETECCIÓN
-# ===========================
+def new_stream(stream_id):
+    return {
+        'camera': stream_id,
+        'frame_count': 0,
+        'fps': 0,
+        'last_fps_time': time.time(),
+        'fps_buffer': deque(maxlen=30),
+        'last_update': 0,
+        'latency_ms': 0,
+        'vehicle_count': 0,
+        'detected_vehicles': [],
+        'tracker': Tracker(camera_data['max_distance'], camera_data['max_frames_missing']),
+        # Último frame con movimiento: en los estáticos los vehículos no avanzan
+        'motion_frame': 0,
+        # Último frame que pasó por YOLO y sus vehículos por ID (base de la predicción)
+        'inferred_frame': 0,
+        'inferred_vehicles': {},
+        'motion_ratio': None
+    }
 
-def calculate_bbox_center(bbox):
-    """Calcula el centro de un bounding box"""
-    x1, y1, x2, y2 = bbox
-    return ((x1 + x2) / 2, (y1 + y2) / 2)
+def get_stream(stream_id):
+    """Estado de una cámara (llamar con data_lock tomado)"""
+    stream = streams.get(stream_id)
+    if stream is None:
+        stream = streams[stream_id] = new_stream(stream_id)
+    return stream
 
-def calculate_distance(center1, center2):
-    """Calcula la distancia euclidiana entre dos centros"""
-    return np.sqrt((center1[0] - center2[0])**2 + (center1[1] - center2[1])**2)
+def tracked_count():
+    return sum(len(s['tracker']) for s in streams.values())
 
-def match_vehicle_to_tracked(bbox, tracked_vehicles, max_distance):
+def stream_stats(stream):
+    return {
+        'fps': stream['fps'],
+        'frame_count': stream['frame_count'],
+        'current_vehicles': stream['vehicle_count'],
+        'tracked_count': len(stream['tracker']),
+        'latency_ms': stream['latency_ms'],
+        'motion_ratio': stream['motion_ratio'],
+        'last_seen_s': time.time() - stream['last_update'] if stream['last_update'] else None
+    }
+
+def primary_stream():
+    """Cámara que recibe /ws/stream: la primera configurada o la primera vista"""
+    if ORACLE_CAMERAS:
+        return ORACLE_CAMERAS[0]
+    return next(iter(streams), None)
+
+def update_fps(state, current_time):
+    """FPS suavizado de `state` (camera_data o una cámara)"""
+    time_delta = current_time - state['last_fps_time']
+    if time_delta > 0:
+        state['fps_buffer'].append(1.0 / time_delta)
+        state['fps'] = sum(state['fps_buffer']) / len(state['fps_buffer'])
+    state['last_fps_time'] = current_time
+
+def update_tracking(stream, vehicles):
     """
-    Encuentra si un vehículo detectado corresponde a uno ya rastreado.
-    Retorna el ID del vehículo o None si es nuevo.
+    Asocia las detecciones a los vehículos rastreados de la cámara (asigna
+    vehicle['id'], único entre cámaras), cuenta los nuevos en los totales y
+    encola su guardado y su suma a los rollups. Llamar con data_lock tomado.
     """
-    center = calculate_bbox_center(bbox)
-    
-    best_match_id = None
-    best_distance = float('inf')
+    ids, new = stream['tracker'].update([v['bbox'] for v in vehicles],
+                                        stream['frame_count'], camera_data['next_vehicle_id'])
+    camera_data['next_vehicle_id'] += int(new.sum())
     
-    for vehicle_id, vehicle_data in tracked_vehicles.items():
-        tracked_center = calculate_bbox_center(vehicle_data['bbox'])
-        distance = calculate_distance(center, tracked_center)
+    for vehicle, vehicle_id, is_new in zip(vehicles, ids.tolist(), new.tolist()):
+        vehicle['id'] = vehicle_id
+        vehicle['camera'] = stream['camera']
+        if not is_new:
+            continue
         
-        if distance < max_distance and distance < best_distance:
-            best_distance = distance
-            best_match_id = vehicle_id
+        # INCREMENTAR CONTADOR SOLO PARA VEHÍCULOS NUEVOS
+        camera_data['total_vehicles_detected'] += 1
+        
+        # Contar tipos y colores
+        camera_data['vehicle_types'][vehicle['type']] += 1
+        camera_data['vehicle_colors'][vehicle['color']] += 1
+        store.count(stream['camera'], vehicle['type'], vehicle['color'])
+        
+        # Guardar solo vehículos nuevos con alta confianza (escribe otro thread)
+        if vehicle['confidence'] > 0.7:
+            store.put(dict(vehicle, timestamp=time.time()))
     
-    return best_match_id
+    stream['inferred_frame'] = stream['frame_count']
+    stream['inferred_vehicles'] = {vehicle['id']: vehicle for vehicle in vehicles}
 
-def get_dominant_color(image, bbox):
-    """Extrae el color dominante del vehículo"""
-    x1, y1, x2, y2 = map(int, bbox)
-    
-    # Validar coordenadas
-    h, w = image.shape[:2]
-    x1, x2 = max(0, x1), min(w, x2)
-    y1, y2 = max(0, y1), min(h, y2)
-    
-    if x2 <= x1 or y2 <= y1:
-        return "desconocido"
-    
-    roi = image[y1:y2, x1:x2]
-    
-    if roi.size == 0:
-        return "desconocido"
+def predict_vehicles(stream, frame_shape):
+    """
+    Frame sin inferencia: los vehículos del último frame inferido, movidos con
+    su velocidad hasta el último frame con movimiento (sin contar ni guardar).
+    Los que salieron del frame no se muestran.
+    """
+    ids, boxes = stream['tracker'].extrapolate(stream['motion_frame'], stream['inferred_frame'])
+    height, width = frame_shape[:2]
+    vehicles = []
+    for vehicle_id, (x1, y1, x2, y2) in zip(ids.tolist(), boxes.tolist()):
+        last = stream['inferred_vehicles'].get(vehicle_id)
+        x1, x2 = max(0, int(x1)), min(width, int(x2))
+        y1, y2 = max(0, int(y1)), min(height, int(y2))
+        if last is None or x2 <= x1 or y2 <= y1:
+            continue
+        vehicles.append(dict(last, bbox=(x1, y1, x2, y2), predicted=True))
+    return vehicles
+
+# ===========================
+# PIPELINE (decodificar → inferir → rastrear/anotar → codificar)
+# ===========================
+
+class FrameJob:
+    """Un frame recorriendo el pipeline"""
     
-    # Convertir a HSV
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+    __slots__ = ('stream', 'seq', 'data', 'received_at', 'frame', 'motion', 'motion_ratio',
+                 'static', 'vehicles', 'processed')
+    # vehicles queda en None si el frame no pasa por YOLO (stride o sin movimiento)
     
-    # Calcular histograma del canal H (tono)
-    hist = cv2.calcHist([hsv], [0], None, [180], [0, 180])
-    dominant_hue = np.argmax(hist)
+    def __init__(self, stream, seq, data, received_at):
+        self.stream = stream
+        self.seq = seq
+        self.data = data
+        self.received_at = received_at
+        self.frame = None
+        self.motion = None  # Máscara de movimiento (reducida, 0/255); None sin compuerta
+        self.motion_ratio = None
+        self.static = False
+        self.vehicles = None
+        self.processed = None
+
+def decode_stage(job):
+    """JPEG → BGR y máscara de movimiento"""
+    nparr = np.frombuffer(job.data, np.uint8)
+    job.frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if job.frame is None:
+        print("⚠️ Frame corrupto recibido")
+        return None
+    job.data = None
+    if motion.min_ratio:
+        job.motion, job.motion_ratio = motion.detect(job.stream, job.frame)
+    return job
+
+def inference_stage(jobs):
+    """
+    YOLO en batch: hasta un frame por cámara, juntados durante a lo sumo
+    INFERENCE_MAX_WAIT; cada resultado vuelve al job (y al tracker) de su cámara.
+    Los frames sin movimiento (salvo keep-alive) y los que el stride saltea
+    siguen sin vehículos (se predicen al rastrear).
+    """
+    selected = []
+    for job in jobs:
+        decision = motion.decide(job.stream, job.motion_ratio) if job.motion is not None else None
+        if decision == STATIC:
+            job.static = True
+        elif decision == KEEPALIVE or stride.should_infer(job.stream):
+            selected.append(job)
+    if selected:
+        start = time.perf_counter()
+        results = run_inference_batch([job.frame for job in selected])
+        stride.observe(len(selected), time.perf_counter() - start)
+        for job, vehicles in zip(selected, results):
+            job.vehicles = vehicles
+    return jobs
+
+def track_stage(job):
+    """Color, tracking y estadísticas (o predicción, sin YOLO); dibuja sobre una copia del frame"""
+    frame = job.frame
+    vehicles = job.vehicles
+    if vehicles is not None:
+        colors = classify_colors(frame, [v['bbox'] for v in vehicles], COLOR_SAMPLE_STEP)
+        for vehicle, color in zip(vehicles, colors):
+            vehicle['color'] = color
     
-    # Mapear a nombre de color
-    if dominant_hue < 10 or dominant_hue > 170:
-        return "rojo"
-    elif 10 <= dominant_hue < 25:
-        return "naranja"
-    elif 25 <= dominant_hue < 40:
-        return "amarillo"
-    elif 40 <= dominant_hue < 80:
-        return "verde"
-    elif 80 <= dominant_hue < 130:
-        return "azul"
-    elif 130 <= dominant_hue < 160:
-        return "morado"
-    else:
-        # Verificar saturación para blanco/gris/negro
-        s_mean = np.mean(hsv[:, :, 1])
-        v_mean = np.mean(hsv[:, :, 2])
+    current_time = time.time()
+    with data_lock:
+        stream = get_stream(job.stream)
+        # FPS total (todas las cámaras) y por cámara
+        update_fps(camera_data, current_time)
+        update_fps(stream, current_time)
+        
+        camera_data['last_update'] = current_time
+        camera_data['frame_count'] += 1
+        stream['last_update'] = current_time
+        stream['frame_count'] += 1
+        if not job.static:
+            stream['motion_frame'] = stream['frame_count']
+        stream['motion_ratio'] = job.motion_ratio
         
-        if s_mean < 50 and v_mean > 200:
-            return "blanco"
-        elif s_mean < 50 and v_mean < 50:
-            return "negro"
+        # ===== SISTEMA DE TRACKING DE VEHÍCULOS ÚNICOS =====
+        if vehicles is None:
+            # Sin YOLO (stride o escena estática): bajas por max_frames_missing
+            # en cada frame; los que quedan, predichos
+            stream['tracker'].age(stream['frame_count'])
+            vehicles = predict_vehicles(stream, frame.shape)
         else:
-            return "gris"
-
-def detect_vehicles(frame, tracked_vehicles=None):
-    """Detecta vehículos en el frame"""
-    if frame is None:
-        return None, []
-    
-    # Detección YOLO
-    results = model(frame, conf=CONFIDENCE_THRESHOLD, verbose=False)
+            update_tracking(stream, vehicles)
+        
+        # Actualizar estadísticas (los totales suman todas las cámaras)
+        stream['vehicle_count'] = len(vehicles)
+        stream['detected_vehicles'] = vehicles
+        stream['latency_ms'] = (current_time - job.received_at) * 1000
+        camera_data['vehicle_count'] = sum(s['vehicle_count'] for s in streams.values())
+        camera_data['vehicle_history'].append(camera_data['vehicle_count'])
+        camera_data['detected_vehicles'] = [v for s in streams.values() for v in s['detected_vehicles']]
+        camera_data['latency_ms'] = stream['latency_ms']
+        has_clients = bool(websocket_clients.get(job.stream) or
+                           (websocket_clients.get(None) and job.stream == primary_stream()))
     
-    vehicles = []
+    job.processed = annotate_frame(frame.copy(), vehicles)
+    with data_lock:
+        camera_data['raw_frame'] = frame
+        camera_data['processed_frame'] = job.processed
     
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            
-            # Filtrar solo vehículos
-            if cls in VEHICLE_CLASSES:
-                bbox = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = map(int, bbox)
-                
-                # Tipo de vehículo
-                vehicle_type = COCO_CLASSES.get(cls, "unknown")
-                
-                # Color dominante
-                color = get_dominant_color(frame, bbox)
-                
-                vehicles.append({
-                    'bbox': (x1, y1, x2, y2),
-                    'confidence': conf,
-                    'type': vehicle_type,
-                    'color': color
-                })
-                
-                # Buscar ID del tracking si está disponible
-                vehicle_id = None
-                if tracked_vehicles:
-                    for vid, vdata in tracked_vehicles.items():
-                        if vdata['bbox'] == (x1, y1, x2, y2):
-                            vehicle_id = vid
-                            break
-                
-                # Dibujar bounding box
-                color_bgr = (0, 255, 0)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color_bgr, 2)
-                
-                # Label con ID si está disponible
-                if vehicle_id:
-                    label = f"ID:{vehicle_id} {vehicle_type} ({color}) {conf:.2f}"
-                else:
-                    label = f"{vehicle_type} ({color}) {conf:.2f}"
-                
-                # Fondo para el texto
-                (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-                cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color_bgr, -1)
-                cv2.putText(frame, label, (x1, y1 - 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    # Sin clientes para esta cámara no hace falta codificar
+    return job if has_clients else None
+
+def encode_stage(job):
+    """JPEG del frame anotado y broadcast a los clientes WebSocket"""
+    _, buffer = cv2.imencode('.jpg', job.processed, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
+    frame_bytes = buffer.tobytes()
     
-    # Contador en la esquina
-    count_text = f"Vehiculos: {len(vehicles)}"
-    cv2.rectangle(frame, (5, 5), (250, 45), (0, 0, 0), -1)
-    cv2.putText(frame, count_text, (10, 35),
-               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    with data_lock:
+        keys = [job.stream, None] if job.stream == primary_stream() else [job.stream]
+        clients = [(key, ws) for key in keys for ws in websocket_clients.get(key, ())]
+    if job.seq % 30 == 0:
+        print(f"📤 Broadcasting {job.stream} a {len(clients)} cliente(s)")
     
-    return frame, vehicles
+    for key, ws in clients:
+        try:
+            ws.send(frame_bytes)
+        except Exception as e:
+            print(f"❌ Error enviando a cliente: {e}")
+            with data_lock:
+                if ws in websocket_clients[key]:
+                    websocket_clients[key].remove(ws)
+    return job
+
+def job_stream(job):
+    return job.stream
+
+pipeline = Pipeline([
+    Stage('decode', decode_stage, key=job_stream),
+    BatchStage('inference', inference_stage, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT, key=job_stream),
+    Stage('track', track_stage, key=job_stream),
+    Stage('encode', encode_stage, key=job_stream),
+])
 
 # ===========================
 # WEBSOCKET CLIENT (Oracle)
 # ===========================
 
+def oracle_uri():
+    """(uri, es_feed): una cámara por /ws/<id>; varias o todas por /feed"""
+    if ORACLE_CAMERAS and len(ORACLE_CAMERAS) == 1:
+        return f"{ORACLE_SERVER}/ws/{ORACLE_CAMERAS[0]}", False
+    query = f"?nodes={','.join(ORACLE_CAMERAS)}" if ORACLE_CAMERAS else ''
+    return f"{ORACLE_SERVER}/feed{query}", True
+
 async def consume_oracle_stream():
-    """Conecta al servidor Oracle y consume el stream"""
-    uri = f"{ORACLE_SERVER}/ws/stream"
+    """Conecta al servidor Oracle y entrega cada frame al pipeline"""
+    uri, is_feed = oracle_uri()
     
     print(f"🔄 Conectando a Oracle: {uri}")
     
@@ -310,112 +466,20 @@ async def consume_oracle_stream():
                     if frame_counter % 30 == 0:  # Log cada 30 frames
                         print(f"📦 Recibidos {frame_counter} frames desde Oracle")
                     
-                    # Decodificar JPEG
-                    nparr = np.frombuffer(frame_data, np.uint8)
-                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    if is_feed:
+                        # JPEG sin copiar; vacío = heartbeat
+                        stream_id, _, _, frame_data = parse_feed_message(frame_data)
+                    else:
+                        stream_id = ORACLE_CAMERAS[0]
+                    if not frame_data:
+                        continue  # Heartbeat: escena sin cambios
                     
-                    if frame is None:
-                        print("⚠️ Frame corrupto recibido")
-                        continue
-                    
-                    # Detectar vehículos (pasar tracked_vehicles para mostrar IDs)
+                    # Solo encolar: el socket nunca espera al procesamiento
+                    # (si el pipeline va lento, el frame pendiente se reemplaza)
                     with data_lock:
-                        tracked = camera_data['tracked_vehicles'].copy()
-                    processed_frame, vehicles = detect_vehicles(frame.copy(), tracked)
-                    
-                    current_time = time.time()
-                    
-                    # Actualizar datos
-                    with data_lock:
-                        # FPS
-                        time_delta = current_time - camera_data['last_fps_time']
-                        if time_delta > 0:
-                            instant_fps = 1.0 / time_delta
-                            camera_data['fps_buffer'].append(instant_fps)
-                            camera_data['fps'] = sum(camera_data['fps_buffer']) / len(camera_data['fps_buffer'])
-                        
-                        camera_data['raw_frame'] = frame
-                        camera_data['processed_frame'] = processed_frame
-                        camera_data['last_update'] = current_time
-                        camera_data['last_fps_time'] = current_time
-                        camera_data['frame_count'] += 1
-                        
-                        # ===== SISTEMA DE TRACKING DE VEHÍCULOS ÚNICOS =====
-                        current_frame = camera_data['frame_count']
-                        matched_ids = set()
-                        
-                        # Procesar cada vehículo detectado
-                        for vehicle in vehicles:
-                            bbox = vehicle['bbox']
-                            
-                            # Buscar si este vehículo ya está siendo rastreado
-                            vehicle_id = match_vehicle_to_tracked(
-                                bbox, 
-                                camera_data['tracked_vehicles'],
-                                camera_data['max_distance']
-                            )
-                            
-                            if vehicle_id is not None:
-                                # Vehículo existente - actualizar posición
-                                camera_data['tracked_vehicles'][vehicle_id]['bbox'] = bbox
-                                camera_data['tracked_vehicles'][vehicle_id]['last_seen'] = current_frame
-                                matched_ids.add(vehicle_id)
-                            else:
-                                # Vehículo nuevo - crear nuevo tracking
-                                new_id = camera_data['next_vehicle_id']
-                                camera_data['tracked_vehicles'][new_id] = {
-                                    'bbox': bbox,
-                                    'last_seen': current_frame,
-                                    'counted': True,
-                                    'type': vehicle['type'],
-                                    'color': vehicle['color'],
-                                    'confidence': vehicle['confidence']
-                                }
-                                camera_data['next_vehicle_id'] += 1
-                                matched_ids.add(new_id)
-                                
-                                # INCREMENTAR CONTADOR SOLO PARA VEHÍCULOS NUEVOS
-                                camera_data['total_vehicles_detected'] += 1
-                                
-                                # Contar tipos y colores
-                                camera_data['vehicle_types'][vehicle['type']] += 1
-                                camera_data['vehicle_colors'][vehicle['color']] += 1
-                                
-                                # Guardar en XML solo vehículos nuevos con alta confianza
-                                if vehicle['confidence'] > 0.7:
-                                    save_detection_to_xml(vehicle)
-                        
-                        # Limpiar vehículos que ya no se ven
-                        vehicles_to_remove = []
-                        for vehicle_id, vehicle_data in camera_data['tracked_vehicles'].items():
-                            if current_frame - vehicle_data['last_seen'] > camera_data['max_frames_missing']:
-                                vehicles_to_remove.append(vehicle_id)
-                        
-                        for vehicle_id in vehicles_to_remove:
-                            del camera_data['tracked_vehicles'][vehicle_id]
-                        
-                        # Actualizar estadísticas
-                        camera_data['vehicle_count'] = len(vehicles)
-                        camera_data['vehicle_history'].append(len(vehicles))
-                        camera_data['detected_vehicles'] = vehicles
-                        
-                        # Broadcast a clientes WebSocket
-                        if processed_frame is not None and len(websocket_clients) > 0:
-                            _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                            frame_bytes = buffer.tobytes()
-                            
-                            print(f"📤 Broadcasting a {len(websocket_clients)} cliente(s)")
-                            
-                            dead_clients = []
-                            for ws in websocket_clients:
-                                try:
-                                    ws.send(frame_bytes)
-                                except Exception as e:
-                                    print(f"❌ Error enviando a cliente: {e}")
-                                    dead_clients.append(ws)
-                            
-                            for ws in dead_clients:
-                                websocket_clients.remove(ws)
+                        camera_data['received_frames'] += 1
+                    stride.arrival(stream_id, time.time())
+                    pipeline.submit(FrameJob(stream_id, frame_counter, frame_data, time.time()))
                     
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -444,7 +508,11 @@ def index():
         <ul>
             <li><a href="/stats" style="color: #00ff00;">/stats</a> - Estadísticas</li>
             <li><a href="/api/vehicles" style="color: #00ff00;">/api/vehicles</a> - API para Laravel</li>
+            <li><a href="/api/detections" style="color: #00ff00;">/api/detections</a> - Detecciones guardadas (filtros y cursor)</li>
+            <li><a href="/api/detections.csv" style="color: #00ff00;">/api/detections.csv</a> - Export CSV</li>
+            <li><a href="/api/vehicles/rollups?bucket=hour" style="color: #00ff00;">/api/vehicles/rollups</a> - Conteos por minuto/hora/día</li>
             <li><code>ws://localhost:8080/ws/stream</code> - WebSocket stream</li>
+            <li><code>ws://localhost:8080/ws/stream/&lt;camara&gt;</code> - Stream de una cámara</li>
         </ul>
         <h3>Estado: <span style="color: #00ff00;">✅ Online</span></h3>
     </body>
@@ -463,8 +531,17 @@ def stats():
             'total_detected': camera_data['total_vehicles_detected'],
             'vehicle_types': dict(camera_data['vehicle_types']),
             'vehicle_colors': dict(camera_data['vehicle_colors']),
-            'tracked_count': len(camera_data['tracked_vehicles']),
-            'next_id': camera_data['next_vehicle_id']
+            'tracked_count': tracked_count(),
+            'next_id': camera_data['next_vehicle_id'],
+            'received_frames': camera_data['received_frames'],
+            'latency_ms': camera_data['latency_ms'],
+            'xml_pending': store.pending(),
+            'store': store.stats(),
+            'pipeline': pipeline.stats(),
+            'inference': backend.describe(),
+            'stride': stride.stats(),
+            'motion': motion.stats(stride.inference_ms),
+            'cameras': {stream_id: stream_stats(s) for stream_id, s in streams.items()}
         })
 
 @app.route('/api/vehicles')
@@ -477,31 +554,115 @@ def api_vehicles():
             'timestamp': time.time(),
             'current_vehicles': camera_data['vehicle_count'],
             'total_detected': camera_data['total_vehicles_detected'],
-            'unique_vehicles_tracked': len(camera_data['tracked_vehicles']),
+            'unique_vehicles_tracked': tracked_count(),
             'fps': camera_data['fps'],
             'avg_vehicles': avg_vehicles,
             'vehicle_types': dict(camera_data['vehicle_types']),
             'vehicle_colors': dict(camera_data['vehicle_colors']),
             'history': list(camera_data['vehicle_history']),
-            'detected_vehicles': camera_data['detected_vehicles']
+            'detected_vehicles': camera_data['detected_vehicles'],
+            'cameras': {stream_id: stream_stats(s) for stream_id, s in streams.items()}
         })
 
+def report_filters():
+    """Filtros del reporte de Laravel (?tipo=&fecha_inicio=&fecha_fin=); ValueError si son inválidos"""
+    return build_filters(request.args.get('tipo'), request.args.get('fecha_inicio'),
+                         request.args.get('fecha_fin'))
+
+@app.route('/api/detections')
+def api_detections():
+    """Detecciones guardadas, más recientes primero, paginadas con ?cursor= y ?limit="""
+    try:
+        filters = report_filters()
+        cursor = request.args.get('cursor')
+        cursor = decode_cursor(cursor) if cursor else None
+        limit = min(max(int(request.args.get('limit', QUERY_DEFAULT_LIMIT)), 1), QUERY_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'parámetros inválidos'}), 400
+    
+    connection = store.reader()
+    try:
+        rows, next_cursor = query_page(connection, filters, cursor, limit)
+    finally:
+        connection.close()
+    return jsonify({
+        'registros': [detection_record(row) for row in rows],
+        'next_cursor': next_cursor,
+        'limit': limit
+    })
+
+@app.route('/api/detections.csv')
+def api_detections_csv():
+    """Todas las detecciones filtradas en CSV (mismo formato que el export de Laravel), en streaming"""
+    try:
+        filters = report_filters()
+    except ValueError:
+        return jsonify({'error': 'parámetros inválidos'}), 400
+    
+    filename = f"reporte_vehiculos_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}"
+    if request.args.get('tipo'):
+        filename += f"_{request.args['tipo'].lower()}"
+    if request.args.get('fecha_inicio'):
+        filename += f"_desde_{request.args['fecha_inicio']}"
+    if request.args.get('fecha_fin'):
+        filename += f"_hasta_{request.args['fecha_fin']}"
+    
+    def generate():
+        connection = store.reader()
+        try:
+            yield from iter_csv(connection, filters)
+        finally:
+            connection.close()
+    
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'})
+
+@app.route('/api/vehicles/rollups')
+def api_rollups():
+    """Vehículos contados por bucket (?bucket=minute|hour|day&from=&to=&camera=), por tipo, color y cámara"""
+    bucket = request.args.get('bucket', 'hour')
+    try:
+        if bucket not in ROLLUP_BUCKET_SECONDS:
+            raise ValueError(bucket)
+        end = parse_time(request.args['to']) if request.args.get('to') else time.time()
+        start = (parse_time(request.args['from']) if request.args.get('from')
+                 else end - ROLLUP_DEFAULT_SPAN[bucket])
+        if end <= start or (end - start) / ROLLUP_BUCKET_SECONDS[bucket] > ROLLUP_MAX_BUCKETS:
+            raise ValueError('rango')
+    except ValueError:
+        return jsonify({'error': 'parámetros inválidos'}), 400
+    
+    connection = store.reader()
+    try:
+        buckets = query_rollups(connection, bucket, start, end, request.args.get('camera'))
+    finally:
+        connection.close()
+    return jsonify({
+        'bucket': bucket,
+        'from': start,
+        'to': end,
+        'total': sum(entry['total'] for entry in buckets),
+        'buckets': buckets
+    })
+
 @app.route('/api/reset', methods=['POST'])
 def reset_counter():
-    """Resetea el contador de vehículos"""
+    """Resetea el contador de vehículos (los rollups guardados no se tocan)"""
     with data_lock:
         camera_data['total_vehicles_detected'] = 0
         camera_data['vehicle_types'].clear()
         camera_data['vehicle_colors'].clear()
-        camera_data['tracked_vehicles'].clear()
+        for stream in streams.values():
+            stream['tracker'].clear()
         camera_data['next_vehicle_id'] = 1
         return jsonify({'status': 'success', 'message': 'Contador reseteado'})
 
-@sock.route('/ws/stream')
-def websocket_stream(ws):
-    """WebSocket para streaming"""
-    print(f"✅ Nuevo cliente WebSocket conectado. Total: {len(websocket_clients) + 1}")
-    websocket_clients.append(ws)
+def serve_stream_client(ws, camera_id):
+    """Registra al cliente y lo mantiene hasta que se desconecte (None = cámara principal)"""
+    with data_lock:
+        websocket_clients[camera_id].append(ws)
+        total = sum(len(clients) for clients in websocket_clients.values())
+    print(f"✅ Nuevo cliente WebSocket conectado. Total: {total}")
     
     try:
         while True:
@@ -512,36 +673,83 @@ def websocket_stream(ws):
     except Exception as e:
         print(f"⚠️ Cliente WebSocket desconectado: {e}")
     finally:
-        if ws in websocket_clients:
-            websocket_clients.remove(ws)
-        print(f"👋 Cliente desconectado. Quedan: {len(websocket_clients)}")
+        with data_lock:
+            if ws in websocket_clients[camera_id]:
+                websocket_clients[camera_id].remove(ws)
+            total = sum(len(clients) for clients in websocket_clients.values())
+        print(f"👋 Cliente desconectado. Quedan: {total}")
+
+@sock.route('/ws/stream')
+def websocket_stream(ws):
+    """WebSocket para streaming (cámara principal)"""
+    serve_stream_client(ws, None)
+
+@sock.route('/ws/stream/<camera_id>')
+def websocket_stream_camera(ws, camera_id):
+    """WebSocket para streaming de una cámara"""
+    serve_stream_client(ws, camera_id)
 
 # ===========================
 # MAIN
 # ===========================
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detector local de vehículos')
+    parser.add_argument('--backend', choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument('--model', default=YOLO_MODEL)
+    parser.add_argument('--threads', type=int, default=INFERENCE_THREADS, help='0 = todos los núcleos')
+    parser.add_argument('--target-fps', type=float, default=INFERENCE_TARGET_FPS,
+                        help='FPS por cámara a sostener salteando inferencias (stride adaptativo)')
+    parser.add_argument('--motion-threshold', type=float, default=MOTION_MIN_RATIO,
+                        help='Fracción del frame en movimiento para correr YOLO (0 = siempre)')
+    args = parser.parse_args()
+    stride.target_fps = args.target_fps
+    motion.min_ratio = args.motion_threshold
+    
     print("\n" + "="*70)
     print("🚗 DETECTOR LOCAL DE VEHÍCULOS CON TRACKING ÚNICO")
     print("="*70)
-    print(f"📡 Conectando a Oracle: {ORACLE_SERVER}")
+    print(f"📡 Conectando a Oracle: {ORACLE_SERVER} (cámaras: {ORACLE_CAMERAS or 'todas'})")
     print(f"🌐 API Local: http://localhost:{LOCAL_PORT}")
     print(f"📊 Stats: http://localhost:{LOCAL_PORT}/stats")
     print(f"🔌 WebSocket: ws://localhost:{LOCAL_PORT}/ws/stream")
     print(f"🎯 API Laravel: http://localhost:{LOCAL_PORT}/api/vehicles")
+    print(f"🔎 Detecciones: http://localhost:{LOCAL_PORT}/api/detections?tipo=&fecha_inicio=&fecha_fin=&cursor=&limit=")
+    print(f"📄 CSV: http://localhost:{LOCAL_PORT}/api/detections.csv?tipo=&fecha_inicio=&fecha_fin=")
+    print(f"📈 Rollups: http://localhost:{LOCAL_PORT}/api/vehicles/rollups?bucket=minute|hour|day&from=&to=&camera=")
     print(f"🔄 Reset Contador: POST http://localhost:{LOCAL_PORT}/api/reset")
-    print(f"💾 XML Database: {XML_DB_PATH}")
+    print(f"💾 Base: {DB_PATH} (vista XML: {XML_DB_PATH})")
     print("="*70)
     print("✨ SISTEMA DE TRACKING:")
     print("  - Cada vehículo único recibe un ID")
     print("  - Solo se cuenta una vez por vehículo")
     print("  - Distancia máxima tracking: 100px")
     print("  - Frames antes de eliminar: 30")
+    print(f"  - Asignación: IoU + distancia, {'húngaro (scipy)' if SCIPY_AVAILABLE else 'greedy uno a uno (sin scipy)'}")
+    print("⚡ PIPELINE: decode → inference → track → encode (un thread por etapa)")
+    print(f"  - Inferencia en batch: hasta {INFERENCE_MAX_BATCH} frames, espera máx. {INFERENCE_MAX_WAIT * 1000:.0f}ms")
+    print(f"  - Backend: {args.backend}, threads: {args.threads or 'auto'}")
+    if args.target_fps:
+        print(f"  - Stride adaptativo: {args.target_fps:g} FPS por cámara, YOLO cada 1..{INFERENCE_MAX_STRIDE} frames")
+    else:
+        print("  - YOLO en todos los frames (--target-fps para stride adaptativo)")
+    if args.motion_threshold:
+        print(f"  - Compuerta de movimiento: ≥ {args.motion_threshold:.2%} del frame, keep-alive cada {MOTION_KEEPALIVE_FRAMES} frames")
     print("="*70)
-    print("\n📦 Instalación: pip install ultralytics opencv-python websockets flask flask-sock\n")
+    if not SCIPY_AVAILABLE:
+        print("⚠️ scipy no instalado: el tracker usa asignación greedy (pip install scipy)")
+    print("\n📦 Instalación: pip install ultralytics opencv-python websockets flask flask-sock scipy")
+    print("   Backends opcionales: pip install onnxruntime | pip install openvino nncf\n")
+    
+    load_backend(args.backend, args.model, args.threads)
     
-    # Inicializar base de datos XML
-    init_xml_database()
+    # Base de detecciones (regenera la vista XML)
+    store.open()
+    print(f"✅ Base de detecciones: {store.rows} registros")
+    
+    # Pipeline de procesamiento y escritor de la base
+    pipeline.start()
+    store.start()
     
     # Iniciar cliente WebSocket en thread
     ws_thread = threading.Thread(target=start_websocket_client, daemon=True)
@@ -551,4 +759,8 @@ if __name__ == '__main__':
     time.sleep(2)
     
     # Iniciar servidor Flask
-    app.run(host='0.0.0.0', port=LOCAL_PORT, threaded=True, debug=False)
\ No newline at end of file
+    try:
+        app.run(host='0.0.0.0', port=LOCAL_PORT, threaded=True, debug=False)
+    finally:
+        # Confirmar las detecciones encoladas antes de salir
+        store.close()
\ No newline at end of file
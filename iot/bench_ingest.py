@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ingesta de punta a punta contra el servidor local
+- Levanta server.py (o server_async.py) salvo que se pase --url
+- Envía carga sintética con loadgen.py y, opcionalmente, conecta viewers WebSocket
+- Lee /metrics antes y después: frames/s sostenidos, tasa de completado,
+  p50/p99 de reensamblado y de fan-out, descartes del kernel
+- Guarda el resultado en JSON para comparar corridas
+
+Uso: python3 bench_ingest.py --nodes 8 --fps 30 --duration 15 [--viewers 2] [--output r.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+from loadgen import add_load_arguments, run_load_parallel
+from metrics import LATENCY_BUCKETS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'bench_results')
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$')
+LE_LABEL = re.compile(r'le="([^"]+)"')
+SETTLE_SECONDS = 1.0  # Espera tras la carga para que terminen los últimos frames
+
+
+def fetch(url, timeout=5.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def scrape(base_url):
+    """
+    /metrics → (totales por nombre sumando etiquetas, buckets por histograma).
+    Solo lo necesario del formato de texto de Prometheus.
+    """
+    totals = defaultdict(float)
+    buckets = defaultdict(dict)
+    for line in fetch(f"{base_url}/metrics").splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        if name.endswith('_bucket'):
+            le = LE_LABEL.search(labels or '')
+            if le:
+                bound = float('inf') if le.group(1) == '+Inf' else float(le.group(1))
+                buckets[name[:-len('_bucket')]][bound] = float(value)
+            continue
+        totals[name] += float(value)
+    return totals, buckets
+
+
+def histogram_quantile(q, before, after):
+    """Cuantil por interpolación lineal dentro del bucket (como histogram_quantile)"""
+    bounds = sorted(after)
+    counts = [after[b] - before.get(b, 0.0) for b in bounds]
+    total = counts[-1] if counts else 0.0
+    if total <= 0:
+        return None
+    rank = q * total
+    lower_bound = lower_count = 0.0
+    for bound, cumulative in zip(bounds, counts):
+        if cumulative >= rank:
+            if bound == float('inf'):
+                return lower_bound
+            in_bucket = cumulative - lower_count
+            fraction = (rank - lower_count) / in_bucket if in_bucket else 1.0
+            return lower_bound + (bound - lower_bound) * fraction
+        lower_bound, lower_count = bound, cumulative
+    return lower_bound
+
+
+def wait_healthy(base_url, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            fetch(f"{base_url}/health", timeout=1.0)
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Viewers:
+    """Viewers WebSocket que solo cuentan lo recibido (para medir el fan-out)"""
+
+    def __init__(self, base_url, node_ids, per_node):
+        self.received = 0
+        self.stopped = threading.Event()
+        self.threads = []
+        ws_url = base_url.replace('http://', 'ws://', 1)
+        for node_id in node_ids:
+            for _ in range(per_node):
+                thread = threading.Thread(target=self._run, args=(f"{ws_url}/ws/{node_id}",),
+                                          daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _run(self, url):
+        from simple_websocket import Client  # Viene con flask-sock
+        ws = Client.connect(url)
+        try:
+            while not self.stopped.is_set():
+                if ws.receive(timeout=0.5) is not None:
+                    self.received += 1
+        except Exception:
+            pass
+        finally:
+            ws.close()
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+
+
+def delta(before, after, name):
+    return after.get(name, 0.0) - before.get(name, 0.0)
+
+
+def run_benchmark(args):
+    base_url = args.url
+    server = None
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.web_port}"
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, args.server)], cwd=HERE,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_healthy(base_url):
+            raise RuntimeError(f"el servidor no respondió en {base_url}/health")
+
+        node_ids = [f"SIM_{n:03d}" for n in range(args.nodes)]
+        viewers = Viewers(base_url, node_ids, args.viewers) if args.viewers else None
+        time.sleep(0.5)
+
+        totals_before, buckets_before = scrape(base_url)
+        load = run_load_parallel((args.host, args.port), args.nodes, args.fps, args.frame_size,
+                                 args.packet_size, args.loss, args.reorder, args.duration,
+                                 args.processes, seed=args.seed, parity_group=args.parity)
+        time.sleep(SETTLE_SECONDS)
+        totals_after, buckets_after = scrape(base_url)
+        if viewers is not None:
+            viewers.stop()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    completed = delta(totals_before, totals_after, 'polysense_frames_completed_total')
+    latencies = {}
+    for key, name in (('reassembly', 'polysense_frame_reassembly_seconds'),
+                      ('fanout', 'polysense_frame_fanout_seconds')):
+        for q in (0.5, 0.99):
+            value = histogram_quantile(q, buckets_before.get(name, {}), buckets_after.get(name, {}))
+            latencies[f"{key}_p{int(q * 100)}_ms"] = None if value is None else value * 1000
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'server': args.url or args.server,
+            'nodes': args.nodes, 'fps': args.fps, 'frame_size': args.frame_size,
+            'packet_size': args.packet_size, 'loss': args.loss, 'reorder': args.reorder,
+            'duration': args.duration, 'processes': args.processes, 'viewers': args.viewers,
+            'parity_group': args.parity,
+            'histogram_buckets': list(LATENCY_BUCKETS)
+        },
+        'load': load,
+        'results': {
+            'frames_per_sec': completed / load['elapsed'],
+            'offered_frames_per_sec': load['frames_sent'] / load['elapsed'],
+            'completion_rate': completed / load['frames_sent'] if load['frames_sent'] else 0.0,
+            'frames_completed': completed,
+            'frames_dropped': delta(totals_before, totals_after, 'polysense_frames_dropped_total'),
+            'datagrams_received': delta(totals_before, totals_after, 'polysense_udp_datagrams_total'),
+            'datagrams_recovered': delta(totals_before, totals_after, 'polysense_udp_recovered_datagrams_total'),
+            'kernel_drops': delta(totals_before, totals_after, 'polysense_udp_kernel_drops_total'),
+            'viewer_frames_received': viewers.received if viewers is not None else 0,
+            **latencies
+        }
+    }
+
+
+def print_report(report):
+    results = report['results']
+    load = report['load']
+
+    def ms(key):
+        value = results[key]
+        return '   n/a' if value is None else f"{value:6.2f}"
+
+    print(f"\n  Enviado:     {load['frames_sent']} frames, {load['packets_sent']} paquetes "
+          f"({load['packets_lost']} perdidos a propósito)")
+    if load['late_ticks']:
+        print(f"  ⚠ Emisor atrasado en {load['late_ticks']} ticks: usar más --processes")
+    print(f"  Sostenido:   {results['frames_per_sec']:.1f} frames/s "
+          f"(ofrecido {results['offered_frames_per_sec']:.1f})")
+    print(f"  Completado:  {results['completion_rate']:.1%}  "
+          f"(descartados {results['frames_dropped']:.0f}, kernel drops {results['kernel_drops']:.0f})")
+    print(f"  Reensamblado p50/p99: {ms('reassembly_p50_ms')} / {ms('reassembly_p99_ms')} ms")
+    print(f"  Fan-out      p50/p99: {ms('fanout_p50_ms')} / {ms('fanout_p99_ms')} ms")
+    if report['config']['viewers']:
+        print(f"  Viewers:     {results['viewer_frames_received']} frames recibidos")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_load_arguments(parser)
+    parser.add_argument('--server', default='server.py', choices=['server.py', 'server_async.py'])
+    parser.add_argument('--url', default=None, help='Usar un servidor ya levantado (ej. http://127.0.0.1:5000)')
+    parser.add_argument('--web-port', type=int, default=5000)
+    parser.add_argument('--viewers', type=int, default=0, help='Viewers WebSocket por nodo')
+    parser.add_argument('--output', default=None, help='Archivo JSON (por defecto bench_results/)')
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print("⚡ BENCHMARK INGESTA ESP32-CAM")
+    print("=" * 70)
+    print(f"{args.nodes} nodos × {args.fps:.0f} FPS, {args.frame_size} bytes/frame, "
+          f"pérdida {args.loss:.1%}, reorden {args.reorder:.1%}, {args.duration:.0f}s")
+
+    report = run_benchmark(args)
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"ingest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Resultado guardado en {output}\n")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Compuerta de cambios por cámara (antes del fan-out)
+- Etapa 1: CRC32 + tamaño del JPEG (microsegundos): idéntico → sin cambio,
+  tamaño muy distinto → cambio
+- Etapa 2: luminancia a 1/8 (decodificación reducida de libjpeg) contra el
+  último frame reenviado: fracción de pixeles que cambiaron
+- Los frames sin cambio se reemplazan por un heartbeat (a lo sumo uno por
+  intervalo); cada max_suppress_seconds se reenvía un frame igual
+- Sin OpenCV solo se aplica la etapa 1 (ante la duda, se reenvía)
+"""
+
+import zlib
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+FORWARD = 'forward'
+HEARTBEAT = 'heartbeat'
+DROP = 'drop'
+
+# Umbrales por defecto (se pueden pisar por cámara)
+GATE_DEFAULTS = {
+    'size_tolerance': 0.03,        # Δtamaño relativo por debajo del cual se mira la luminancia
+    'pixel_threshold': 20,         # Δluma (0-255) para contar un pixel como cambiado
+    'min_changed_ratio': 0.005,    # Fracción de pixeles cambiados para reenviar
+    'heartbeat_interval': 1.0,     # Segundos entre heartbeats de una escena quieta
+    'max_suppress_seconds': 10.0,  # Reenviar igual cada tanto (refresca snapshots y viewers nuevos)
+}
+
+
+def luma_thumbnail(frame_data):
+    """Luminancia a 1/8 de resolución (IDCT reducida de libjpeg); None si falla"""
+    return cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+
+class ChangeGate:
+    """Estado de una cámara: se llama siempre desde el mismo thread (el que publica)"""
+
+    __slots__ = ('node_id', 'size_tolerance', 'pixel_threshold', 'min_changed_ratio',
+                 'heartbeat_interval', 'max_suppress_seconds', 'last_frame', 'last_size',
+                 'last_digest', 'last_luma', 'last_forward', 'last_heartbeat',
+                 'forwarded', 'suppressed', 'heartbeats', 'luma_checks')
+
+    def __init__(self, node_id, **thresholds):
+        self.node_id = node_id
+        for key, value in GATE_DEFAULTS.items():
+            setattr(self, key, thresholds.get(key, value))
+        self.last_frame = None
+        self.last_size = 0
+        self.last_digest = None
+        self.last_luma = None
+        self.last_forward = 0.0
+        self.last_heartbeat = 0.0
+        self.forwarded = 0
+        self.suppressed = 0
+        self.heartbeats = 0
+        self.luma_checks = 0
+
+    def _compare(self, frame_data, size, digest):
+        """(cambió, luminancia del frame nuevo si se calculó)"""
+        if digest == self.last_digest and size == self.last_size:
+            return False, None
+        if abs(size - self.last_size) > self.size_tolerance * self.last_size or cv2 is None:
+            return True, None
+
+        # Luminancia del último reenviado: se calcula solo cuando hace falta
+        if self.last_luma is None:
+            self.last_luma = luma_thumbnail(self.last_frame)
+        luma = luma_thumbnail(frame_data)
+        self.luma_checks += 1
+        if luma is None or self.last_luma is None or luma.shape != self.last_luma.shape:
+            return True, luma
+        changed = np.count_nonzero(cv2.absdiff(luma, self.last_luma) > self.pixel_threshold)
+        return changed >= self.min_changed_ratio * luma.size, luma
+
+    def check(self, frame_data, now):
+        """FORWARD, HEARTBEAT o DROP para este frame"""
+        size = len(frame_data)
+        digest = zlib.crc32(frame_data)
+
+        if self.last_frame is None or now - self.last_forward >= self.max_suppress_seconds:
+            changed, luma = True, None
+        else:
+            changed, luma = self._compare(frame_data, size, digest)
+
+        if changed:
+            self.last_frame = frame_data
+            self.last_size = size
+            self.last_digest = digest
+            self.last_luma = luma
+            self.last_forward = now
+            self.forwarded += 1
+            return FORWARD
+
+        self.suppressed += 1
+        if now - self.last_heartbeat >= self.heartbeat_interval:
+            self.last_heartbeat = now
+            self.heartbeats += 1
+            return HEARTBEAT
+        return DROP
+
+    def stats(self):
+        total = self.forwarded + self.suppressed
+        return {
+            'forwarded': self.forwarded,
+            'suppressed': self.suppressed,
+            'heartbeats': self.heartbeats,
+            'luma_checks': self.luma_checks,
+            'suppression_ratio': self.suppressed / total if total else 0.0
+        }
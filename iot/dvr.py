@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+DVR por cámara: anillo de frames indexado por tiempo
+- Últimos segundos en RAM (listas append-only, búsqueda con bisect)
+- Ventana larga en segmentos de disco mapeados con mmap
+- Escritura a disco en un thread aparte: la ingesta solo agrega a RAM; los
+  segmentos se crean y se cierran fuera del lock de la cámara
+- Replay en streaming: bajo el lock solo se toma el rango (segmentos e
+  índices); los frames se leen del mmap de a uno, fuera del lock. Un
+  segmento que sale de la retención se cierra cuando lo suelta el último replay
+- Orden y búsqueda con un reloj monotónico (RecordingClock): un salto de NTP
+  no desordena el anillo ni los segmentos; la hora de pared se guarda aparte
+  solo para mostrarla
+"""
+
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+# Registro en segmento: reloj de grabación + hora de pared (doubles) + largo del JPEG (uint32) + JPEG
+RECORD = struct.Struct('<ddI')
+SEGMENT_NAME = re.compile(r'^(\d+)\.seg$')
+WRITE_QUEUE_SIZE = 256  # Frames pendientes de escribir a disco (si se llena, se descartan)
+
+
+class RecordingClock:
+    """
+    Reloj de grabación: monotónico, pero en segundos unix (anclado a la hora
+    de pared al arrancar) para que los segmentos sigan en orden tras reiniciar.
+    """
+
+    def __init__(self):
+        self.offset = time.time() - time.monotonic()
+
+    def now(self):
+        return time.monotonic() + self.offset
+
+    def from_wall(self, wall_time):
+        """Hora de pared (la que pide el cliente) → reloj de grabación, con el desfase actual"""
+        return wall_time - (time.time() - self.now())
+
+
+class RamRing:
+    """
+    Frames recientes en listas paralelas (timestamps, horas de pared, frames). Solo se
+    agrega al final; lo viejo se recorta avanzando `start` y se compacta
+    de vez en cuando, así append es O(1) amortizado y la búsqueda O(log n).
+    """
+
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.timestamps = []
+        self.walls = []
+        self.frames = []
+        self.start = 0
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.timestamps) - self.start
+
+    def append(self, timestamp, wall_time, frame_data):
+        self.timestamps.append(timestamp)
+        self.walls.append(wall_time)
+        self.frames.append(frame_data)
+        self.bytes += len(frame_data)
+
+        # Recortar por antigüedad y por memoria
+        oldest_allowed = timestamp - self.max_seconds
+        while len(self) > 1 and (self.timestamps[self.start] < oldest_allowed
+                                 or self.bytes > self.max_bytes):
+            self.bytes -= len(self.frames[self.start])
+            self.frames[self.start] = None
+            self.start += 1
+
+        if self.start > 1024 and self.start > len(self.timestamps) // 2:
+            del self.timestamps[:self.start]
+            del self.walls[:self.start]
+            del self.frames[:self.start]
+            self.start = 0
+
+    def oldest(self):
+        return self.timestamps[self.start] if len(self) else None
+
+    def newest(self):
+        return self.timestamps[-1] if len(self) else None
+
+    def wall_range(self):
+        return (self.walls[self.start], self.walls[-1]) if len(self) else (None, None)
+
+    def at(self, timestamp):
+        """(hora de pared, frame) más reciente con ts <= timestamp, o None"""
+        i = bisect_right(self.timestamps, timestamp, lo=self.start) - 1
+        if i < self.start:
+            return None
+        return self.walls[i], self.frames[i]
+
+    def between(self, t_from, t_to):
+        """Lista de (ts, frame) con t_from <= ts <= t_to (referencias, sin copiar los JPEG)"""
+        lo = bisect_left(self.timestamps, t_from, lo=self.start)
+        hi = bisect_right(self.timestamps, t_to, lo=lo)
+        return list(zip(self.timestamps[lo:hi], self.frames[lo:hi]))
+
+
+class Segment:
+    """Archivo de tamaño fijo, mapeado en memoria, con registros append-only"""
+
+    def __init__(self, path, size, create=False):
+        self.path = path
+        self.size = size
+        self.timestamps = []
+        self.offsets = []
+        self.write_pos = 0
+        self.readers = 0  # Replays leyendo (con el lock de la cámara)
+        self.retired = False  # Fuera de la retención: se cierra al soltarlo el último lector
+
+        mode = 'w+b' if create else 'r+b'
+        self.file = open(path, mode)
+        if create:
+            self.file.truncate(size)
+        else:
+            self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        if not create:
+            self._scan()
+
+    def _scan(self):
+        """Reconstruye el índice de un segmento existente (tras reiniciar)"""
+        pos = 0
+        while pos + RECORD.size <= self.size:
+            timestamp, _, length = RECORD.unpack_from(self.map, pos)
+            if length == 0 or pos + RECORD.size + length > self.size:
+                break
+            self.timestamps.append(timestamp)
+            self.offsets.append(pos)
+            pos += RECORD.size + length
+        self.write_pos = pos
+
+    def fits(self, length):
+        return self.write_pos + RECORD.size + length <= self.size
+
+    def append(self, timestamp, wall_time, frame_data):
+        pos = self.write_pos
+        length = len(frame_data)
+        start = pos + RECORD.size
+        self.map[start:start + length] = frame_data
+        RECORD.pack_into(self.map, pos, timestamp, wall_time, length)
+        self.timestamps.append(timestamp)
+        self.offsets.append(pos)
+        self.write_pos = start + length
+
+    def read(self, index):
+        """(ts, hora de pared, JPEG); el slice del mmap ya es una copia en bytes"""
+        pos = self.offsets[index]
+        timestamp, wall_time, length = RECORD.unpack_from(self.map, pos)
+        start = pos + RECORD.size
+        return timestamp, wall_time, self.map[start:start + length]
+
+    def wall(self, index):
+        return RECORD.unpack_from(self.map, self.offsets[index])[1]
+
+    def oldest(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def newest(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def retire(self):
+        """Sale de la retención (con el lock de la cámara); True si ya se puede cerrar"""
+        self.retired = True
+        return self.readers == 0
+
+    def release(self):
+        """Un replay deja de leerlo (con el lock de la cámara); True si hay que cerrarlo"""
+        self.readers -= 1
+        return self.retired and self.readers == 0
+
+    def close(self, delete=False):
+        self.map.close()
+        self.file.close()
+        if delete:
+            os.remove(self.path)
+
+
+class DiskStore:
+    """Segmentos de una cámara, del más viejo al más nuevo"""
+
+    def __init__(self, directory, max_seconds, max_bytes, segment_size):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.segment_size = segment_size
+        self.segments = []
+        self.starts = []  # Timestamp del primer frame de cada segmento (para bisect)
+
+        os.makedirs(directory, exist_ok=True)
+        names = sorted((int(m.group(1)), name) for name in os.listdir(directory)
+                       if (m := SEGMENT_NAME.match(name)))
+        for _, name in names:
+            segment = Segment(os.path.join(directory, name), segment_size)
+            if segment.timestamps:
+                self.segments.append(segment)
+                self.starts.append(segment.oldest())
+            else:
+                segment.close(delete=True)
+
+    def fits(self, frame_data):
+        return RECORD.size + len(frame_data) <= self.segment_size
+
+    def new_segment(self, timestamp, frame_data):
+        """
+        Segmento nuevo si el activo no alcanza, o None. Crear el archivo es lento:
+        se llama sin el lock de la cámara (solo el thread escritor modifica el disco).
+        """
+        if self.segments and self.segments[-1].fits(len(frame_data)):
+            return None
+        path = os.path.join(self.directory, f"{int(timestamp * 1000)}.seg")
+        return Segment(path, self.segment_size, create=True)
+
+    def append(self, timestamp, wall_time, frame_data, segment=None):
+        """
+        Agrega el frame (con el lock de la cámara), en `segment` si new_segment
+        dio uno. Retorna los segmentos retirados que hay que cerrar fuera del lock.
+        """
+        if segment is not None:
+            self.segments.append(segment)
+            self.starts.append(timestamp)
+        self.segments[-1].append(timestamp, wall_time, frame_data)
+
+        # Retención: sacar segmentos completos viejos (nunca el activo)
+        closable = []
+        while len(self.segments) > 1 and (
+                self.segments[1].oldest() < timestamp - self.max_seconds
+                or len(self.segments) * self.segment_size > self.max_bytes):
+            self.starts.pop(0)
+            retired = self.segments.pop(0)
+            if retired.retire():
+                closable.append(retired)
+        return closable
+
+    def oldest(self):
+        return self.segments[0].oldest() if self.segments else None
+
+    def newest(self):
+        return self.segments[-1].newest() if self.segments else None
+
+    def wall_range(self):
+        return (self.segments[0].wall(0), self.segments[-1].wall(-1)) if self.segments else (None, None)
+
+    def at(self, timestamp):
+        s = bisect_right(self.starts, timestamp) - 1
+        if s < 0:
+            return None
+        segment = self.segments[s]
+        i = bisect_right(segment.timestamps, timestamp) - 1
+        return segment.read(i) if i >= 0 else None
+
+    def ranges(self, t_from, t_to):
+        """(segmento, lo, hi) con los frames en [t_from, t_to] (con el lock de la cámara)"""
+        ranges = []
+        first = max(bisect_right(self.starts, t_from) - 1, 0)
+        for segment in self.segments[first:]:
+            if segment.oldest() > t_to:
+                break
+            lo = bisect_left(segment.timestamps, t_from)
+            hi = bisect_right(segment.timestamps, t_to, lo=lo)
+            if hi > lo:
+                ranges.append((segment, lo, hi))
+        return ranges
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+class CameraDVR:
+    """RAM + disco de una cámara, con su propio lock (lecturas cortas)"""
+
+    def __init__(self, node_id, clock, ram_seconds, ram_bytes, disk_dir, disk_seconds,
+                 disk_bytes, segment_size):
+        self.node_id = node_id
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.ram = RamRing(ram_seconds, ram_bytes)
+        self.disk = None
+        if disk_dir and disk_seconds > 0:
+            self.disk = DiskStore(os.path.join(disk_dir, safe_name(node_id)),
+                                  disk_seconds, disk_bytes, segment_size)
+        # Nunca antes que lo ya grabado (la hora de pared pudo retroceder entre reinicios)
+        self.last_timestamp = (self.disk.newest() or 0.0) if self.disk is not None else 0.0
+
+    def append(self, wall_time, frame_data):
+        """Agrega a RAM (con el lock); retorna el timestamp de grabación asignado"""
+        with self.lock:
+            timestamp = self.last_timestamp = max(self.clock.now(), self.last_timestamp)
+            self.ram.append(timestamp, wall_time, frame_data)
+        return timestamp
+
+    def at(self, wall_time):
+        """Frame (hora de pared, jpeg) vigente en `wall_time` (el último anterior)"""
+        timestamp = self.clock.from_wall(wall_time)
+        with self.lock:
+            oldest_ram = self.ram.oldest()
+            if oldest_ram is not None and timestamp >= oldest_ram:
+                return self.ram.at(timestamp)
+            if self.disk is not None:
+                found = self.disk.at(timestamp)
+                if found is not None:
+                    return found[1], found[2]
+            return None
+
+    def between(self, wall_from, wall_to):
+        """
+        Genera los frames (ts, jpeg) entre dos horas de pared, en orden y con ts
+        del reloj de grabación (la cadencia del replay no salta con NTP). La parte
+        cubierta por RAM sale de RAM. Bajo el lock solo se toma el rango: el disco
+        se lee de a un frame, sin el lock (la ingesta no espera al replay). Cerrar
+        el generador (close) si no se consume entero.
+        """
+        t_from = self.clock.from_wall(wall_from)
+        t_to = self.clock.from_wall(wall_to)
+        with self.lock:
+            oldest_ram = self.ram.oldest()
+            ranges = []
+            if self.disk is not None and (oldest_ram is None or t_from < oldest_ram):
+                disk_to = t_to if oldest_ram is None else min(t_to, oldest_ram - 1e-6)
+                ranges = self.disk.ranges(t_from, disk_to)
+                for segment, _, _ in ranges:
+                    segment.readers += 1
+            ram_frames = self.ram.between(max(t_from, oldest_ram), t_to) if oldest_ram is not None else []
+        try:
+            for segment, lo, hi in ranges:
+                for i in range(lo, hi):
+                    timestamp, _, data = segment.read(i)
+                    yield timestamp, data
+            yield from ram_frames
+        finally:
+            with self.lock:
+                closable = [segment for segment, _, _ in ranges if segment.release()]
+            for segment in closable:
+                segment.close(delete=True)
+
+    def info(self):
+        """Rango grabado en hora de pared"""
+        with self.lock:
+            ram_from, ram_to = self.ram.wall_range()
+            result = {
+                'ram': {'frames': len(self.ram), 'mb': self.ram.bytes / 1024 / 1024,
+                        'from': ram_from, 'to': ram_to}
+            }
+            if self.disk is not None:
+                disk_from, disk_to = self.disk.wall_range()
+                result['disk'] = {'segments': len(self.disk.segments),
+                                  'from': disk_from, 'to': disk_to}
+            return result
+
+
+def safe_name(node_id):
+    """node_id viene del header UDP: no usarlo tal cual como ruta"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', node_id) or '_'
+
+
+class DVRRecorder:
+    """
+    Grabador de todas las cámaras. record() se llama desde la ingesta:
+    agrega a RAM y encola para disco; un thread escribe los segmentos.
+    """
+
+    def __init__(self, ram_seconds=10, ram_bytes=64 * 1024 * 1024, disk_dir=None,
+                 disk_seconds=3600, disk_bytes=2 * 1024 ** 3, segment_size=64 * 1024 * 1024):
+        self.ram_seconds = ram_seconds
+        self.ram_bytes = ram_bytes
+        self.disk_dir = disk_dir
+        self.disk_seconds = disk_seconds
+        self.disk_bytes = disk_bytes
+        self.segment_size = segment_size
+        self.clock = RecordingClock()
+        self.cameras = {}
+        self.cameras_lock = threading.Lock()
+        self.write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.disk_dropped = 0
+        if disk_dir:
+            threading.Thread(target=self._disk_writer, daemon=True).start()
+
+    def camera(self, node_id, create=False):
+        dvr = self.cameras.get(node_id)
+        if dvr is None and create:
+            with self.cameras_lock:
+                dvr = self.cameras.get(node_id)
+                if dvr is None:
+                    dvr = CameraDVR(node_id, self.clock, self.ram_seconds, self.ram_bytes, self.disk_dir,
+                                    self.disk_seconds, self.disk_bytes, self.segment_size)
+                    self.cameras[node_id] = dvr
+        return dvr
+
+    def record(self, node_id, frame_data, wall_time):
+        """`wall_time` solo se guarda para mostrar; el orden lo da el reloj de grabación"""
+        dvr = self.camera(node_id, create=True)
+        timestamp = dvr.append(wall_time, frame_data)
+        if dvr.disk is not None:
+            try:
+                self.write_queue.put_nowait((dvr, timestamp, wall_time, frame_data))
+            except queue.Full:
+                self.disk_dropped += 1
+
+    def _disk_writer(self):
+        while True:
+            dvr, timestamp, wall_time, frame_data = self.write_queue.get()
+            if not dvr.disk.fits(frame_data):
+                continue
+            try:
+                # Crear y cerrar segmentos (archivos de 64 MB) sin el lock de la cámara
+                segment = dvr.disk.new_segment(timestamp, frame_data)
+                with dvr.lock:
+                    closable = dvr.disk.append(timestamp, wall_time, frame_data, segment)
+                for retired in closable:
+                    retired.close(delete=True)
+            except Exception as e:
+                print(f"✗ Error DVR {dvr.node_id}: {e}")
+
+    def stats(self):
+        with self.cameras_lock:
+            cameras = list(self.cameras.items())
+        return {
+            'disk_queue': self.write_queue.qsize(),
+            'disk_dropped': self.disk_dropped,
+            'cameras': {node_id: dvr.info() for node_id, dvr in cameras}
+        }
+
+
+def replay_schedule(frames, speed, started=None):
+    """
+    Genera (segundos a esperar, ts, frame) para reproducir `frames` (iterable
+    de (ts, frame), puede ser perezoso) con la cadencia original dividida por `speed`.
+    """
+    first_ts = None
+    for timestamp, frame_data in frames:
+        if first_ts is None:
+            first_ts = timestamp
+            if started is None:
+                started = time.monotonic()
+        due = started + (timestamp - first_ts) / speed
+        yield max(0.0, due - time.monotonic()), timestamp, frame_data
@@ -25,6 +25,9 @@ const char* nodeId = "CAM_001";  // Cambiar para cada cámara: CAM_002, CAM_003,
 #define JPEG_QUALITY 12           // 10-25 (menor = mejor calidad, más datos)
 #define TARGET_FPS 30             // FPS objetivo (ajustar según WiFi)
 #define FRAME_SIZE FRAMESIZE_HVGA // HVGA=480x320, CIF=400x296, QVGA=320x240
+#define PARITY_GROUP_SIZE 0       // Paquetes por paridad XOR (0 = sin paridad: servidor viejo o
+                                  // enlace sin pérdida; 4 = +33% de tráfico, 1 pérdida por grupo)
+#define CONTROL_TIMEOUT_MS 15000  // Sin control del servidor por este tiempo → volver a TARGET_FPS
 
 // ===========================
 // PINES AI THINKER
@@ -54,6 +57,13 @@ unsigned long frameCount = 0;
 unsigned long frameInterval = 1000 / TARGET_FPS;
 unsigned long lastStatsTime = 0;
 
+// Control de tasa: el servidor responde al puerto de origen con FPS y calidad objetivo
+int currentFPS = TARGET_FPS;
+int currentQuality = JPEG_QUALITY;
+int baseQuality = JPEG_QUALITY;  // Sin PSRAM arranca con otra calidad
+unsigned long lastControlTime = 0;
+bool controlled = false;
+
 // Estructura de header optimizada para UDP
 struct __attribute__((packed)) PacketHeader {
   uint32_t frameId;
@@ -63,6 +73,23 @@ struct __attribute__((packed)) PacketHeader {
   char nodeId[12];
 };
 
+// Paridad: packetNum = PARITY_FLAG | (tamaño de grupo << 8) | grupo
+#define PARITY_FLAG 0x8000
+#define PARITY_MAX_GROUPS 256
+static uint8_t parityBuffer[MAX_UDP_PACKET];
+#if PARITY_GROUP_SIZE > 127
+#error "PARITY_GROUP_SIZE debe caber en 7 bits"
+#endif
+
+// Mensaje de control del servidor (ver iot/rate_control.py)
+struct __attribute__((packed)) ControlMessage {
+  char magic[4];      // "PSRC"
+  uint32_t seq;
+  uint8_t fps;
+  uint8_t quality;    // Escala del sensor: menor = mejor calidad
+  char nodeId[12];
+};
+
 void setup() {
   WRITE_PERI_REG(RTC_CNTL_BROWN_OUT_REG, 0);
   
@@ -114,6 +141,8 @@ void setup() {
     config.frame_size = FRAMESIZE_CIF;
     config.jpeg_quality = JPEG_QUALITY + 5;
     config.fb_count = 1;
+    baseQuality = JPEG_QUALITY + 5;
+    currentQuality = baseQuality;
     Serial.println("⚠ Sin PSRAM");
     Serial.println("✓ Modo: Estándar");
   }
@@ -206,6 +235,9 @@ void setup() {
   Serial.printf("  Node ID: %s\n", nodeId);
   Serial.printf("  Target FPS: %d\n", TARGET_FPS);
   Serial.printf("  Calidad JPEG: %d\n", JPEG_QUALITY);
+  Serial.printf("  Paridad XOR: grupos de %d paquetes (0 = desactivada)\n", PARITY_GROUP_SIZE);
+  Serial.printf("  Control de tasa: FPS máx %d, vuelve a valores propios tras %d s sin control\n",
+                TARGET_FPS, CONTROL_TIMEOUT_MS / 1000);
   Serial.printf("  Resolución: %dx%d\n", 
                 s->status.framesize == FRAMESIZE_HVGA ? 480 : 400,
                 s->status.framesize == FRAMESIZE_HVGA ? 320 : 296);
@@ -217,6 +249,49 @@ void setup() {
   delay(1000);
 }
 
+void applyRate(int fps, int quality) {
+  if(fps != currentFPS) {
+    currentFPS = fps;
+    frameInterval = 1000 / fps;
+  }
+  if(quality != currentQuality) {
+    currentQuality = quality;
+    sensor_t * s = esp_camera_sensor_get();
+    s->set_quality(s, quality);
+  }
+}
+
+void pollControl() {
+  // Mensajes del servidor al puerto de origen (el mismo socket que envía)
+  int size;
+  while((size = udp.parsePacket()) > 0) {
+    ControlMessage msg;
+    if(size != sizeof(ControlMessage) || udp.read((uint8_t*)&msg, sizeof(msg)) != sizeof(msg)) {
+      udp.flush();
+      continue;
+    }
+    if(memcmp(msg.magic, "PSRC", 4) != 0 || strncmp(msg.nodeId, nodeId, 12) != 0) {
+      continue;
+    }
+    // El firmware manda: nunca más FPS que TARGET_FPS ni mejor calidad que la propia
+    int fps = constrain((int)msg.fps, 1, TARGET_FPS);
+    int quality = constrain((int)msg.quality, baseQuality, 63);
+    if(fps != currentFPS || quality != currentQuality) {
+      Serial.printf("⚡ Control #%lu: %d FPS, calidad %d\n", (unsigned long)msg.seq, fps, quality);
+    }
+    applyRate(fps, quality);
+    lastControlTime = millis();
+    controlled = true;
+  }
+  
+  // Servidor sin control (o caído): volver a los valores propios
+  if(controlled && millis() - lastControlTime > CONTROL_TIMEOUT_MS) {
+    controlled = false;
+    Serial.println("⚠ Sin control del servidor: volviendo a TARGET_FPS");
+    applyRate(TARGET_FPS, baseQuality);
+  }
+}
+
 void sendFrameUDP(camera_fb_t *fb) {
   frameCount++;
   
@@ -225,7 +300,7 @@ void sendFrameUDP(camera_fb_t *fb) {
   const size_t maxDataPerPacket = MAX_UDP_PACKET - headerSize;
   uint16_t totalPackets = (fb->len + maxDataPerPacket - 1) / maxDataPerPacket;
   
-  // Enviar todos los paquetes
+  // Enviar todos los paquetes (+ un XOR por grupo si hay paridad)
   for(uint16_t i = 0; i < totalPackets; i++) {
     PacketHeader header;
     header.frameId = frameCount;
@@ -244,6 +319,25 @@ void sendFrameUDP(camera_fb_t *fb) {
     udp.write(fb->buf + dataOffset, dataSize);
     udp.endPacket();
     
+#if PARITY_GROUP_SIZE > 0
+    // XOR acumulado del grupo (el último paquete, más corto, cuenta con ceros)
+    if(i % PARITY_GROUP_SIZE == 0) {
+      memset(parityBuffer, 0, maxDataPerPacket);
+    }
+    for(size_t b = 0; b < dataSize; b++) {
+      parityBuffer[b] ^= fb->buf[dataOffset + b];
+    }
+    uint16_t group = i / PARITY_GROUP_SIZE;
+    if((i % PARITY_GROUP_SIZE == PARITY_GROUP_SIZE - 1 || i == totalPackets - 1) &&
+       group < PARITY_MAX_GROUPS) {
+      header.packetNum = PARITY_FLAG | (PARITY_GROUP_SIZE << 8) | group;
+      udp.beginPacket(serverIP, serverPort);
+      udp.write((uint8_t*)&header, headerSize);
+      udp.write(parityBuffer, maxDataPerPacket);
+      udp.endPacket();
+    }
+#endif
+    
     // Micro-delay solo si hay muchos paquetes
     if(totalPackets > 15 && i < totalPackets - 1) {
       delayMicroseconds(50);
@@ -266,6 +360,7 @@ void loop() {
   
   unsigned long frameStartTime = currentTime;
   lastFrameTime = currentTime;
+  pollControl();  // Una vez por frame: el nuevo intervalo rige desde el siguiente
 
   // Capturar frame
   camera_fb_t * fb = esp_camera_fb_get();
@@ -297,7 +392,8 @@ void loop() {
     lastStatsTime = currentTime;
     Serial.printf("┌─────────────────────────────────────────┐\n");
     Serial.printf("│ Frame: #%-6lu  Size: %-6u bytes  │\n", frameCount, fb->len);
-    Serial.printf("│ FPS Real: %-5.1f   Target: %-2d FPS     │\n", actualFPS, TARGET_FPS);
+    Serial.printf("│ FPS Real: %-5.1f   Target: %-2d FPS     │\n", actualFPS, currentFPS);
+    Serial.printf("│ Calidad JPEG: %-2d %-22s│\n", currentQuality, controlled ? "(servidor)" : "");
     Serial.printf("│ Tiempo envío: %-5.1f ms                │\n", sendTime / 1000.0);
     Serial.printf("│ Tiempo total: %-5.1f ms                │\n", (float)totalTime);
     Serial.printf("│ RSSI: %-4d dBm                        │\n", WiFi.RSSI());
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Feed multiplexado de todas las cámaras (/feed)
+- Un solo WebSocket para un consumidor (ej. el detector) con todas las cámaras
+- Cada mensaje binario = FEED_HEADER + JPEG (tamaño 0 = heartbeat sin cambios)
+- Filtro por cámaras (?nodes=CAM_01,CAM_02) y modo latest-only (?mode=latest)
+  que conserva solo el último frame por cámara si el consumidor va lento
+"""
+
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+# nodeId (12 bytes, como PacketHeader) + frameId + timestamp de reensamblado + tamaño del JPEG
+FEED_HEADER = struct.Struct('<12sIdI')
+FEED_QUEUE_SIZE = 64  # Mensajes pendientes en modo 'all' (después se descarta el más viejo)
+FEED_MODES = ('latest', 'all')
+
+
+def pack_feed_header(node_id, frame_id, timestamp, size):
+    return FEED_HEADER.pack(node_id.encode()[:12], frame_id & 0xFFFFFFFF, timestamp, size)
+
+
+def parse_feed_message(message):
+    """Mensaje del feed → (node_id, frame_id, timestamp, memoryview del JPEG)"""
+    node_key, frame_id, timestamp, size = FEED_HEADER.unpack_from(message)
+    node_id = node_key.rstrip(b'\x00').decode('utf-8', errors='ignore')
+    start = FEED_HEADER.size
+    return node_id, frame_id, timestamp, memoryview(message)[start:start + size]
+
+
+def parse_feed_query(nodes, mode):
+    """?nodes=A,B&mode=latest|all → (set de cámaras o None, latest_only)"""
+    node_filter = {n for n in (nodes or '').split(',') if n} or None
+    return node_filter, (mode or 'latest') != 'all'
+
+
+class FeedSubscriber:
+    """
+    Buzón de un consumidor del feed. En latest-only hay un lugar por cámara
+    (un frame nuevo reemplaza al pendiente sin perder su turno, así ninguna
+    cámara se queda sin salir); en 'all' es una cola acotada.
+    """
+
+    def __init__(self, remote_addr, nodes=None, latest_only=True, maxlen=FEED_QUEUE_SIZE):
+        self.remote_addr = remote_addr
+        self.nodes = nodes
+        self.latest_only = latest_only
+        self.latest = OrderedDict()
+        self.queue = deque(maxlen=maxlen)
+        self.cond = threading.Condition(threading.Lock())
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        # Por cámara: el control de tasa solo frena a la que se atrasa
+        self.dropped_by_node = defaultdict(int)
+
+    def wants(self, node_id):
+        return self.nodes is None or node_id in self.nodes
+
+    def pending(self):
+        return len(self.latest) + len(self.queue)
+
+    def _store(self, node_id, message):
+        if self.latest_only:
+            pending = self.latest.get(node_id)
+            if pending is not None and len(pending) > FEED_HEADER.size:
+                self._drop(node_id)
+            self.latest[node_id] = message
+        else:
+            if len(self.queue) == self.queue.maxlen:
+                self._drop(self.queue[0][0])  # Se descarta el más viejo (de cualquier cámara)
+            self.queue.append((node_id, message))
+
+    def _drop(self, node_id):
+        self.dropped += 1
+        self.dropped_by_node[node_id] += 1
+
+    def _store_heartbeat(self, node_id, message):
+        """Un heartbeat nunca desplaza un frame pendiente"""
+        if self.latest_only:
+            if node_id not in self.latest:
+                self.latest[node_id] = message
+        elif len(self.queue) < self.queue.maxlen:
+            self.queue.append((node_id, message))
+
+    def _take(self):
+        if self.latest:
+            return self.latest.popitem(last=False)[1]
+        return self.queue.popleft()[1] if self.queue else None
+
+    def put(self, node_id, message):
+        with self.cond:
+            self._store(node_id, message)
+            self.cond.notify()
+
+    def put_heartbeat(self, node_id, message):
+        with self.cond:
+            self._store_heartbeat(node_id, message)
+            self.cond.notify()
+
+    def get(self, timeout):
+        """Siguiente mensaje; None si no llegó ninguno en `timeout`"""
+        with self.cond:
+            if not self.pending():
+                self.cond.wait(timeout)
+            return self._take()
+
+    def stats(self):
+        return {
+            'addr': self.remote_addr,
+            'nodes': sorted(self.nodes) if self.nodes is not None else 'all',
+            'mode': 'latest' if self.latest_only else 'all',
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'dropped_by_node': dict(self.dropped_by_node),
+            'queued': self.pending(),
+            'connected_s': time.time() - self.connected_at
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Generador de carga sintética ESP32-CAM
+- Fragmenta frames igual que sendFrameUDP() en esp.cpp (PacketHeader)
+- N nodos, cada uno con su socket (puerto de origen propio, como un ESP real)
+- FPS, tamaño de frame, tamaño de paquete, pérdida y reordenamiento configurables
+- Paridad XOR opcional por grupo de paquetes (como esp.cpp con PARITY_GROUP_SIZE)
+- Varios procesos emisores para superar lo que envía un solo core
+
+Uso: python3 loadgen.py --nodes 8 --fps 30 --duration 10 [--loss 0.01] [--reorder 0.02]
+"""
+
+import argparse
+import multiprocessing as mp
+import random
+import socket
+import time
+
+from udp_ingest import (HEADER, HEADER_SIZE, PARITY_MAX_GROUPS, parity_packet_num,
+                        xor_parity)
+
+MAX_UDP_PACKET = 1400  # Igual que esp.cpp (header incluido)
+SOCKET_SEND_BUFFER = 1024 * 1024
+REORDER_DISTANCE = 3  # Un paquete reordenado sale hasta N paquetes más tarde
+
+
+class SyntheticCamera:
+    """Un ESP32 simulado: frame_id propio y un JPEG de relleno del tamaño pedido"""
+
+    def __init__(self, node_id, frame_size, packet_size, size_jitter, rng, parity_group=0):
+        self.node_id = node_id
+        self.parity_group = parity_group
+        self.node_key = node_id.encode()[:12]
+        self.frame_id = rng.randrange(1, 1 << 16)
+        self.frame_size = frame_size
+        self.payload_size = packet_size - HEADER_SIZE
+        self.size_jitter = size_jitter
+        self.rng = rng
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+        # Relleno que arranca con SOI (el contenido no importa al servidor)
+        body = bytes(rng.getrandbits(8) for _ in range(256)) * (frame_size * 2 // 256 + 1)
+        self.template = b'\xff\xd8' + body[:frame_size * 2]
+
+    def next_frame(self):
+        """Lista de datagramas del siguiente frame"""
+        self.frame_id = (self.frame_id + 1) & 0xFFFFFFFF
+        size = self.frame_size
+        if self.size_jitter:
+            size = max(64, int(size * (1 + self.rng.uniform(-self.size_jitter, self.size_jitter))))
+        frame = memoryview(self.template)[:size]
+        payload_size = self.payload_size
+        total_packets = (size + payload_size - 1) // payload_size
+        packets = []
+        group = self.parity_group
+        for i in range(total_packets):
+            packets.append(HEADER.pack(self.frame_id, i, total_packets, size, self.node_key)
+                           + frame[i * payload_size:(i + 1) * payload_size])
+            # Paridad al cerrar cada grupo (también el último, aunque sea más corto)
+            if group and (i % group == group - 1 or i == total_packets - 1) and i // group < PARITY_MAX_GROUPS:
+                first = i - i % group
+                parity = xor_parity([frame[j * payload_size:(j + 1) * payload_size]
+                                     for j in range(first, i + 1)], payload_size)
+                packets.append(HEADER.pack(self.frame_id, parity_packet_num(i // group, group),
+                                           total_packets, size, self.node_key) + parity)
+        return packets
+
+
+def apply_network(packets, loss, reorder, rng):
+    """Simula pérdida y reordenamiento sobre los datagramas de un frame"""
+    if loss:
+        packets = [p for p in packets if rng.random() >= loss]
+    if reorder and len(packets) > 1:
+        for i in range(len(packets) - 1):
+            if rng.random() < reorder:
+                j = min(len(packets) - 1, i + rng.randint(1, REORDER_DISTANCE))
+                packets[i], packets[j] = packets[j], packets[i]
+    return packets
+
+
+def run_load(target, node_ids, fps, frame_size, packet_size=MAX_UDP_PACKET, loss=0.0,
+             reorder=0.0, duration=10.0, size_jitter=0.1, seed=None, parity_group=0):
+    """
+    Envía frames de `node_ids` a `target` durante `duration` segundos con
+    cadencia fija. Retorna contadores de lo enviado (incluye el retraso del
+    emisor, para saber si el generador mismo fue el cuello de botella).
+    """
+    rng = random.Random(seed)
+    cameras = [SyntheticCamera(node_id, frame_size, packet_size, size_jitter, rng, parity_group)
+               for node_id in node_ids]
+    interval = 1.0 / fps
+    frames = packets = lost = total_bytes = late_ticks = 0
+
+    start = time.monotonic()
+    tick = 0
+    while True:
+        tick_start = start + tick * interval
+        if tick_start - start >= duration:
+            break
+        now = time.monotonic()
+        if now < tick_start:
+            time.sleep(tick_start - now)
+        elif now - tick_start > interval:
+            late_ticks += 1
+
+        # Orden distinto en cada tick: los ESP no están sincronizados
+        rng.shuffle(cameras)
+        for camera in cameras:
+            datagrams = camera.next_frame()
+            sent = apply_network(datagrams, loss, reorder, rng)
+            lost += len(datagrams) - len(sent)
+            for datagram in sent:
+                try:
+                    camera.socket.sendto(datagram, target)
+                except OSError:
+                    lost += 1
+                    continue
+                packets += 1
+                total_bytes += len(datagram)
+            frames += 1
+        tick += 1
+
+    elapsed = time.monotonic() - start
+    for camera in cameras:
+        camera.socket.close()
+    return {
+        'frames_sent': frames,
+        'packets_sent': packets,
+        'packets_lost': lost,
+        'bytes_sent': total_bytes,
+        'late_ticks': late_ticks,
+        'elapsed': elapsed
+    }
+
+
+def _load_process(args, out_queue):
+    out_queue.put(run_load(*args))
+
+
+def run_load_parallel(target, nodes, fps, frame_size, packet_size=MAX_UDP_PACKET, loss=0.0,
+                      reorder=0.0, duration=10.0, processes=1, node_prefix='SIM', seed=None,
+                      parity_group=0):
+    """Reparte los nodos entre `processes` emisores y suma sus contadores"""
+    node_ids = [f"{node_prefix}_{n:03d}" for n in range(nodes)]
+    processes = max(1, min(processes, nodes))
+    if processes == 1:
+        return run_load(target, node_ids, fps, frame_size, packet_size, loss, reorder,
+                        duration, seed=seed, parity_group=parity_group)
+
+    out_queue = mp.Queue()
+    workers = []
+    for p in range(processes):
+        worker_seed = None if seed is None else seed + p
+        args = (target, node_ids[p::processes], fps, frame_size, packet_size, loss, reorder,
+                duration, 0.1, worker_seed, parity_group)
+        worker = mp.Process(target=_load_process, args=(args, out_queue), daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    results = [out_queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    total = {key: sum(r[key] for r in results) for key in results[0]}
+    total['elapsed'] = max(r['elapsed'] for r in results)
+    return total
+
+
+def add_load_arguments(parser):
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--frame-size', type=int, default=12000)
+    parser.add_argument('--packet-size', type=int, default=MAX_UDP_PACKET)
+    parser.add_argument('--loss', type=float, default=0.0, help='Probabilidad de perder cada paquete')
+    parser.add_argument('--reorder', type=float, default=0.0, help='Probabilidad de reordenar cada paquete')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--processes', type=int, default=1, help='Procesos emisores')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--parity', type=int, default=0, help='Paquetes por grupo de paridad XOR (0 = sin paridad)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"📡 {args.nodes} nodos → {args.host}:{args.port} a {args.fps:.0f} FPS, "
+          f"{args.frame_size} bytes/frame, pérdida {args.loss:.1%}, reorden {args.reorder:.1%}")
+    result = run_load_parallel((args.host, args.port), args.nodes, args.fps, args.frame_size,
+                               args.packet_size, args.loss, args.reorder, args.duration,
+                               args.processes, seed=args.seed, parity_group=args.parity)
+    print(f"✓ {result['frames_sent']} frames, {result['packets_sent']} paquetes "
+          f"({result['packets_lost']} perdidos) en {result['elapsed']:.1f}s "
+          f"→ {result['frames_sent'] / result['elapsed']:.0f} frames/s, "
+          f"{result['bytes_sent'] * 8 / result['elapsed'] / 1e6:.1f} Mbps")
+    if result['late_ticks']:
+        print(f"⚠ El emisor se atrasó en {result['late_ticks']} ticks: usar más --processes")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Control de tasa servidor → cámara (canal de retorno UDP)
+- Mensaje CONTROL al IP:puerto de origen de cada ESP32: FPS y calidad JPEG objetivo
+- Sin consumidores (viewers, MJPEG ni /feed): FPS y calidad de reposo
+- Consumidores atrasados (descartan frames): baja multiplicativa de FPS;
+  sin descartes vuelve a subir de a poco (AIMD)
+- Demanda nueva: FPS máximo de inmediato
+- El objetivo se reenvía cada tanto (UDP puede perderlo, el ESP puede reiniciarse);
+  el firmware vuelve a sus valores propios si deja de recibir control
+"""
+
+import struct
+import time
+from collections import deque
+
+# magic + seq + fps + calidad (escala del sensor: menor = mejor) + nodeId
+CONTROL = struct.Struct('<4sIBB12s')
+CONTROL_MAGIC = b'PSRC'
+
+IDLE = 'idle'
+BEHIND = 'behind'
+RECOVERING = 'recovering'
+FULL = 'full'
+
+# Valores por defecto (el firmware además limita el FPS a su TARGET_FPS)
+RATE_DEFAULTS = {
+    'max_fps': 30,
+    'min_fps': 2,
+    'idle_fps': 5,            # Sin consumidores: el DVR sigue grabando a este ritmo
+    'quality': 12,            # Igual que JPEG_QUALITY en esp.cpp
+    'behind_quality': 16,
+    'idle_quality': 20,
+    'decrease': 0.7,          # Factor de baja con consumidores atrasados
+    'increase': 2,            # FPS sumados por intervalo sin descartes
+    'drop_threshold': 0.1,    # Fracción de frames descartados por los consumidores
+    'resend_interval': 2.0,   # Segundos entre reenvíos del mismo objetivo
+}
+DECISION_HISTORY = 8
+
+
+def pack_control(node_id, seq, fps, quality):
+    return CONTROL.pack(CONTROL_MAGIC, seq & 0xFFFFFFFF, fps, quality, node_id.encode()[:12])
+
+
+def parse_control(message):
+    """Mensaje de control → (node_id, seq, fps, calidad), o None si no lo es"""
+    if len(message) != CONTROL.size:
+        return None
+    magic, seq, fps, quality, node_key = CONTROL.unpack(message)
+    if magic != CONTROL_MAGIC:
+        return None
+    return node_key.rstrip(b'\x00').decode('utf-8', errors='ignore'), seq, fps, quality
+
+
+class NodeRate:
+    """Objetivo vigente de una cámara y lo visto en la última evaluación"""
+
+    __slots__ = ('node_id', 'mode', 'fps', 'quality', 'seq', 'source', 'last_sent',
+                 'last_frames', 'last_dropped', 'messages', 'decisions')
+
+    def __init__(self, node_id, fps, quality):
+        self.node_id = node_id
+        self.mode = FULL
+        self.fps = fps
+        self.quality = quality
+        self.seq = 0
+        self.source = None
+        self.last_sent = 0.0
+        self.last_frames = None
+        self.last_dropped = 0
+        self.messages = 0
+        self.decisions = deque(maxlen=DECISION_HISTORY)
+
+
+class RateController:
+    """
+    Decide el objetivo de cada cámara a partir de su demanda. `evaluate`
+    se llama periódicamente desde un solo thread (o el event loop); `send`
+    es el sendto del socket de ingesta, así el mensaje sale del mismo
+    puerto al que envía el ESP y atraviesa su NAT.
+    """
+
+    def __init__(self, send=None, **settings):
+        self.send = send
+        for key, value in RATE_DEFAULTS.items():
+            setattr(self, key, settings.get(key, value))
+        self.nodes = {}
+        self.send_errors = 0
+
+    def _decide(self, node, consumers, dropped, frames):
+        """(modo, fps, calidad, motivo) según la demanda desde la evaluación anterior"""
+        if consumers == 0:
+            return IDLE, self.idle_fps, self.idle_quality, 'sin consumidores'
+
+        new_frames = frames - node.last_frames if node.last_frames is not None else 0
+        # Un consumidor que se va resta sus descartes: nunca negativo
+        new_drops = max(0, dropped - node.last_dropped)
+        delivered = new_frames * consumers
+        drop_ratio = new_drops / delivered if delivered else 0.0
+
+        if drop_ratio > self.drop_threshold:
+            fps = max(self.min_fps, int(node.fps * self.decrease))
+            return BEHIND, fps, self.behind_quality, f"consumidores atrasados ({drop_ratio:.0%} descartado)"
+        if node.mode == IDLE:
+            return FULL, self.max_fps, self.quality, 'demanda nueva'
+        if node.fps < self.max_fps:
+            fps = min(self.max_fps, node.fps + self.increase)
+            mode = FULL if fps == self.max_fps else RECOVERING
+            return mode, fps, self.quality, 'sin descartes'
+        return FULL, self.max_fps, self.quality, None
+
+    def evaluate(self, node_id, source, consumers, dropped, frames, now=None):
+        """
+        Actualiza el objetivo de una cámara y envía el mensaje de control si
+        cambió o toca reenviarlo. `dropped` y `frames` son acumulados (los
+        descartes de sus consumidores y los frames publicados).
+        """
+        if now is None:
+            now = time.time()
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = NodeRate(node_id, self.max_fps, self.quality)
+
+        mode, fps, quality, reason = self._decide(node, consumers, dropped, frames)
+        node.last_frames = frames
+        node.last_dropped = dropped
+        changed = (fps, quality) != (node.fps, node.quality)
+        if changed or mode != node.mode:
+            node.decisions.append({'time': now, 'mode': mode, 'fps': fps,
+                                   'quality': quality, 'reason': reason})
+        node.mode, node.fps, node.quality = mode, fps, quality
+
+        if source is None or self.send is None:
+            return
+        if source != node.source:
+            node.source = source
+            changed = True  # ESP nuevo o reiniciado (otro puerto de origen)
+        if changed or now - node.last_sent >= self.resend_interval:
+            node.seq += 1
+            try:
+                self.send(pack_control(node_id, node.seq, fps, quality), source)
+            except OSError:
+                self.send_errors += 1
+                return
+            node.last_sent = now
+            node.messages += 1
+
+    def stats(self):
+        now = time.time()
+        return {
+            'send_errors': self.send_errors,
+            'nodes': {
+                node.node_id: {
+                    'mode': node.mode,
+                    'target_fps': node.fps,
+                    'target_quality': node.quality,
+                    'source': f"{node.source[0]}:{node.source[1]}" if node.source else None,
+                    'messages': node.messages,
+                    'last_sent_s': now - node.last_sent if node.last_sent else None,
+                    'decisions': list(node.decisions)
+                }
+                for node in list(self.nodes.values())
+            }
+        }
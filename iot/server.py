@@ -1,20 +1,35 @@
 #!/usr/bin/env python3
 """
 Servidor UDP ultra-optimizado para ESP32-CAM
-- Recepción UDP multithreaded
+- Recepción UDP multithreaded o multi-proceso (SO_REUSEPORT)
 - WebSocket con compresión opcional
+- Fan-out no bloqueante: un buzón acotado por viewer
+- Niveles de resolución por viewer (thumb/medium/full), codificados una vez
+- DVR por cámara (RAM + segmentos mmap) con búsqueda y replay
+- Snapshot HTTP con ETag/304 y stream MJPEG para consumidores sin WebSocket
+- /metrics estilo Prometheus (contadores e histogramas incrementales)
+- Feed multiplexado /feed: todas las cámaras en un WebSocket (header binario + JPEG)
+- Compuerta de cambios opcional: escenas quietas → heartbeats en lugar de frames
+- Control de tasa opcional: FPS/calidad objetivo enviados a cada ESP32 según la demanda
 - Zero-copy donde sea posible
 - Buffer optimizado
 """
 
-import socket
+import os
+import queue
 import threading
 import time
-import struct
 from collections import defaultdict, deque
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response, render_template_string, request
 from flask_sock import Sock
-import select
+from change_gate import DROP, FORWARD, HEARTBEAT, ChangeGate
+from dvr import DVRRecorder, replay_schedule
+from feed import FeedSubscriber, pack_feed_header, parse_feed_query
+from metrics import Histogram, MetricsText, merge_histograms, read_udp_socket_stats
+from rate_control import RateController
+from tiers import TieredFrame, frame_for_tier, parse_tier, tier_stats
+from udp_ingest import (FRAME_TIMEOUT, BatchReceiver, FrameAssembler, IngestWorkerPool,
+                        SourceTracker, merge_node_stats, open_udp_socket)
 
 app = Flask(__name__)
 sock = Sock(app)
@@ -25,29 +40,132 @@ sock = Sock(app)
 UDP_IP = "0.0.0.0"
 UDP_PORT = 5001  # UDP en puerto diferente
 WEB_PORT = 5000  # Web en puerto 5000 (como antes)
-MAX_PACKET_SIZE = 2048
 SOCKET_BUFFER_SIZE = 2 * 1024 * 1024  # 2MB buffer (reducido para estabilidad)
 NUM_RECEIVER_THREADS = 1  # Solo 1 thread para evitar problemas
+# Procesos receptores con SO_REUSEPORT (0 = modo thread). El kernel reparte
+# por IP/puerto de origen, así cada cámara siempre cae en el mismo proceso.
+NUM_RECEIVER_PROCESSES = 0
+VIEWER_QUEUE_SIZE = 1  # Frames pendientes por viewer (1 = siempre el más reciente)
+PUBLISH_QUEUE_SIZE = 64  # Frames completos esperando al thread de publicación
+
+# DVR: últimos segundos en RAM + ventana larga en disco (segmentos mmap)
+DVR_RAM_SECONDS = 10
+DVR_RAM_MAX_MB = 64  # Por cámara
+DVR_DISK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dvr_data')
+DVR_DISK_SECONDS = 0  # 0 = solo RAM; grabar a disco es opt-in (ej. 3600)
+DVR_DISK_MAX_MB = 2048  # Por cámara
+DVR_SEGMENT_MB = 64
+DVR_MAX_REPLAY_SPEED = 16.0
+DVR_MAX_REPLAY_SECONDS = 600  # Rango máximo de un replay (se recorta el inicio)
+
+# Compuerta de cambios: frames casi iguales al último reenviado no se
+# reparten (ni se graban); los viewers reciben un heartbeat vacío.
+CHANGE_GATE_ENABLED = False
+CHANGE_GATE_NODES = {}  # Umbrales por cámara, ej. {'CAM_01': {'min_changed_ratio': 0.01}}
+HEARTBEAT_MESSAGE = b''  # Mensaje binario vacío: "cámara viva, sin cambios"
+
+# Control de tasa: mensajes UDP al puerto de origen de cada ESP32 (firmware
+# con control) bajando FPS/calidad sin consumidores o con consumidores atrasados.
+RATE_CONTROL_ENABLED = False
+RATE_CONTROL_INTERVAL = 1.0  # Segundos entre evaluaciones de demanda
+RATE_CONTROL_SETTINGS = {}  # Pisa RATE_DEFAULTS, ej. {'idle_fps': 2, 'max_fps': 20}
+
+MJPEG_BOUNDARY = 'frame'
+# Distingue ETags entre reinicios (frame_count vuelve a 0)
+BOOT_ID = f"{int(time.time() * 1000):x}"
 
 # ===========================
 # ALMACENAMIENTO
 # ===========================
-camera_frames = defaultdict(lambda: {
-    'frame': None,
-    'last_update': 0,
-    'frame_count': 0,
-    'total_bytes': 0,
-    'fps': 0,
-    'last_fps_time': time.time(),
-    'fps_buffer': deque(maxlen=30)
-})
-
-# Buffers para frames fragmentados
-frame_buffers = defaultdict(lambda: defaultdict(dict))
-frame_lock = threading.Lock()
-
-# WebSocket queues optimizadas
+FPS_WINDOW = 30  # Frames promediados para el FPS suavizado
+
+class CameraState:
+    """
+    Estado de una cámara. El último frame se publica como una tupla
+    (jpeg, frame_count) que se reemplaza entera: leerla es atómico, así
+    snapshots, stats y viewers nuevos no toman ningún lock. El lock propio
+    solo serializa escritores (varios threads o el pool de procesos).
+    """
+    
+    __slots__ = ('node_id', 'lock', 'latest', 'last_update', 'last_fps_time', 'frame_count',
+                 'total_bytes', 'fps', 'fps_buffer', 'fps_sum', 'source')
+    
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.lock = threading.Lock()
+        self.latest = None
+        self.last_update = 0
+        self.last_fps_time = time.time()
+        self.frame_count = 0
+        self.total_bytes = 0
+        self.fps = 0
+        self.fps_buffer = deque(maxlen=FPS_WINDOW)
+        self.fps_sum = 0.0
+        self.source = None  # (ip, puerto) del ESP32, destino del control de tasa
+    
+    def update(self, frame_data, current_time, forward=True):
+        """Registra un frame recibido; si `forward`, pasa a ser el último publicado"""
+        with self.lock:
+            # FPS suavizado con buffer (suma corrida: O(1) por frame)
+            time_delta = current_time - self.last_fps_time
+            if time_delta > 0:
+                instant_fps = 1.0 / time_delta
+                if len(self.fps_buffer) == self.fps_buffer.maxlen:
+                    self.fps_sum -= self.fps_buffer[0]
+                self.fps_buffer.append(instant_fps)
+                self.fps_sum += instant_fps
+                self.fps = self.fps_sum / len(self.fps_buffer)
+            
+            self.last_update = current_time
+            self.last_fps_time = current_time
+            # Suprimido por la compuerta: la cámara está viva pero el frame no cambia
+            if forward:
+                self.frame_count += 1
+                self.total_bytes += len(frame_data)
+                self.latest = (frame_data, self.frame_count)
+
+cameras = {}  # node_id -> CameraState (solo se agregan, nunca se borran)
+cameras_lock = threading.Lock()  # Solo para crear cámaras nuevas
+
+def get_camera(node_id):
+    camera = cameras.get(node_id)
+    if camera is None:
+        with cameras_lock:
+            camera = cameras.get(node_id)
+            if camera is None:
+                camera = cameras[node_id] = CameraState(node_id)
+    return camera
+
+# WebSocket: un ViewerOutbox por cliente, agrupados por cámara
 websocket_clients = defaultdict(list)
+clients_lock = threading.Lock()
+
+# Consumidores del feed multiplexado (/feed)
+feed_subscribers = []
+
+# Compuertas de cambio por cámara (solo las usa el thread que publica)
+change_gates = {}
+
+# Pool de procesos receptores (solo en modo multi-proceso)
+ingest_pool = None
+
+# Publicación fuera de los receptores (modo thread y asyncio)
+frame_publisher = None
+
+# Ensambladores de los threads receptores (para métricas de pérdida)
+assemblers = []
+
+# Tiempo de fan-out por frame (encolar en todos los viewers): un histograma
+# por thread que publica (Histogram es de un solo escritor), se suman al scrape
+fanout_hists = []
+_fanout_local = threading.local()
+
+# Control de tasa (el sendto lo asigna la ingesta que arranque)
+rate_controller = RateController(**RATE_CONTROL_SETTINGS) if RATE_CONTROL_ENABLED else None
+
+# Grabación por cámara (la ingesta solo agrega; el disco lo escribe otro
+# thread). La crea el arranque del servidor (create_dvr), no el import
+dvr = None
 
 # ===========================
 # HTML OPTIMIZADO
@@ -240,6 +358,9 @@ HTML_TEMPLATE = """
 
     <script>
         const cameras = {{ camera_ids | tojson }};
+        // Con muchas cámaras el canvas es chico: pedir un nivel reducido (?tier= lo fuerza)
+        const tier = new URLSearchParams(window.location.search).get('tier') ||
+                     (cameras.length > 4 ? 'medium' : 'full');
         const wsConnections = {};
         const canvasContexts = {};
         
@@ -250,7 +371,7 @@ HTML_TEMPLATE = """
             canvasContexts[camId] = ctx;
             
             // Conectar WebSocket
-            const ws = new WebSocket(`ws://${window.location.hostname}:${window.location.port}/ws/${camId}`);
+            const ws = new WebSocket(`ws://${window.location.hostname}:${window.location.port}/ws/${camId}?tier=${tier}`);
             ws.binaryType = 'arraybuffer';
             
             let frameCount = 0;
@@ -259,6 +380,7 @@ HTML_TEMPLATE = """
             ws.onopen = () => console.log(`✓ WebSocket ${camId} conectado`);
             
             ws.onmessage = (event) => {
+                if (event.data.byteLength === 0) return;  // Heartbeat: escena sin cambios
                 const blob = new Blob([event.data], {type: 'image/jpeg'});
                 const url = URL.createObjectURL(blob);
                 const img = new Image();
@@ -286,7 +408,7 @@ HTML_TEMPLATE = """
                 console.log(`⚠ WebSocket ${camId} cerrado, intentando reconectar...`);
                 // Reconectar sin recargar página
                 setTimeout(() => {
-                    const newWs = new WebSocket(`ws://${window.location.hostname}:${window.location.port}/ws/${camId}`);
+                    const newWs = new WebSocket(`ws://${window.location.hostname}:${window.location.port}/ws/${camId}?tier=${tier}`);
                     newWs.binaryType = 'arraybuffer';
                     newWs.onopen = () => console.log(`✓ WebSocket ${camId} reconectado`);
                     newWs.onmessage = ws.onmessage;
@@ -339,85 +461,209 @@ HTML_TEMPLATE = """
 </html>
 """
 
+class ViewerOutbox:
+    """
+    Buzón acotado de un viewer WebSocket. La ingesta solo encola (nunca
+    bloquea en la red); si el viewer va lento, el frame más viejo se
+    descarta y gana el más reciente. El thread del WebSocket lo vacía.
+    """
+
+    def __init__(self, node_id, remote_addr, tier='full', maxlen=VIEWER_QUEUE_SIZE):
+        self.node_id = node_id
+        self.remote_addr = remote_addr
+        self.tier = tier
+        self.frames = deque(maxlen=maxlen)
+        self.cond = threading.Condition(threading.Lock())
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+    
+    def put(self, frame_data):
+        with self.cond:
+            if len(self.frames) == self.frames.maxlen and self.frames[0]:
+                self.dropped += 1
+            self.frames.append(frame_data)
+            self.cond.notify()
+    
+    def put_heartbeat(self):
+        """Heartbeat de escena quieta: nunca reemplaza un frame pendiente"""
+        with self.cond:
+            if not self.frames:
+                self.frames.append(HEARTBEAT_MESSAGE)
+                self.cond.notify()
+    
+    def get(self, timeout):
+        """Espera el siguiente frame; None si no llegó ninguno en `timeout`"""
+        with self.cond:
+            if not self.frames:
+                self.cond.wait(timeout)
+            return self.frames.popleft() if self.frames else None
+    
+    def stats(self):
+        return {
+            'addr': self.remote_addr,
+            'tier': self.tier,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'queued': len(self.frames),
+            'connected_s': time.time() - self.connected_at
+        }
+
+def create_dvr():
+    return DVRRecorder(ram_seconds=DVR_RAM_SECONDS,
+                       ram_bytes=DVR_RAM_MAX_MB * 1024 * 1024,
+                       disk_dir=DVR_DISK_DIR if DVR_DISK_SECONDS > 0 else None,
+                       disk_seconds=DVR_DISK_SECONDS,
+                       disk_bytes=DVR_DISK_MAX_MB * 1024 * 1024,
+                       segment_size=DVR_SEGMENT_MB * 1024 * 1024)
+
+def dvr_camera(node_id):
+    """Grabación de una cámara; None si no hay DVR o no grabó nada"""
+    return dvr.camera(node_id) if dvr is not None else None
+
+def gate_for(node_id):
+    gate = change_gates.get(node_id)
+    if gate is None:
+        gate = change_gates[node_id] = ChangeGate(node_id, **CHANGE_GATE_NODES.get(node_id, {}))
+    return gate
+
+def thread_fanout_hist():
+    """Histograma de fan-out del thread actual (publicador, consumidor del pool)"""
+    hist = getattr(_fanout_local, 'hist', None)
+    if hist is None:
+        hist = _fanout_local.hist = Histogram()
+        fanout_hists.append(hist)
+    return hist
+
+def publish_frame(node_id, frame_data, current_time, frame_id=0, source=None):
+    """Actualiza el último frame de la cámara y lo encola para sus viewers y el feed"""
+    decision = gate_for(node_id).check(frame_data, current_time) if CHANGE_GATE_ENABLED else FORWARD
+    
+    camera = get_camera(node_id)
+    camera.update(frame_data, current_time, decision == FORWARD)
+    if source is not None:
+        camera.source = source
+    
+    if decision == DROP:
+        return
+    if decision == HEARTBEAT:
+        publish_heartbeat(node_id, frame_id, current_time)
+        return
+    
+    if dvr is not None:
+        dvr.record(node_id, frame_data, current_time)
+    
+    # Fan-out sin el lock de la cámara: solo encolar, el envío lo hace cada viewer.
+    # Los niveles reducidos comparten un TieredFrame que se codifica al enviarlo.
+    fanout_start = time.perf_counter()
+    with clients_lock:
+        outboxes = list(websocket_clients.get(node_id, ()))
+        feeds = list(feed_subscribers)
+    tiered = None
+    for outbox in outboxes:
+        if outbox.tier == 'full':
+            outbox.put(frame_data)
+        else:
+            if tiered is None:
+                tiered = TieredFrame(frame_data)
+            outbox.put(tiered)
+    
+    # Feed: el mensaje (header + JPEG) se arma una sola vez para todos
+    message = None
+    for feed in feeds:
+        if feed.wants(node_id):
+            if message is None:
+                message = pack_feed_header(node_id, frame_id, current_time, len(frame_data)) + frame_data
+            feed.put(node_id, message)
+    thread_fanout_hist().observe(time.perf_counter() - fanout_start)
+
+def publish_heartbeat(node_id, frame_id, current_time):
+    """Escena sin cambios: aviso vacío a viewers y feed (sin pisar frames pendientes)"""
+    with clients_lock:
+        outboxes = list(websocket_clients.get(node_id, ()))
+        feeds = list(feed_subscribers)
+    for outbox in outboxes:
+        outbox.put_heartbeat()
+    message = None
+    for feed in feeds:
+        if feed.wants(node_id):
+            if message is None:
+                message = pack_feed_header(node_id, frame_id, current_time, 0)
+            feed.put_heartbeat(node_id, message)
+
+class FramePublisher:
+    """
+    Thread que publica los frames completos fuera de la recepción:
+    publish_frame decodifica el JPEG (compuerta de cambios) y escribe al
+    DVR. Un solo thread mantiene el orden por cámara; los buzones de los
+    viewers son thread-safe (en asyncio vuelven al loop con call_soon_threadsafe).
+    """
+
+    def __init__(self, maxsize=PUBLISH_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.published = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, node_id, frame_view, timestamp, frame_id, source):
+        """Sin bloquear al receptor: con la cola llena se pierde el frame"""
+        try:
+            self.queue.put_nowait((node_id, frame_view, timestamp, frame_id, source))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            node_id, frame_view, timestamp, frame_id, source = item
+            try:
+                # El buffer del frame es suyo (el ensamblador no lo reutiliza): copiar acá
+                publish_frame(node_id, frame_view.tobytes(), timestamp, frame_id, source)
+                self.published += 1
+            except Exception as e:
+                print(f"✗ Error publicando frame de {node_id}: {e}")
+
+    def stats(self):
+        return {'published': self.published, 'dropped': self.dropped,
+                'queued': self.queue.qsize()}
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join(timeout=1.0)
+
 def udp_receiver_thread(thread_id):
     """Thread optimizado para recibir paquetes UDP"""
     # Crear socket individual por thread
-    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
-    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)  # Crítico para múltiples threads
-    udp_socket.bind((UDP_IP, UDP_PORT))
+    udp_socket = open_udp_socket(UDP_IP, UDP_PORT, SOCKET_BUFFER_SIZE)
+    receiver = BatchReceiver(udp_socket)
+    assembler = FrameAssembler()
+    assemblers.append(assembler)
+    sources = SourceTracker(assembler)
+    # El control sale por un socket de ingesta: mismo puerto al que envía el ESP (NAT)
+    if rate_controller is not None and rate_controller.send is None:
+        rate_controller.send = udp_socket.sendto
     
     print(f"✓ Thread {thread_id}: UDP Listener en {UDP_IP}:{UDP_PORT}")
     
-    header_size = struct.calcsize('IHHI12s')
-    
     while True:
         try:
-            data, addr = udp_socket.recvfrom(MAX_PACKET_SIZE)
-            
-            if len(data) < header_size:
-                continue
-            
-            # Parsear header (optimizado con struct)
-            frame_id, packet_num, total_packets, frame_size, node_id_bytes = \
-                struct.unpack('IHHI12s', data[:header_size])
-            
-            node_id = node_id_bytes.decode('utf-8', errors='ignore').rstrip('\x00')
-            packet_data = data[header_size:]
-            
-            # Log de debug cada 100 paquetes
-            if frame_id % 100 == 0 and packet_num == 0:
-                print(f"[Thread {thread_id}] Recibido frame {frame_id} de {node_id} ({total_packets} paquetes)")
-            
-            # Almacenar paquete
-            frame_buffers[node_id][frame_id][packet_num] = packet_data
-            
-            # Verificar frame completo
-            if len(frame_buffers[node_id][frame_id]) == total_packets:
-                # Reensamblar (zero-copy cuando sea posible)
-                sorted_packets = sorted(frame_buffers[node_id][frame_id].items())
-                frame_data = b''.join([pkt for _, pkt in sorted_packets])
-                
-                current_time = time.time()
-                
-                # Actualizar datos de cámara
-                with frame_lock:
-                    cam_data = camera_frames[node_id]
-                    
-                    # FPS suavizado con buffer
-                    time_delta = current_time - cam_data['last_fps_time']
-                    if time_delta > 0:
-                        instant_fps = 1.0 / time_delta
-                        cam_data['fps_buffer'].append(instant_fps)
-                        cam_data['fps'] = sum(cam_data['fps_buffer']) / len(cam_data['fps_buffer'])
-                    
-                    cam_data['frame'] = frame_data
-                    cam_data['last_update'] = current_time
-                    cam_data['last_fps_time'] = current_time
-                    cam_data['frame_count'] += 1
-                    cam_data['total_bytes'] += len(frame_data)
-                    
-                    # Broadcast a WebSocket clients
-                    if node_id in websocket_clients:
-                        dead_clients = []
-                        for ws in websocket_clients[node_id]:
-                            try:
-                                ws.send(frame_data)
-                            except:
-                                dead_clients.append(ws)
-                        
-                        # Limpiar clientes muertos
-                        for ws in dead_clients:
-                            websocket_clients[node_id].remove(ws)
+            # Varios datagramas por syscall en buffers preasignados
+            batch = receiver.receive(timeout=FRAME_TIMEOUT)
+            # También con lote vacío: expira frames incompletos vencidos
+            completed = assembler.add_batch(batch)
+            if completed:
+                sources.update(receiver, batch, completed, time.time())
+            for node_id, frame_id, frame_view in completed:
+                # Log de debug cada 100 frames
+                if frame_id % 100 == 0:
+                    print(f"[Thread {thread_id}] Recibido frame {frame_id} de {node_id} ({len(frame_view)} bytes)")
                 
-                # Limpiar buffer
-                del frame_buffers[node_id][frame_id]
-                
-                # Limitar tamaño de buffer (mantener solo últimos 3 frames)
-                if len(frame_buffers[node_id]) > 3:
-                    oldest = min(frame_buffers[node_id].keys())
-                    del frame_buffers[node_id][oldest]
+                # Compuerta, DVR y fan-out en el thread de publicación
+                frame_publisher.submit(node_id, frame_view, time.time(), frame_id,
+                                       sources.get(node_id))
                 
         except Exception as e:
             print(f"✗ Error Thread {thread_id}: {e}")
@@ -425,64 +671,356 @@ def udp_receiver_thread(thread_id):
             traceback.print_exc()
             time.sleep(0.1)
 
+def rate_control_tick(now):
+    """Evalúa la demanda de cada cámara: viewers, MJPEG y feeds que la piden, y sus descartes"""
+    for camera in list(cameras.values()):
+        with clients_lock:
+            outboxes = list(websocket_clients.get(camera.node_id, ()))
+            feeds = [feed for feed in feed_subscribers if feed.wants(camera.node_id)]
+        # Un feed mezcla cámaras: solo cuentan sus descartes de esta
+        dropped = (sum(outbox.dropped for outbox in outboxes)
+                   + sum(feed.dropped_by_node.get(camera.node_id, 0) for feed in feeds))
+        rate_controller.evaluate(camera.node_id, camera.source, len(outboxes) + len(feeds),
+                                 dropped, camera.frame_count, now)
+
+def rate_control_thread():
+    while True:
+        time.sleep(RATE_CONTROL_INTERVAL)
+        try:
+            rate_control_tick(time.time())
+        except Exception as e:
+            print(f"✗ Error control de tasa: {e}")
+
+def latest_frame(node_id):
+    """(jpeg, frame_count) del último frame, o None; lectura atómica sin lock"""
+    camera = cameras.get(node_id)
+    return camera.latest if camera is not None else None
+
+def snapshot_etag(frame_count):
+    return f'"{BOOT_ID}-{frame_count}"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match (lista de tags, con W/ o *) contiene exactamente este ETag"""
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+def mjpeg_part_header(frame_data):
+    return (f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+            f"Content-Length: {len(frame_data)}\r\n\r\n").encode()
+
+def send_latest(outbox):
+    """Viewer nuevo: arranca con el último frame (con la compuerta puede tardar en llegar otro)"""
+    latest = latest_frame(outbox.node_id)
+    if latest is not None:
+        outbox.put(latest[0] if outbox.tier == 'full' else TieredFrame(latest[0]))
+
+def list_camera_ids():
+    """IDs para la grilla HTML"""
+    return list(cameras) or ['Esperando cámaras...']
+
 @app.route('/')
 def index():
-    with frame_lock:
-        camera_ids = list(camera_frames.keys()) if camera_frames else ['Esperando cámaras...']
-    return render_template_string(HTML_TEMPLATE, camera_ids=camera_ids)
+    return render_template_string(HTML_TEMPLATE, camera_ids=list_camera_ids())
 
 @sock.route('/ws/<node_id>')
 def websocket_stream(ws, node_id):
-    """WebSocket optimizado para streaming"""
-    if node_id not in websocket_clients:
-        websocket_clients[node_id] = []
+    """WebSocket optimizado para streaming (?tier=thumb|medium|full)"""
+    outbox = ViewerOutbox(node_id, request.remote_addr, parse_tier(request.args.get('tier')))
+    with clients_lock:
+        websocket_clients[node_id].append(outbox)
+    send_latest(outbox)
+    
+    try:
+        # Este thread es el emisor del viewer: vacía su buzón
+        while ws.connected:
+            frame = outbox.get(timeout=1.0)
+            if frame is not None:
+                ws.send(frame_for_tier(frame, outbox.tier))
+                outbox.sent += 1
+            # Descartar keepalives del cliente sin bloquear
+            while ws.receive(timeout=0) is not None:
+                pass
+    except Exception as e:
+        pass
+    finally:
+        with clients_lock:
+            if outbox in websocket_clients[node_id]:
+                websocket_clients[node_id].remove(outbox)
+
+@app.route('/snapshot/<node_id>')
+def snapshot(node_id):
+    """Último JPEG de la cámara; 304 si el cliente ya tiene ese frame"""
+    latest = latest_frame(node_id)
+    if latest is None:
+        return {'error': 'cámara sin frames'}, 404
+    frame_data, frame_count = latest
+    etag = snapshot_etag(frame_count)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    # werkzeug parsea la lista de tags (comparación débil, como pide If-None-Match)
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    # bytes inmutable: se envía el mismo objeto que guarda la cámara
+    return Response(frame_data, mimetype='image/jpeg', headers=headers)
+
+@app.route('/mjpeg/<node_id>')
+def mjpeg_stream(node_id):
+    """multipart/x-mixed-replace: un buzón latest-wins como un viewer WebSocket"""
+    outbox = ViewerOutbox(node_id, request.remote_addr)
+    with clients_lock:
+        websocket_clients[node_id].append(outbox)
     
-    websocket_clients[node_id].append(ws)
+    def generate():
+        try:
+            send_latest(outbox)
+            while True:
+                frame_data = outbox.get(timeout=1.0)
+                if not frame_data:
+                    continue  # Sin frame o heartbeat (MJPEG no tiene dónde ponerlo)
+                # Cabecera y frame por separado: sin concatenar (sin copiar) el JPEG
+                yield mjpeg_part_header(frame_data)
+                yield frame_data
+                yield b"\r\n"
+                outbox.sent += 1
+        finally:
+            with clients_lock:
+                if outbox in websocket_clients[node_id]:
+                    websocket_clients[node_id].remove(outbox)
     
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}',
+                    headers={'Cache-Control': 'no-cache'})
+
+def parse_replay_args(args):
+    """from/to/speed de la query; por defecto los últimos 10 s a 1x, a lo sumo DVR_MAX_REPLAY_SECONDS"""
+    now = time.time()
+    t_to = float(args.get('to', now))
+    t_from = max(float(args.get('from', t_to - 10)), t_to - DVR_MAX_REPLAY_SECONDS)
+    speed = min(max(float(args.get('speed', 1.0)), 1.0), DVR_MAX_REPLAY_SPEED)
+    return t_from, t_to, speed
+
+@app.route('/dvr/<node_id>')
+def dvr_info(node_id):
+    """Rango grabado de una cámara (RAM y disco)"""
+    camera = dvr_camera(node_id)
+    if camera is None:
+        return {'error': 'cámara sin grabación'}, 404
+    return camera.info()
+
+@app.route('/dvr/<node_id>/frame')
+def dvr_frame(node_id):
+    """JPEG vigente en ?t=<unix ts> (el último frame con ts <= t)"""
+    camera = dvr_camera(node_id)
     try:
-        # Mantener conexión abierta
-        while True:
-            # Recibir keepalive del cliente
-            data = ws.receive(timeout=30)
-            if data is None:
+        timestamp = float(request.args.get('t', time.time()))
+    except ValueError:
+        return {'error': 't inválido'}, 400
+    found = camera.at(timestamp) if camera is not None else None
+    if found is None:
+        return {'error': 'sin frame para ese instante'}, 404
+    frame_ts, frame_data = found
+    return Response(frame_data, mimetype='image/jpeg',
+                    headers={'X-Frame-Timestamp': f"{frame_ts:.3f}", 'Cache-Control': 'no-store'})
+
+@sock.route('/ws/replay/<node_id>')
+def websocket_replay(ws, node_id):
+    """Replay de ?from=&to= con la cadencia original (?speed=1..16)"""
+    camera = dvr_camera(node_id)
+    try:
+        t_from, t_to, speed = parse_replay_args(request.args)
+    except ValueError:
+        ws.close(reason=1003, message='parámetros inválidos')
+        return
+    if camera is None:
+        return
+    
+    # Se lee de a un frame; close() suelta los segmentos si el cliente se va antes
+    frames = camera.between(t_from, t_to)
+    try:
+        for delay, frame_ts, frame_data in replay_schedule(frames, speed):
+            if delay > 0:
+                time.sleep(delay)
+            if not ws.connected:
                 break
+            ws.send(frame_data)
+    finally:
+        frames.close()
+
+@sock.route('/feed')
+def websocket_feed(ws):
+    """Todas las cámaras en un WebSocket (?nodes=CAM_01,CAM_02&mode=latest|all)"""
+    nodes, latest_only = parse_feed_query(request.args.get('nodes'), request.args.get('mode'))
+    feed = FeedSubscriber(request.remote_addr, nodes, latest_only)
+    with clients_lock:
+        feed_subscribers.append(feed)
+    
+    try:
+        while ws.connected:
+            message = feed.get(timeout=1.0)
+            if message is not None:
+                ws.send(message)
+                feed.sent += 1
+            while ws.receive(timeout=0) is not None:
+                pass
     except Exception as e:
         pass
     finally:
-        if ws in websocket_clients[node_id]:
-            websocket_clients[node_id].remove(ws)
+        with clients_lock:
+            if feed in feed_subscribers:
+                feed_subscribers.remove(feed)
+
+def build_stats():
+    """Estadísticas del sistema (compartidas por el modo Flask y el asyncio)"""
+    # Lectura sin locks: cada campo es un valor suelto, la ingesta no espera
+    current_time = time.time()
+    camera_list = list(cameras.values())
+    active_cameras = sum(1 for cam in camera_list if current_time - cam.last_update < 3)
+    total_frames = sum(cam.frame_count for cam in camera_list)
+    total_mb = sum(cam.total_bytes for cam in camera_list) / 1024 / 1024
+    avg_fps = sum(cam.fps for cam in camera_list) / len(camera_list) if camera_list else 0
+    
+    result = {
+        'total_cameras': len(camera_list),
+        'active_cameras': active_cameras,
+        'total_frames': total_frames,
+        'total_mb': total_mb,
+        'avg_fps': avg_fps,
+        'cameras': {
+            cam.node_id: {
+                'frames': cam.frame_count,
+                'fps': cam.fps,
+                'last_seen': (current_time - cam.last_update) * 1000
+            }
+            for cam in camera_list
+        }
+    }
+    
+    # Viewers por cámara con sus descartes
+    with clients_lock:
+        result['viewers'] = {
+            cam_id: [outbox.stats() for outbox in outboxes]
+            for cam_id, outboxes in websocket_clients.items() if outboxes
+        }
+        result['feeds'] = [feed.stats() for feed in feed_subscribers]
+    result['tiers'] = tier_stats()
+    if CHANGE_GATE_ENABLED:
+        result['change_gate'] = {node_id: gate.stats() for node_id, gate in list(change_gates.items())}
+    if rate_controller is not None:
+        result['rate_control'] = rate_controller.stats()
+    
+    # Reensamblado y pérdida por nodo; carga por worker
+    if ingest_pool is not None:
+        result['ingest'] = ingest_pool.stats()
+        result['reassembly'] = result['ingest'].pop('reassembly')
+    else:
+        result['reassembly'] = merge_node_stats(a.node_stats() for a in assemblers)
+    
+    if frame_publisher is not None:
+        result['publisher'] = frame_publisher.stats()
+    
+    if dvr is not None:
+        result['dvr'] = dvr.stats()
+    
+    return result
 
 @app.route('/stats')
 def stats():
     """Estadísticas del sistema"""
-    with frame_lock:
-        current_time = time.time()
-        active_cameras = sum(1 for cam in camera_frames.values() 
-                           if current_time - cam['last_update'] < 3)
-        total_frames = sum(cam['frame_count'] for cam in camera_frames.values())
-        total_mb = sum(cam['total_bytes'] for cam in camera_frames.values()) / 1024 / 1024
-        avg_fps = sum(cam['fps'] for cam in camera_frames.values()) / len(camera_frames) if camera_frames else 0
-        
-        return {
-            'total_cameras': len(camera_frames),
-            'active_cameras': active_cameras,
-            'total_frames': total_frames,
-            'total_mb': total_mb,
-            'avg_fps': avg_fps,
-            'cameras': {
-                cam_id: {
-                    'frames': cam['frame_count'],
-                    'fps': cam['fps'],
-                    'last_seen': (current_time - cam['last_update']) * 1000
-                }
-                for cam_id, cam in camera_frames.items()
-            }
-        }
+    return build_stats()
+
+def build_metrics():
+    """
+    Exposición Prometheus. Todo se lee sin locks: list() sobre los dicts es
+    atómico bajo el GIL y los contadores ya vienen acumulados por la ingesta.
+    """
+    out = MetricsText()
+    
+    if ingest_pool is not None:
+        reassembly = ingest_pool.stats()['reassembly']
+        completion_counts, completion_sum = ingest_pool.completion_histogram()
+        malformed = ingest_pool.malformed_packets()
+    else:
+        reassembly = merge_node_stats(a.node_stats() for a in list(assemblers))
+        completion_counts, completion_sum = merge_histograms(
+            a.completion_hist.snapshot() for a in list(assemblers))
+        malformed = sum(a.malformed for a in list(assemblers))
+    
+    per_node = (
+        ('polysense_udp_datagrams_total', 'Datagramas UDP recibidos', 'packets'),
+        ('polysense_udp_payload_bytes_total', 'Bytes de payload UDP recibidos', 'bytes'),
+        ('polysense_udp_duplicate_datagrams_total', 'Datagramas duplicados', 'duplicates'),
+        ('polysense_udp_late_datagrams_total', 'Datagramas de frames ya descartados', 'late_packets'),
+        ('polysense_udp_parity_datagrams_total', 'Datagramas de paridad XOR recibidos', 'parity_packets'),
+        ('polysense_udp_recovered_datagrams_total', 'Datagramas reconstruidos con paridad', 'recovered_packets'),
+        ('polysense_frames_completed_total', 'Frames reensamblados', 'frames_completed'),
+        ('polysense_frames_dropped_total', 'Frames incompletos descartados', 'frames_dropped'),
+    )
+    for name, help_text, key in per_node:
+        out.family(name, 'counter', help_text)
+        for node_id, counters in reassembly.items():
+            out.sample(name, counters[key], {'node': node_id})
+    
+    out.family('polysense_udp_malformed_datagrams_total', 'counter', 'Datagramas con header inválido')
+    out.sample('polysense_udp_malformed_datagrams_total', malformed)
+    
+    out.histogram('polysense_frame_reassembly_seconds',
+                  'Primer paquete hasta frame completo', completion_counts, completion_sum)
+    fanout_counts, fanout_sum = merge_histograms(h.snapshot() for h in list(fanout_hists))
+    out.histogram('polysense_frame_fanout_seconds',
+                  'Encolado de un frame en todos sus viewers', fanout_counts, fanout_sum)
+    
+    gates = list(change_gates.items())
+    out.family('polysense_gate_suppressed_frames_total', 'counter', 'Frames suprimidos por la compuerta de cambios')
+    for node_id, gate in gates:
+        out.sample('polysense_gate_suppressed_frames_total', gate.suppressed, {'node': node_id})
+    
+    out.family('polysense_camera_frames_published_total', 'counter', 'Frames publicados por cámara')
+    for cam in list(cameras.values()):
+        out.sample('polysense_camera_frames_published_total', cam.frame_count, {'node': cam.node_id})
+    
+    viewers = [(cam_id, outbox) for cam_id, outboxes in list(websocket_clients.items())
+               for outbox in list(outboxes)]
+    out.family('polysense_viewer_queue_depth', 'gauge', 'Frames pendientes en el buzón del viewer')
+    for cam_id, outbox in viewers:
+        out.sample('polysense_viewer_queue_depth', len(outbox.frames),
+                   {'node': cam_id, 'addr': outbox.remote_addr, 'tier': outbox.tier})
+    out.family('polysense_viewer_dropped_frames_total', 'counter', 'Frames reemplazados antes de enviarse')
+    for cam_id, outbox in viewers:
+        out.sample('polysense_viewer_dropped_frames_total', outbox.dropped,
+                   {'node': cam_id, 'addr': outbox.remote_addr, 'tier': outbox.tier})
+    
+    feeds = list(feed_subscribers)
+    out.family('polysense_feed_queue_depth', 'gauge', 'Mensajes pendientes por consumidor del feed')
+    for feed in feeds:
+        out.sample('polysense_feed_queue_depth', feed.pending(), {'addr': feed.remote_addr})
+    out.family('polysense_feed_dropped_frames_total', 'counter', 'Frames del feed descartados por consumidor lento')
+    for feed in feeds:
+        out.sample('polysense_feed_dropped_frames_total', feed.dropped, {'addr': feed.remote_addr})
+    
+    socket_stats = read_udp_socket_stats(UDP_PORT)
+    if socket_stats is not None:
+        rx_queue, drops = socket_stats
+        out.family('polysense_udp_kernel_drops_total', 'counter',
+                   'Datagramas descartados por el kernel (buffer de recepción lleno)')
+        out.sample('polysense_udp_kernel_drops_total', drops)
+        out.family('polysense_udp_rx_queue_bytes', 'gauge', 'Bytes en espera en los sockets UDP')
+        out.sample('polysense_udp_rx_queue_bytes', rx_queue)
+    
+    return out.render()
+
+@app.route('/metrics')
+def metrics():
+    """Métricas para Prometheus"""
+    return Response(build_metrics(), mimetype='text/plain; version=0.0.4')
+
+def build_health():
+    return {'status': 'healthy', 'timestamp': time.time(), 'cameras': len(cameras)}
 
 @app.route('/health')
 def health():
     """Health check"""
-    return {'status': 'healthy', 'timestamp': time.time(), 'cameras': len(camera_frames)}
+    return build_health()
 
 if __name__ == '__main__':
     print("\n" + "="*70)
@@ -491,17 +1029,38 @@ if __name__ == '__main__':
     print(f"UDP Recepción: {UDP_IP}:{UDP_PORT} (buffer: {SOCKET_BUFFER_SIZE/1024/1024:.0f}MB)")
     print(f"Web Interface: http://144.22.56.85:{WEB_PORT}/")
     print(f"WebSocket: ws://144.22.56.85:{WEB_PORT}/ws/<cam_id>")
-    print(f"Threads: {NUM_RECEIVER_THREADS} receptores UDP")
+    print(f"Feed: ws://144.22.56.85:{WEB_PORT}/feed?nodes=<cam_id,...>&mode=latest|all")
+    print(f"HTTP: http://144.22.56.85:{WEB_PORT}/snapshot/<cam_id>, /mjpeg/<cam_id>")
+    disk = f"{DVR_DISK_SECONDS}s en disco" if DVR_DISK_SECONDS > 0 else "sin disco"
+    print(f"DVR: {DVR_RAM_SECONDS}s en RAM, {disk} → /dvr/<cam_id>/frame?t=, /ws/replay/<cam_id>")
+    if rate_controller is not None:
+        print(f"Control de tasa: cada {RATE_CONTROL_INTERVAL:.0f}s al puerto de origen de cada ESP32")
+    if NUM_RECEIVER_PROCESSES > 0:
+        print(f"Procesos: {NUM_RECEIVER_PROCESSES} receptores UDP (SO_REUSEPORT)")
+    else:
+        print(f"Threads: {NUM_RECEIVER_THREADS} receptores UDP")
     print("="*70)
     print("\n📦 Dependencias: pip3 install flask flask-sock simple-websocket")
     print("🔥 Firewall UDP: sudo iptables -I INPUT 6 -p udp --dport 5001 -j ACCEPT")
     print("🔥 Firewall TCP: sudo iptables -I INPUT 6 -p tcp --dport 5000 -j ACCEPT")
     print(f"\n✅ Acceso Web: http://144.22.56.85:{WEB_PORT}/\n")
     
-    # Iniciar threads UDP receptores
-    for i in range(NUM_RECEIVER_THREADS):
-        thread = threading.Thread(target=udp_receiver_thread, args=(i,), daemon=True)
-        thread.start()
+    dvr = create_dvr()
+    
+    # Iniciar receptores UDP
+    if NUM_RECEIVER_PROCESSES > 0:
+        ingest_pool = IngestWorkerPool(NUM_RECEIVER_PROCESSES, UDP_IP, UDP_PORT,
+                                       SOCKET_BUFFER_SIZE, publish_frame)
+        ingest_pool.start()
+        if rate_controller is not None:
+            rate_controller.send = ingest_pool.send_control
+    else:
+        frame_publisher = FramePublisher()
+        for i in range(NUM_RECEIVER_THREADS):
+            thread = threading.Thread(target=udp_receiver_thread, args=(i,), daemon=True)
+            thread.start()
+    if rate_controller is not None:
+        threading.Thread(target=rate_control_thread, daemon=True).start()
     
     # Iniciar servidor Flask
     app.run(host='0.0.0.0', port=WEB_PORT, threaded=True, debug=False)
\ No newline at end of file
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Servidor asyncio para ESP32-CAM (alternativa al modo Flask threaded)
+- Ingesta UDP con DatagramProtocol en el event loop; los frames completos se
+  publican en un thread aparte (compuerta de cambios y DVR bloquean)
+- Fan-out WebSocket en el mismo loop: sin un thread por viewer
+- Mismas rutas que server.py: /, /stats, /metrics, /health, /ws/<node_id>, /feed,
+  snapshot/MJPEG, DVR
+- Estado, reensamblado y estadísticas compartidos con server.py
+"""
+
+import asyncio
+import threading
+import time
+
+from aiohttp import WSMsgType, web
+from jinja2 import Template
+
+import server
+from dvr import replay_schedule
+from feed import FeedSubscriber, parse_feed_query
+from server import (HEARTBEAT_MESSAGE, HTML_TEMPLATE, MJPEG_BOUNDARY, NUM_RECEIVER_PROCESSES,
+                    RATE_CONTROL_INTERVAL, SOCKET_BUFFER_SIZE, UDP_IP, UDP_PORT, WEB_PORT,
+                    FramePublisher, ViewerOutbox, build_health, build_metrics, build_stats,
+                    clients_lock, dvr_camera, etag_matches, feed_subscribers, latest_frame,
+                    list_camera_ids, mjpeg_part_header, parse_replay_args, publish_frame, rate_control_tick,
+                    rate_controller, send_latest, snapshot_etag, websocket_clients)
+from tiers import TieredFrame, parse_tier
+from udp_ingest import FRAME_TIMEOUT, FrameAssembler, IngestWorkerPool, open_udp_socket
+
+INDEX_TEMPLATE = Template(HTML_TEMPLATE)
+WS_HEARTBEAT = 30.0  # Ping del servidor (reemplaza el receive(timeout=30) de flask-sock)
+
+
+class AsyncViewerOutbox(ViewerOutbox):
+    """
+    Buzón latest-wins de un viewer para el event loop. put() puede llamarse
+    desde el loop (ingesta DatagramProtocol) o desde otro thread (workers
+    multi-proceso): en ese caso se agenda con call_soon_threadsafe.
+    """
+
+    def __init__(self, node_id, remote_addr, tier, loop):
+        super().__init__(node_id, remote_addr, tier)
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.event = asyncio.Event()
+        self.closed = False
+
+    def put(self, frame_data):
+        if threading.get_ident() == self.loop_thread:
+            self._put(frame_data)
+        else:
+            self.loop.call_soon_threadsafe(self._put, frame_data)
+
+    def _put(self, frame_data):
+        if len(self.frames) == self.frames.maxlen and self.frames[0]:
+            self.dropped += 1
+        self.frames.append(frame_data)
+        self.event.set()
+
+    def put_heartbeat(self):
+        if threading.get_ident() == self.loop_thread:
+            self._put_heartbeat()
+        else:
+            self.loop.call_soon_threadsafe(self._put_heartbeat)
+
+    def _put_heartbeat(self):
+        if not self.frames:
+            self.frames.append(HEARTBEAT_MESSAGE)
+            self.event.set()
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+    async def get(self):
+        """Espera el siguiente frame; None si el viewer se desconectó"""
+        while not self.frames and not self.closed:
+            self.event.clear()
+            await self.event.wait()
+        return self.frames.popleft() if self.frames else None
+
+
+class AsyncFeedSubscriber(FeedSubscriber):
+    """Consumidor del feed para el event loop (mismo esquema que AsyncViewerOutbox)"""
+
+    def __init__(self, remote_addr, nodes, latest_only, loop):
+        super().__init__(remote_addr, nodes, latest_only)
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.event = asyncio.Event()
+        self.closed = False
+
+    def put(self, node_id, message):
+        if threading.get_ident() == self.loop_thread:
+            self._put(node_id, message)
+        else:
+            self.loop.call_soon_threadsafe(self._put, node_id, message)
+
+    def _put(self, node_id, message):
+        self._store(node_id, message)
+        self.event.set()
+
+    def put_heartbeat(self, node_id, message):
+        if threading.get_ident() == self.loop_thread:
+            self._put_heartbeat(node_id, message)
+        else:
+            self.loop.call_soon_threadsafe(self._put_heartbeat, node_id, message)
+
+    def _put_heartbeat(self, node_id, message):
+        self._store_heartbeat(node_id, message)
+        self.event.set()
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+    async def get(self):
+        """Espera el siguiente mensaje; None si el consumidor se desconectó"""
+        while not self.pending() and not self.closed:
+            self.event.clear()
+            await self.event.wait()
+        return self._take()
+
+
+class UDPIngestProtocol(asyncio.DatagramProtocol):
+    """Reensambla datagramas del ESP32 en el loop; publica en el thread de FramePublisher"""
+
+    def __init__(self):
+        self.assembler = FrameAssembler()
+        server.assemblers.append(self.assembler)
+
+    def datagram_received(self, data, addr):
+        try:
+            completed = self.assembler.add_packet(data)
+        except Exception as e:
+            print(f"✗ Error UDP asyncio: {e}")
+            return
+        for node_id, frame_id, frame_view in completed:
+            server.frame_publisher.submit(node_id, frame_view, time.time(), frame_id, addr)
+
+    def error_received(self, exc):
+        print(f"✗ Error UDP asyncio: {exc}")
+
+
+async def expire_frames(assembler):
+    """Sin tráfico no llegan datagramas: expirar frames incompletos igual"""
+    while True:
+        await asyncio.sleep(FRAME_TIMEOUT)
+        # La paridad puede completar a último momento un frame que vencía
+        for node_id, frame_id, frame_view in assembler.expire():
+            server.frame_publisher.submit(node_id, frame_view, time.time(), frame_id, None)
+
+
+async def rate_control_loop():
+    """Control de tasa en el loop: transport.sendto no es thread-safe"""
+    while True:
+        await asyncio.sleep(RATE_CONTROL_INTERVAL)
+        try:
+            rate_control_tick(time.time())
+        except Exception as e:
+            print(f"✗ Error control de tasa: {e}")
+
+
+# ===========================
+# RUTAS
+# ===========================
+
+async def index(request):
+    html = INDEX_TEMPLATE.render(camera_ids=list_camera_ids())
+    return web.Response(text=html, content_type='text/html')
+
+
+async def stats(request):
+    return web.json_response(build_stats())
+
+
+async def metrics(request):
+    return web.Response(text=build_metrics(), content_type='text/plain')
+
+
+async def health(request):
+    return web.json_response(build_health())
+
+
+async def discard_incoming(ws, outbox):
+    """Lee (y descarta) los mensajes del cliente; al cerrar despierta al emisor"""
+    try:
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                break
+    finally:
+        outbox.close()
+
+
+async def websocket_stream(request):
+    """WebSocket por cámara: una corrutina por viewer en lugar de un thread"""
+    node_id = request.match_info['node_id']
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+    await ws.prepare(request)
+
+    outbox = AsyncViewerOutbox(node_id, request.remote, parse_tier(request.query.get('tier')),
+                               asyncio.get_running_loop())
+    with clients_lock:
+        websocket_clients[node_id].append(outbox)
+    send_latest(outbox)
+    reader = asyncio.create_task(discard_incoming(ws, outbox))
+
+    try:
+        while True:
+            frame = await outbox.get()
+            if frame is None or ws.closed:
+                break
+            if isinstance(frame, TieredFrame):
+                # Transcodificar bloquea: fuera del loop (una vez por nivel y frame)
+                frame = await asyncio.to_thread(frame.get, outbox.tier)
+            await ws.send_bytes(frame)
+            outbox.sent += 1
+    except (ConnectionResetError, RuntimeError):
+        pass
+    finally:
+        with clients_lock:
+            if outbox in websocket_clients[node_id]:
+                websocket_clients[node_id].remove(outbox)
+        reader.cancel()
+
+    return ws
+
+
+async def snapshot(request):
+    latest = latest_frame(request.match_info['node_id'])
+    if latest is None:
+        return web.json_response({'error': 'cámara sin frames'}, status=404)
+    frame_data, frame_count = latest
+    etag = snapshot_etag(frame_count)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('If-None-Match', ''), etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=frame_data, content_type='image/jpeg', headers=headers)
+
+
+async def mjpeg_stream(request):
+    """multipart/x-mixed-replace servido desde un buzón latest-wins"""
+    node_id = request.match_info['node_id']
+    response = web.StreamResponse(headers={
+        'Content-Type': f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}',
+        'Cache-Control': 'no-cache'
+    })
+    await response.prepare(request)
+
+    outbox = AsyncViewerOutbox(node_id, request.remote, 'full', asyncio.get_running_loop())
+    with clients_lock:
+        websocket_clients[node_id].append(outbox)
+    send_latest(outbox)
+
+    try:
+        while True:
+            frame_data = await outbox.get()
+            if frame_data is None:
+                break
+            if not frame_data:
+                continue  # Heartbeat: MJPEG no tiene dónde ponerlo
+            await response.write(mjpeg_part_header(frame_data))
+            await response.write(frame_data)
+            await response.write(b"\r\n")
+            outbox.sent += 1
+    except (ConnectionResetError, RuntimeError):
+        pass
+    finally:
+        with clients_lock:
+            if outbox in websocket_clients[node_id]:
+                websocket_clients[node_id].remove(outbox)
+    return response
+
+
+async def dvr_info(request):
+    camera = dvr_camera(request.match_info['node_id'])
+    if camera is None:
+        return web.json_response({'error': 'cámara sin grabación'}, status=404)
+    return web.json_response(camera.info())
+
+
+async def dvr_frame(request):
+    camera = dvr_camera(request.match_info['node_id'])
+    try:
+        timestamp = float(request.query.get('t', time.time()))
+    except ValueError:
+        return web.json_response({'error': 't inválido'}, status=400)
+    # Puede leer de disco: fuera del loop
+    found = await asyncio.to_thread(camera.at, timestamp) if camera is not None else None
+    if found is None:
+        return web.json_response({'error': 'sin frame para ese instante'}, status=404)
+    frame_ts, frame_data = found
+    return web.Response(body=frame_data, content_type='image/jpeg',
+                        headers={'X-Frame-Timestamp': f"{frame_ts:.3f}", 'Cache-Control': 'no-store'})
+
+
+async def websocket_replay(request):
+    """Replay de ?from=&to= con la cadencia original (?speed=1..16)"""
+    try:
+        t_from, t_to, speed = parse_replay_args(request.query)
+    except ValueError:
+        return web.json_response({'error': 'parámetros inválidos'}, status=400)
+    camera = dvr_camera(request.match_info['node_id'])
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+    await ws.prepare(request)
+
+    if camera is None:
+        await ws.close()
+        return ws
+
+    # De a un frame y fuera del loop (puede leer de disco); close() suelta los segmentos
+    frames = camera.between(t_from, t_to)
+    schedule = replay_schedule(frames, speed)
+    try:
+        while (item := await asyncio.to_thread(next, schedule, None)) is not None:
+            delay, frame_ts, frame_data = item
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if ws.closed:
+                break
+            await ws.send_bytes(frame_data)
+    except (ConnectionResetError, RuntimeError):
+        pass
+    finally:
+        try:
+            frames.close()
+        except ValueError:
+            pass  # Cancelado con una lectura en curso: lo cierra el recolector
+    await ws.close()
+    return ws
+
+
+async def websocket_feed(request):
+    """Todas las cámaras en un WebSocket (?nodes=CAM_01,CAM_02&mode=latest|all)"""
+    nodes, latest_only = parse_feed_query(request.query.get('nodes'), request.query.get('mode'))
+    ws = web.WebSocketResponse(heartbeat=WS_HEARTBEAT)
+    await ws.prepare(request)
+
+    feed = AsyncFeedSubscriber(request.remote, nodes, latest_only, asyncio.get_running_loop())
+    with clients_lock:
+        feed_subscribers.append(feed)
+    reader = asyncio.create_task(discard_incoming(ws, feed))
+
+    try:
+        while True:
+            message = await feed.get()
+            if message is None or ws.closed:
+                break
+            await ws.send_bytes(message)
+            feed.sent += 1
+    except (ConnectionResetError, RuntimeError):
+        pass
+    finally:
+        with clients_lock:
+            if feed in feed_subscribers:
+                feed_subscribers.remove(feed)
+        reader.cancel()
+
+    return ws
+
+
+async def start_udp_ingest(app):
+    """Arranca la ingesta UDP (y el DVR) junto con el servidor web"""
+    server.dvr = server.create_dvr()
+    if rate_controller is not None:
+        app['rate_control_task'] = asyncio.create_task(rate_control_loop())
+    if NUM_RECEIVER_PROCESSES > 0:
+        server.ingest_pool = IngestWorkerPool(NUM_RECEIVER_PROCESSES, UDP_IP, UDP_PORT,
+                                              SOCKET_BUFFER_SIZE, publish_frame)
+        server.ingest_pool.start()
+        if rate_controller is not None:
+            rate_controller.send = server.ingest_pool.send_control
+        return
+
+    loop = asyncio.get_running_loop()
+    udp_socket = open_udp_socket(UDP_IP, UDP_PORT, SOCKET_BUFFER_SIZE)
+    udp_socket.setblocking(False)
+    server.frame_publisher = FramePublisher()
+    transport, protocol = await loop.create_datagram_endpoint(UDPIngestProtocol, sock=udp_socket)
+    app['udp_transport'] = transport
+    if rate_controller is not None:
+        rate_controller.send = transport.sendto
+    app['expire_task'] = asyncio.create_task(expire_frames(protocol.assembler))
+    print(f"✓ asyncio: UDP Listener en {UDP_IP}:{UDP_PORT}")
+
+
+async def stop_udp_ingest(app):
+    if 'rate_control_task' in app:
+        app['rate_control_task'].cancel()
+    if 'expire_task' in app:
+        app['expire_task'].cancel()
+        app['udp_transport'].close()
+        server.frame_publisher.stop()
+    if server.ingest_pool is not None:
+        server.ingest_pool.stop()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.router.add_get('/ws/{node_id}', websocket_stream)
+    app.router.add_get('/feed', websocket_feed)
+    app.router.add_get('/snapshot/{node_id}', snapshot)
+    app.router.add_get('/mjpeg/{node_id}', mjpeg_stream)
+    app.router.add_get('/dvr/{node_id}', dvr_info)
+    app.router.add_get('/dvr/{node_id}/frame', dvr_frame)
+    app.router.add_get('/ws/replay/{node_id}', websocket_replay)
+    app.on_startup.append(start_udp_ingest)
+    app.on_cleanup.append(stop_udp_ingest)
+    return app
+
+
+if __name__ == '__main__':
+    print("\n" + "="*70)
+    print("⚡ SERVIDOR ASYNCIO ESP32-CAM")
+    print("="*70)
+    print(f"UDP Recepción: {UDP_IP}:{UDP_PORT} (buffer: {SOCKET_BUFFER_SIZE/1024/1024:.0f}MB)")
+    print(f"Web Interface: http://144.22.56.85:{WEB_PORT}/")
+    print(f"WebSocket: ws://144.22.56.85:{WEB_PORT}/ws/<cam_id>")
+    if NUM_RECEIVER_PROCESSES > 0:
+        print(f"Procesos: {NUM_RECEIVER_PROCESSES} receptores UDP (SO_REUSEPORT)")
+    else:
+        print("Ingesta: DatagramProtocol en el event loop")
+    print("="*70)
+    print("\n📦 Dependencias: pip3 install aiohttp flask jinja2")
+    print(f"\n✅ Acceso Web: http://144.22.56.85:{WEB_PORT}/\n")
+
+    web.run_app(create_app(), host='0.0.0.0', port=WEB_PORT, print=None)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Niveles de resolución para los viewers (/ws/<node_id>?tier=thumb|medium|full)
+- El frame se transcodifica como máximo una vez por nivel y se comparte
+- La transcodificación es perezosa: la hace el primer viewer que lo envía,
+  así un nivel sin viewers (o un frame descartado por latest-wins) no cuesta nada
+- Decodificación reducida de libjpeg (1/2, 1/4, 1/8) antes de redimensionar
+- OpenCV es opcional: sin cv2 todos los niveles reciben el JPEG original
+"""
+
+import struct
+import threading
+import time
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+# Ancho máximo y calidad JPEG por nivel ('full' = frame original del ESP32)
+TIER_SIZES = {
+    'thumb': (160, 60),
+    'medium': (320, 75),
+}
+TIERS = ('thumb', 'medium', 'full')
+DEFAULT_TIER = 'full'
+
+# Modos de decodificación reducida de OpenCV por factor
+REDUCED_MODES = {}
+if cv2 is not None:
+    REDUCED_MODES = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+
+# Marcadores SOF (baseline, progresivo, etc.) que traen alto y ancho
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+SOF_SIZE = struct.Struct('>xHH')
+
+# Transcodificaciones por nivel (para /stats)
+encode_stats = {tier: {'encoded': 0, 'encode_ms_total': 0.0} for tier in TIER_SIZES}
+_warned_no_cv2 = False
+
+
+def parse_tier(value):
+    """Nivel pedido por query; los desconocidos caen en el default"""
+    return value if value in TIERS else DEFAULT_TIER
+
+
+def jpeg_size(data):
+    """(ancho, alto) leyendo solo los marcadores del JPEG; None si no se encuentra"""
+    pos = 2
+    end = len(data) - 9
+    while pos < end:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker in SOF_MARKERS:
+            height, width = SOF_SIZE.unpack_from(data, pos + 4)
+            return width, height
+        pos += 2 + ((data[pos + 2] << 8) | data[pos + 3])
+    return None
+
+
+def transcode(frame_data, tier):
+    """Reduce el JPEG al ancho del nivel; devuelve el original si no hace falta o falla"""
+    global _warned_no_cv2
+    if cv2 is None:
+        if not _warned_no_cv2:
+            _warned_no_cv2 = True
+            print("⚠ OpenCV no instalado: todos los niveles reciben el frame completo")
+        return frame_data
+
+    max_width, quality = TIER_SIZES[tier]
+    size = jpeg_size(frame_data)
+    if size is None or size[0] <= max_width:
+        return frame_data
+
+    # Mayor factor de reducción que no quede por debajo del ancho pedido
+    factor = 1
+    while factor < 8 and size[0] // (factor * 2) >= max_width:
+        factor *= 2
+
+    t0 = time.perf_counter()
+    image = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), REDUCED_MODES[factor])
+    if image is None:
+        return frame_data
+    if image.shape[1] > max_width:
+        height = max(1, image.shape[0] * max_width // image.shape[1])
+        image = cv2.resize(image, (max_width, height), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return frame_data
+
+    stats = encode_stats[tier]
+    stats['encoded'] += 1
+    stats['encode_ms_total'] += (time.perf_counter() - t0) * 1000
+    return encoded.tobytes()
+
+
+class TieredFrame:
+    """
+    Un frame publicado más sus versiones por nivel. Se comparte entre todos
+    los viewers que no son 'full'; cada nivel se codifica una sola vez.
+    """
+
+    __slots__ = ('source', 'encoded', 'lock')
+
+    def __init__(self, source):
+        self.source = source
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    def get(self, tier):
+        data = self.encoded.get(tier)
+        if data is not None:
+            return data
+        with self.lock:
+            data = self.encoded.get(tier)
+            if data is None:
+                data = transcode(self.source, tier)
+                self.encoded[tier] = data
+        return data
+
+
+def frame_for_tier(frame, tier):
+    """Bytes a enviar: el buzón guarda bytes (full) o un TieredFrame"""
+    if isinstance(frame, TieredFrame):
+        return frame.get(tier)
+    return frame
+
+
+def tier_stats():
+    return {
+        tier: {
+            'encoded': stats['encoded'],
+            'avg_encode_ms': stats['encode_ms_total'] / stats['encoded'] if stats['encoded'] else 0.0
+        }
+        for tier, stats in encode_stats.items()
+    }
@@ -0,0 +1,904 @@
+#!/usr/bin/env python3
+"""
+Ingesta UDP de ESP32-CAM
+- Protocolo PacketHeader (ver iot/esp.cpp)
+- Recepción por lotes (recvmmsg) en buffers preasignados
+- Reensamblado de frames fragmentados sin copias intermedias, con deadlines
+  y métricas de pérdida por nodo
+- Paquetes de paridad XOR opcionales: recuperan un paquete perdido por grupo
+  al cerrar el frame (empieza uno más nuevo, se desaloja o vence)
+- Workers multi-proceso con SO_REUSEPORT
+- IP:puerto de origen por cámara (destino de los mensajes de control)
+- Publicación de frames al proceso web vía memoria compartida
+"""
+
+import ctypes
+import errno
+import os
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+import multiprocessing as mp
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
+
+from metrics import Histogram, merge_histograms
+
+# ===========================
+# PROTOCOLO
+# ===========================
+# struct PacketHeader { uint32 frameId; uint16 packetNum; uint16 totalPackets;
+#                       uint32 frameSize; char nodeId[12]; }
+HEADER_FORMAT = 'IHHI12s'
+HEADER = struct.Struct(HEADER_FORMAT)
+HEADER_SIZE = HEADER.size
+
+# Paridad XOR (firmware nuevo): packetNum = PARITY_FLAG | (tamaño de grupo << 8) | grupo.
+# Firmware viejo nunca pone el bit alto, así que sus paquetes siguen igual.
+# El payload es el XOR de los payloads del grupo, rellenados con ceros al
+# tamaño de un paquete completo.
+PARITY_FLAG = 0x8000
+PARITY_MAX_GROUPS = 256
+
+MAX_PACKET_SIZE = 2048
+RECV_BATCH_SIZE = 64  # Datagramas por syscall (recvmmsg)
+SOCKADDR_SIZE = 28    # sockaddr_in6 (alcanza para sockaddr_in)
+SOURCE_REFRESH = 5.0  # Segundos antes de volver a buscar el origen de una cámara
+
+# Reensamblado
+FRAME_TIMEOUT = 0.5      # Segundos para completar un frame antes de descartarlo
+REORDER_WINDOW = 30      # Frames hacia atrás tolerados antes de asumir reinicio del ESP
+RECENT_FRAME_IDS = 8     # frame_ids recientes recordados para detectar paquetes tardíos
+
+# Memoria compartida: slots por worker (cada slot = 8 bytes de generación + JPEG)
+SHM_SLOTS = 32
+SHM_SLOT_SIZE = 256 * 1024
+STATS_INTERVAL = 1.0  # Segundos entre reportes de carga de cada worker
+CONTROL_POLL_INTERVAL = 0.1  # Segundos entre revisiones de mensajes de control a enviar
+
+
+def open_udp_socket(ip, port, rcvbuf):
+    """Crea un socket UDP con SO_REUSEPORT (el kernel reparte por origen)"""
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)  # Crítico para múltiples receptores
+    udp_socket.bind((ip, port))
+    return udp_socket
+
+
+def parity_packet_num(group, group_size):
+    return PARITY_FLAG | (group_size << 8) | group
+
+
+def xor_parity(payloads, size):
+    """XOR de `payloads` rellenados a `size` bytes (little endian: el relleno no cambia el int)"""
+    acc = 0
+    for payload in payloads:
+        acc ^= int.from_bytes(payload, 'little')
+    return acc.to_bytes(size, 'little')
+
+
+# ===========================
+# RECEPCIÓN POR LOTES
+# ===========================
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _recvmmsg = _libc.recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                          ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _recvmmsg = None  # Sin recvmmsg (no Linux): recv_into datagrama a datagrama
+
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+
+
+class BatchReceiver:
+    """
+    Recibe hasta `batch_size` datagramas por syscall (recvmmsg) en buffers
+    preasignados. Cada datagrama se dispersa en dos iovecs: el header va a
+    un buffer contiguo de headers (se parsea el lote entero con un solo
+    iter_unpack) y el payload a su slot del buffer de payloads.
+    Las memoryviews entregadas son válidas hasta la siguiente llamada.
+    Las direcciones de origen quedan crudas en su buffer: solo se
+    decodifican cuando se piden (source).
+    """
+
+    def __init__(self, udp_socket, batch_size=RECV_BATCH_SIZE, packet_size=MAX_PACKET_SIZE):
+        self.socket = udp_socket
+        self.fd = udp_socket.fileno()
+        self.batch_size = batch_size
+        self.payload_size = packet_size - HEADER_SIZE
+        self.headers = bytearray(batch_size * HEADER_SIZE)
+        self.payloads = bytearray(batch_size * self.payload_size)
+        self.header_view = memoryview(self.headers)
+        self.payload_view = memoryview(self.payloads)
+        self.names = bytearray(batch_size * SOCKADDR_SIZE)
+        self.malformed = 0
+        self.use_recvmmsg = _recvmmsg is not None
+        self._valid = range(0)
+        self._addresses = []
+
+        if self.use_recvmmsg:
+            c_headers = (ctypes.c_char * len(self.headers)).from_buffer(self.headers)
+            c_payloads = (ctypes.c_char * len(self.payloads)).from_buffer(self.payloads)
+            c_names = (ctypes.c_char * len(self.names)).from_buffer(self.names)
+            self._c_buffers = (c_headers, c_payloads, c_names)
+            self._iovecs = (_IOVec * (2 * batch_size))()
+            self._msgs = (_MMsgHdr * batch_size)()
+            for i in range(batch_size):
+                header_iov = self._iovecs[2 * i]
+                header_iov.iov_base = ctypes.addressof(c_headers) + i * HEADER_SIZE
+                header_iov.iov_len = HEADER_SIZE
+                payload_iov = self._iovecs[2 * i + 1]
+                payload_iov.iov_base = ctypes.addressof(c_payloads) + i * self.payload_size
+                payload_iov.iov_len = self.payload_size
+                self._msgs[i].msg_hdr.msg_iov = ctypes.cast(
+                    ctypes.byref(self._iovecs, 2 * i * ctypes.sizeof(_IOVec)),
+                    ctypes.POINTER(_IOVec))
+                self._msgs[i].msg_hdr.msg_iovlen = 2
+                self._msgs[i].msg_hdr.msg_name = ctypes.addressof(c_names) + i * SOCKADDR_SIZE
+                self._msgs[i].msg_hdr.msg_namelen = SOCKADDR_SIZE
+            # msg_len de todos los mensajes con un solo slice (vista de uint32 con paso)
+            words = memoryview(self._msgs).cast('B').cast('I')
+            stride = ctypes.sizeof(_MMsgHdr) // 4
+            self._msg_lens = words[_MMsgHdr.msg_len.offset // 4::stride]
+        self._payload_starts = [i * self.payload_size for i in range(batch_size)]
+
+    def _recvmmsg(self):
+        count = _recvmmsg(self.fd, self._msgs, self.batch_size, MSG_DONTWAIT, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0, []
+            raise OSError(err, os.strerror(err))
+        return count, self._msg_lens[:count].tolist()
+
+    def _recvmsg_into(self):
+        lengths = []
+        addresses = self._addresses = []
+        header_view = self.header_view
+        payload_view = self.payload_view
+        size = self.payload_size
+        for i in range(self.batch_size):
+            try:
+                n, _, _, address = self.socket.recvmsg_into(
+                    [header_view[i * HEADER_SIZE:(i + 1) * HEADER_SIZE],
+                     payload_view[i * size:(i + 1) * size]], 0, MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            lengths.append(n)
+            addresses.append(address)
+        return len(lengths), lengths
+
+    def _read_batch(self):
+        count, lengths = self._recvmmsg() if self.use_recvmmsg else self._recvmsg_into()
+        if not count:
+            return []
+        if min(lengths) < HEADER_SIZE:
+            # Datagramas truncados (raro): descartarlos antes de parsear
+            valid = [i for i, length in enumerate(lengths) if length >= HEADER_SIZE]
+            self.malformed += count - len(valid)
+        else:
+            valid = range(count)
+        self._valid = valid
+        header_view = self.header_view
+        payload_view = self.payload_view
+        if len(valid) == count:
+            headers = HEADER.iter_unpack(header_view[:count * HEADER_SIZE])
+            payloads = [payload_view[start:start + length - HEADER_SIZE]
+                        for start, length in zip(self._payload_starts, lengths)]
+        else:
+            starts = self._payload_starts
+            headers = [HEADER.unpack_from(header_view, i * HEADER_SIZE) for i in valid]
+            payloads = [payload_view[starts[i]:starts[i] + lengths[i] - HEADER_SIZE] for i in valid]
+        return list(zip(headers, payloads))
+
+    def receive(self, timeout=None):
+        """
+        Retorna una lista de (header, payload): header es la tupla de
+        PacketHeader y payload una memoryview. Espera hasta `timeout`.
+        """
+        # Con tráfico sostenido la cola del kernel nunca está vacía: sin select()
+        batch = self._read_batch()
+        if batch:
+            return batch
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+        if not readable:
+            return []
+        return self._read_batch()
+
+    def source(self, index):
+        """(ip, puerto) de origen del datagrama `index` del último lote"""
+        i = self._valid[index]
+        if not self.use_recvmmsg:
+            return self._addresses[i]
+        offset = i * SOCKADDR_SIZE
+        port = int.from_bytes(self.names[offset + 2:offset + 4], 'big')
+        return socket.inet_ntoa(self.names[offset + 4:offset + 8]), port
+
+
+class SourceTracker:
+    """
+    IP:puerto de origen de cada cámara, para el canal de control. Solo se
+    busca en el lote (desde el final) cuando el dato de una cámara que
+    completó un frame tiene más de `refresh` segundos: el camino rápido no
+    decodifica direcciones, y un ESP reiniciado (otro puerto) se nota igual.
+    """
+
+    def __init__(self, assembler, refresh=SOURCE_REFRESH):
+        self.assembler = assembler
+        self.refresh = refresh
+        self.sources = {}  # node_id -> (ip, puerto)
+        self.checked = {}  # node_id -> última búsqueda
+
+    def update(self, receiver, batch, completed, now):
+        for node_id, _, _ in completed:
+            if now - self.checked.get(node_id, 0.0) < self.refresh:
+                continue
+            self.checked[node_id] = now
+            node_name = self.assembler.node_name
+            for index in range(len(batch) - 1, -1, -1):
+                if node_name(batch[index][0][4]) == node_id:
+                    self.sources[node_id] = receiver.source(index)
+                    break
+
+    def get(self, node_id):
+        return self.sources.get(node_id)
+
+
+# ===========================
+# REENSAMBLADO
+# ===========================
+
+class PendingFrame:
+    """Frame en construcción: los payloads se copian directo a su offset"""
+
+    __slots__ = ('data', 'view', 'size', 'received', 'count', 'total_packets',
+                 'first_seen', 'deadline', 'parity', 'parity_group')
+
+    def __init__(self, frame_size, total_packets, now, timeout):
+        self.data = bytearray(frame_size)
+        self.view = memoryview(self.data)  # Copia vía memoryview: memcpy directo
+        self.size = frame_size
+        self.received = bytearray(total_packets)
+        self.count = 0
+        self.total_packets = total_packets
+        self.first_seen = now
+        self.deadline = now + timeout
+        self.parity = None  # {grupo: payload XOR} si el ESP manda paridad
+        self.parity_group = 0
+
+
+class NodeReassembly:
+    """
+    Estado de reensamblado de una cámara. `pending` está en orden de
+    llegada, y como todos los frames tienen el mismo timeout, también en
+    orden de deadline: expirar y desalojar es sacar del frente, O(1).
+    """
+
+    __slots__ = ('node_id', 'pending', 'last_frame_id', 'recent_completed',
+                 'recent_dropped', 'packets', 'bytes', 'duplicates',
+                 'late_packets', 'frames_completed', 'frames_dropped',
+                 'dropped_missing_one', 'resets', 'completion_time_total',
+                 'parity_packets', 'recovered_packets')
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.pending = OrderedDict()
+        self.last_frame_id = None
+        self.recent_completed = deque(maxlen=RECENT_FRAME_IDS)
+        self.recent_dropped = deque(maxlen=RECENT_FRAME_IDS)
+        self.packets = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.late_packets = 0
+        self.frames_completed = 0
+        self.frames_dropped = 0
+        self.dropped_missing_one = 0
+        self.resets = 0
+        self.completion_time_total = 0.0
+        self.parity_packets = 0
+        self.recovered_packets = 0
+
+    def drop_oldest(self):
+        frame_id, frame = self.pending.popitem(last=False)
+        self.frames_dropped += 1
+        if frame.total_packets - frame.count == 1:
+            self.dropped_missing_one += 1
+        self.recent_dropped.append(frame_id)
+
+    def reset(self):
+        """El ESP se reinició (o saltó su frame_id): descartar todo lo pendiente"""
+        while self.pending:
+            self.drop_oldest()
+        self.recent_completed.clear()
+        self.recent_dropped.clear()
+        self.last_frame_id = None
+        self.resets += 1
+
+    def stats(self):
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'duplicates': self.duplicates,
+            'late_packets': self.late_packets,
+            'frames_completed': self.frames_completed,
+            'frames_dropped': self.frames_dropped,
+            'dropped_missing_one': self.dropped_missing_one,
+            'resets': self.resets,
+            'pending': len(self.pending),
+            'completion_time_total': self.completion_time_total,
+            'parity_packets': self.parity_packets,
+            'recovered_packets': self.recovered_packets
+        }
+
+
+def summarize_node_stats(stats):
+    """Agrega métricas derivadas (promedios y tasas) a los contadores de un nodo"""
+    frames = stats['frames_completed'] + stats['frames_dropped']
+    stats['avg_completion_ms'] = (stats['completion_time_total'] / stats['frames_completed'] * 1000
+                                  if stats['frames_completed'] else 0.0)
+    stats['frame_loss_ratio'] = stats['frames_dropped'] / frames if frames else 0.0
+    return stats
+
+
+def merge_node_stats(snapshots):
+    """
+    Combina snapshots {node_id: contadores} de varios ensambladores (threads
+    o workers) en uno solo, con las métricas derivadas recalculadas.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for node_id, counters in snapshot.items():
+            total = merged.get(node_id)
+            if total is None:
+                merged[node_id] = dict(counters)
+                continue
+            for key, value in counters.items():
+                total[key] += value
+    return {node_id: summarize_node_stats(counters) for node_id, counters in merged.items()}
+
+
+class FrameAssembler:
+    """
+    Reensambla frames del protocolo PacketHeader. Todos los paquetes salvo
+    el último llevan el mismo tamaño de payload, así que el offset de cada
+    uno es packet_num * len(payload); el último termina en frame_size.
+
+    Cada frame incompleto tiene un deadline (`frame_timeout`); además se
+    limita a `max_pending` por nodo. Un salto hacia atrás de frame_id mayor
+    que REORDER_WINDOW (aritmética módulo 2^32, así el wraparound de uint32
+    cuenta como avance) se interpreta como reinicio del ESP.
+    """
+
+    def __init__(self, max_pending=3, frame_timeout=FRAME_TIMEOUT):
+        self.max_pending = max_pending
+        self.frame_timeout = frame_timeout
+        self.nodes = {}  # nodeId crudo del header (12 bytes) -> NodeReassembly
+        self.node_names = {}
+        self.malformed = 0
+        self.next_expire = 0.0
+        self.completion_hist = Histogram()  # Primer paquete → frame completo (s)
+
+    def node_name(self, node_id_bytes):
+        """Decodifica (con caché) el nodeId de 12 bytes del header"""
+        node_id = self.node_names.get(node_id_bytes)
+        if node_id is None:
+            node_id = node_id_bytes.decode('utf-8', errors='ignore').rstrip('\x00')
+            self.node_names[node_id_bytes] = node_id
+        return node_id
+
+    def add_packet(self, packet, now=None):
+        """
+        Procesa un datagrama completo (bytes o memoryview). Retorna la lista
+        de (node_id, frame_id, memoryview del JPEG) completados: puede haber
+        más de uno si la paridad cierra un frame anterior.
+        """
+        if len(packet) < HEADER_SIZE:
+            self.malformed += 1
+            return []
+        packet = memoryview(packet)
+        return self.add_batch([(HEADER.unpack_from(packet), packet[HEADER_SIZE:])], now)
+
+    def add_batch(self, packets, now=None):
+        """
+        Procesa un lote de (header, payload) como los entrega BatchReceiver
+        y retorna la lista de frames completados. También expira frames
+        vencidos (cada frame_timeout / 4), así que conviene llamarlo aunque
+        el lote venga vacío.
+        """
+        if now is None:
+            now = time.monotonic()
+        completed = []
+        # Los paquetes de un frame llegan casi siempre seguidos: caché del
+        # último frame, y los contadores del nodo se suman por tramo
+        last_key = last_id = frame = node = None
+        last_size = last_total = -1
+        received = view = None
+        run_packets = run_bytes = 0
+
+        for header, payload in packets:
+            frame_id, packet_num, total_packets, frame_size, node_key = header
+            payload_size = len(payload)
+            if packet_num < total_packets - 1:
+                offset = packet_num * payload_size
+                if offset > frame_size - payload_size:
+                    self.malformed += 1
+                    continue
+            elif packet_num == total_packets - 1:
+                offset = frame_size - payload_size
+                if offset < 0:
+                    self.malformed += 1
+                    continue
+            else:
+                # Paridad o basura: fuera del camino rápido
+                self._add_special(header, payload, now, completed)
+                last_id = None
+                continue
+
+            if (frame_id != last_id or node_key != last_key
+                    or frame_size != last_size or total_packets != last_total):
+                if run_packets:
+                    node.packets += run_packets
+                    node.bytes += run_bytes
+                    run_packets = run_bytes = 0
+                node, frame = self._lookup(node_key, frame_id, frame_size, total_packets, now,
+                                           completed)
+                if frame is None:
+                    last_id = None
+                    continue
+                last_key, last_id, last_size, last_total = node_key, frame_id, frame_size, total_packets
+                received = frame.received
+                view = frame.view
+
+            run_packets += 1
+            run_bytes += payload_size
+            if received[packet_num]:
+                node.duplicates += 1
+                continue
+            received[packet_num] = 1
+            view[offset:offset + payload_size] = payload
+            frame.count = count = frame.count + 1
+            if count == total_packets:
+                completed.append(self._complete(node, frame_id, frame, now))
+                last_id = None
+
+        if run_packets:
+            node.packets += run_packets
+            node.bytes += run_bytes
+        if now >= self.next_expire:
+            completed.extend(self.expire(now))
+        return completed
+
+    def _lookup(self, node_key, frame_id, frame_size, total_packets, now, completed):
+        """(nodo, frame pendiente); frame None si el paquete llega tarde / duplicado"""
+        node = self.nodes.get(node_key)
+        if node is None:
+            node = self.nodes[node_key] = NodeReassembly(self.node_name(node_key))
+        frame = node.pending.get(frame_id)
+        if frame is None or frame.size != frame_size or frame.total_packets != total_packets:
+            frame = self._new_frame(node, frame_id, frame_size, total_packets, now)
+            if frame is None:
+                return node, None
+            if node.parity_packets and node.last_frame_id == frame_id:
+                # El ESP pasó a un frame nuevo: los anteriores ya no esperan más paquetes
+                for older_id, older in list(node.pending.items()):
+                    if older is not frame and older.parity is not None:
+                        self._finalize(node, older_id, older, now, completed)
+            if len(node.pending) > self.max_pending:
+                self._drop_oldest(node, now, completed)
+        return node, frame
+
+    def _complete(self, node, frame_id, frame, now):
+        node.pending.pop(frame_id, None)
+        node.recent_completed.append(frame_id)
+        node.frames_completed += 1
+        elapsed = now - frame.first_seen
+        node.completion_time_total += elapsed
+        self.completion_hist.observe(elapsed)
+        return node.node_id, frame_id, frame.view
+
+    def _add_special(self, header, payload, now, completed):
+        """Paquete con packet_num fuera del frame: paridad (si es válida) o malformado"""
+        frame_id, packet_num, total_packets, frame_size, node_key = header
+        payload_size = len(payload)
+        if not (packet_num & PARITY_FLAG and payload_size <= frame_size
+                and self._parity_valid(packet_num, total_packets, frame_size, payload_size)):
+            self.malformed += 1
+            return
+        node, frame = self._lookup(node_key, frame_id, frame_size, total_packets, now, completed)
+        if frame is None:
+            return
+        node.packets += 1
+        node.bytes += payload_size
+        node.parity_packets += 1
+        self._add_parity(node, frame, packet_num, payload)
+
+    @staticmethod
+    def _parity_valid(packet_num, total_packets, frame_size, payload_size):
+        """
+        True si el paquete de paridad es coherente con el frame (grupo
+        dentro del frame y payload del tamaño de un paquete completo)
+        """
+        group_size = (packet_num >> 8) & 0x7F
+        group = packet_num & 0xFF
+        return (group_size > 0 and group * group_size < total_packets
+                and (total_packets - 1) * payload_size < frame_size <= total_packets * payload_size)
+
+    def _add_parity(self, node, frame, packet_num, payload):
+        group_size = (packet_num >> 8) & 0x7F
+        group = packet_num & 0xFF
+        if frame.parity is None:
+            frame.parity = {}
+            frame.parity_group = group_size
+        elif frame.parity_group != group_size or group in frame.parity:
+            node.duplicates += 1
+            return
+        # Copia: el payload apunta al buffer del receptor, que se reutiliza.
+        # No se recupera todavía: el paquete "faltante" puede venir reordenado
+        frame.parity[group] = bytes(payload)
+
+    def _finalize(self, node, frame_id, frame, now, completed):
+        """Último intento con la paridad antes de dar el frame por perdido: True si se completó"""
+        if frame.parity is None:
+            return False
+        for group in list(frame.parity):
+            self._recover(node, frame, group)
+        if frame.count < frame.total_packets:
+            return False
+        completed.append(self._complete(node, frame_id, frame, now))
+        return True
+
+    def _drop_oldest(self, node, now, completed):
+        """Desaloja el frame más viejo del nodo, salvo que la paridad lo complete"""
+        frame_id, frame = next(iter(node.pending.items()))
+        if not self._finalize(node, frame_id, frame, now, completed):
+            node.drop_oldest()
+
+    def _recover(self, node, frame, group):
+        """Si al grupo le falta exactamente un paquete, lo reconstruye con el XOR"""
+        parity = frame.parity.get(group)
+        if parity is None:
+            return
+        stride = len(parity)
+        first = group * frame.parity_group
+        last = min(first + frame.parity_group, frame.total_packets)
+        received = frame.received
+        missing = [i for i in range(first, last) if not received[i]]
+        if len(missing) != 1:
+            return
+
+        lost = missing[0]
+        data = frame.data
+        others = [data[i * stride:min((i + 1) * stride, frame.size)]
+                  for i in range(first, last) if i != lost]
+        start = lost * stride
+        end = min(start + stride, frame.size)
+        frame.view[start:end] = xor_parity([parity] + others, stride)[:end - start]
+        received[lost] = 1
+        frame.count += 1
+        node.recovered_packets += 1
+
+    def _new_frame(self, node, frame_id, frame_size, total_packets, now):
+        """Crea el frame pendiente, o None si el paquete llega tarde / duplicado"""
+        if frame_id in node.pending:
+            # Mismo frame_id con otra forma: el ESP se reinició
+            node.reset()
+        elif node.last_frame_id is not None:
+            delta = (frame_id - node.last_frame_id) & 0xFFFFFFFF
+            if delta == 0 or delta >= 0x80000000:
+                behind = (0x100000000 - delta) & 0xFFFFFFFF
+                if behind > REORDER_WINDOW:
+                    node.reset()
+                elif frame_id in node.recent_completed:
+                    node.packets += 1
+                    node.duplicates += 1
+                    return None
+                elif frame_id in node.recent_dropped:
+                    node.packets += 1
+                    node.late_packets += 1
+                    return None
+
+        frame = PendingFrame(frame_size, total_packets, now, self.frame_timeout)
+        node.pending[frame_id] = frame
+        if node.last_frame_id is None or (frame_id - node.last_frame_id) & 0xFFFFFFFF < 0x80000000:
+            node.last_frame_id = frame_id
+        return frame
+
+    def expire(self, now=None):
+        """
+        Descarta los frames incompletos cuyo deadline venció. Retorna los
+        que la paridad completó a último momento (como add_batch).
+        """
+        if now is None:
+            now = time.monotonic()
+        # Basta revisar unas pocas veces por timeout, no en cada paquete
+        self.next_expire = now + self.frame_timeout / 4
+        completed = []
+        for node in list(self.nodes.values()):
+            pending = node.pending
+            while pending and next(iter(pending.values())).deadline <= now:
+                self._drop_oldest(node, now, completed)
+        return completed
+
+    def node_stats(self):
+        """Snapshot {node_id: contadores} (sin métricas derivadas)"""
+        return {node.node_id: node.stats() for node in list(self.nodes.values())}
+
+
+# ===========================
+# MEMORIA COMPARTIDA
+# ===========================
+
+class SharedFrameRing:
+    """
+    Anillo de slots en memoria compartida escrito por un único worker.
+    Cada slot lleva un contador de generación: el lector verifica que no
+    cambió durante la copia (el worker lo pone a 0 mientras escribe).
+    """
+
+    GEN = struct.Struct('Q')
+
+    def __init__(self, shm, slots=SHM_SLOTS, slot_size=SHM_SLOT_SIZE):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.next_slot = 0
+        self.generation = 0
+
+    @classmethod
+    def create(cls, slots=SHM_SLOTS, slot_size=SHM_SLOT_SIZE):
+        shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        return cls(shm, slots, slot_size)
+
+    def write(self, frame_data):
+        """Escribe un frame y retorna (slot, generación) o None si no cabe"""
+        size = len(frame_data)
+        if size > self.slot_size - self.GEN.size:
+            return None
+
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.slots
+        self.generation += 1
+
+        offset = slot * self.slot_size
+        buf = self.shm.buf
+        self.GEN.pack_into(buf, offset, 0)
+        start = offset + self.GEN.size
+        buf[start:start + size] = frame_data
+        self.GEN.pack_into(buf, offset, self.generation)
+        return slot, self.generation
+
+    def read(self, slot, generation, size):
+        """Copia el frame del slot; None si el worker ya lo sobrescribió"""
+        offset = slot * self.slot_size
+        buf = self.shm.buf
+        if self.GEN.unpack_from(buf, offset)[0] != generation:
+            return None
+        start = offset + self.GEN.size
+        frame_data = bytes(buf[start:start + size])
+        if self.GEN.unpack_from(buf, offset)[0] != generation:
+            return None
+        return frame_data
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# ===========================
+# WORKERS MULTI-PROCESO
+# ===========================
+
+def udp_worker_process(worker_id, ip, port, rcvbuf, shm, out_queue, control_queue):
+    """Proceso receptor: recibe, reensambla y publica frames en memoria compartida"""
+    udp_socket = open_udp_socket(ip, port, rcvbuf)
+    receiver = BatchReceiver(udp_socket)
+    assembler = FrameAssembler()
+    sources = SourceTracker(assembler)
+    ring = SharedFrameRing(shm)
+
+    print(f"✓ Worker {worker_id} (pid {os.getpid()}): UDP Listener en {ip}:{port}")
+
+    packets = 0
+    total_bytes = 0
+    frames = 0
+    oversized = 0
+    busy_time = 0.0
+    nodes = set()
+    window_start = time.time()
+    next_control_poll = 0.0
+
+    while True:
+        try:
+            batch = receiver.receive(timeout=FRAME_TIMEOUT)
+        except Exception as e:
+            print(f"✗ Error Worker {worker_id}: {e}")
+            time.sleep(0.1)
+            continue
+
+        t0 = time.perf_counter()
+        packets += len(batch)
+        for _, payload in batch:
+            total_bytes += HEADER_SIZE + len(payload)
+        try:
+            # También con lote vacío: expira frames incompletos vencidos
+            completed = assembler.add_batch(batch)
+        except Exception as e:
+            print(f"✗ Error Worker {worker_id}: {e}")
+            completed = ()
+
+        now = time.time()
+        if completed:
+            sources.update(receiver, batch, completed, now)
+        for node_id, frame_id, frame_data in completed:
+            nodes.add(node_id)
+            written = ring.write(frame_data)
+            if written is None:
+                oversized += 1
+            else:
+                slot, generation = written
+                frames += 1
+                out_queue.put(('frame', worker_id, node_id, frame_id,
+                               slot, generation, len(frame_data), now, sources.get(node_id)))
+        busy_time += time.perf_counter() - t0
+
+        # Control servidor → cámara: sale por el socket de ingesta (mismo puerto que usa el ESP)
+        if now >= next_control_poll:
+            next_control_poll = now + CONTROL_POLL_INTERVAL
+            while True:
+                try:
+                    message, address = control_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    udp_socket.sendto(message, address)
+                except OSError:
+                    pass
+
+        elapsed = now - window_start
+        if elapsed >= STATS_INTERVAL:
+            out_queue.put(('stats', worker_id, {
+                'pid': os.getpid(),
+                'packets_per_sec': packets / elapsed,
+                'mbps': total_bytes * 8 / elapsed / 1e6,
+                'frames_per_sec': frames / elapsed,
+                'busy_ratio': busy_time / elapsed,
+                'nodes': sorted(nodes),
+                'oversized_frames': oversized,
+                'malformed_packets': assembler.malformed + receiver.malformed,
+                'reassembly': assembler.node_stats(),
+                'completion_hist': assembler.completion_hist.snapshot(),
+                'updated': now
+            }))
+            packets = total_bytes = frames = 0
+            busy_time = 0.0
+            nodes = set()
+            window_start = now
+
+
+class IngestWorkerPool:
+    """
+    N procesos receptores enlazados al mismo puerto UDP. El kernel reparte
+    los datagramas por tupla de origen, así cada ESP32 cae siempre en el
+    mismo worker y el reensamblado no necesita coordinación entre procesos.
+    Los mensajes de control los envía cualquier worker (comparten puerto).
+    """
+
+    def __init__(self, num_workers, ip, port, rcvbuf, on_frame):
+        self.num_workers = num_workers
+        self.ip = ip
+        self.port = port
+        self.rcvbuf = rcvbuf
+        self.on_frame = on_frame
+        self.rings = []
+        self.processes = []
+        self.queue = mp.Queue()
+        self.control_queue = mp.Queue()
+        self.worker_stats = {}
+        self.stale_frames = 0
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        for worker_id in range(self.num_workers):
+            ring = SharedFrameRing.create()
+            process = mp.Process(
+                target=udp_worker_process,
+                args=(worker_id, self.ip, self.port, self.rcvbuf, ring.shm, self.queue,
+                      self.control_queue),
+                daemon=True
+            )
+            process.start()
+            self.rings.append(ring)
+            self.processes.append(process)
+
+        threading.Thread(target=self._consume, daemon=True).start()
+
+    def _consume(self):
+        """Thread del proceso web: lee avisos de los workers y publica frames"""
+        while True:
+            try:
+                message = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if message[0] == 'frame':
+                _, worker_id, node_id, frame_id, slot, generation, size, timestamp, source = message
+                frame_data = self.rings[worker_id].read(slot, generation, size)
+                if frame_data is None:
+                    # El worker dio la vuelta al anillo antes de que leyéramos
+                    with self.stats_lock:
+                        self.stale_frames += 1
+                    continue
+                try:
+                    self.on_frame(node_id, frame_data, timestamp, frame_id, source)
+                except Exception as e:
+                    print(f"✗ Error publicando frame de {node_id}: {e}")
+            elif message[0] == 'stats':
+                _, worker_id, worker_stats = message
+                with self.stats_lock:
+                    self.worker_stats[worker_id] = worker_stats
+
+    def stats(self):
+        with self.stats_lock:
+            workers = {}
+            reassembly = []
+            for worker_id, process in enumerate(self.processes):
+                worker = dict(self.worker_stats.get(worker_id, {}))
+                reassembly.append(worker.pop('reassembly', {}))
+                worker.pop('completion_hist', None)
+                worker['alive'] = process.is_alive()
+                workers[str(worker_id)] = worker
+            return {
+                'workers': workers,
+                'stale_frames': self.stale_frames,
+                'reassembly': merge_node_stats(reassembly)
+            }
+
+    def completion_histogram(self):
+        """Histograma de reensamblado combinado de todos los workers"""
+        with self.stats_lock:
+            snapshots = [stats['completion_hist'] for stats in self.worker_stats.values()
+                         if 'completion_hist' in stats]
+        return merge_histograms(snapshots)
+
+    def send_control(self, message, address):
+        """Encola un mensaje de control; lo envía el primer worker que lo lea"""
+        self.control_queue.put((message, address))
+
+    def malformed_packets(self):
+        with self.stats_lock:
+            return sum(stats.get('malformed_packets', 0) for stats in self.worker_stats.values())
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for ring in self.rings:
+            ring.close(unlink=True)